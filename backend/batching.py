@@ -0,0 +1,94 @@
+"""
+Micro-Batching
+Groups concurrent async submissions into one blocking batch call run off the event loop
+"""
+
+import asyncio
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+class MicroBatcher:
+    """Groups concurrent submissions into batches for one blocking batch call.
+
+    A single consumer takes the first queued item, waits up to `window`
+    seconds for more (up to `max_batch`) and runs `run_batch` in a worker
+    thread. Items arriving while a batch is running queue up and form
+    the next batch, so batches grow with load instead of requests waiting
+    on each other one at a time.
+    """
+
+    def __init__(self, run_batch: Callable[[List[Any]], List[Any]],
+                 max_batch: int = 8, window: float = 0.02):
+        self.run_batch = run_batch
+        self.max_batch = max(1, max_batch)
+        self.window = window
+        self._queue: Optional["asyncio.Queue[Tuple[Any, asyncio.Future]]"] = None
+        self._task: Optional["asyncio.Task[None]"] = None
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+
+    async def submit(self, item: Any) -> Any:
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._consume())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    async def _collect(self) -> List[Tuple[Any, asyncio.Future]]:
+        assert self._queue is not None
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.window
+        while len(batch) < self.max_batch:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return [(item, future) for item, future in batch if not future.cancelled()]
+
+    async def _consume(self) -> None:
+        while True:
+            batch = await self._collect()
+            if not batch:
+                continue
+            self.batches += 1
+            self.items += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+            try:
+                results = await asyncio.to_thread(self.run_batch, [item for item, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    async def aclose(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "max_batch": self.max_batch,
+            "window_ms": round(self.window * 1000, 1),
+        }
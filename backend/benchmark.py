@@ -0,0 +1,394 @@
+"""
+Kokotajlo Backend Benchmark
+Load test for /chat and /contact against mock n8n and OpenAI upstreams
+
+Usage:
+    python benchmark.py --requests 500 --concurrency 50 --n8n-latency 0.3
+    python benchmark.py --path /contact --requests 200 --output results.json
+    python benchmark.py --replay data/upstream_traffic.jsonl --replay-time-scale 0.5
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+BACKEND_DIR = Path(__file__).parent
+# Paths benchmarked with GET (no body)
+GET_PATHS = ("/health", "/api/v1/status")
+
+
+def percentiles_ms(samples: List[float]) -> Dict[str, Optional[float]]:
+    """p50/p95/p99/max/mean of latencies in seconds, reported in milliseconds."""
+    if not samples:
+        return {"p50": None, "p95": None, "p99": None, "max": None, "mean": None}
+    ordered = sorted(samples)
+
+    def pct(p: float) -> float:
+        rank = max(1, math.ceil(p / 100 * len(ordered)))
+        return round(ordered[rank - 1] * 1000, 2)
+
+    return {
+        "p50": pct(50),
+        "p95": pct(95),
+        "p99": pct(99),
+        "max": round(ordered[-1] * 1000, 2),
+        "mean": round(sum(ordered) / len(ordered) * 1000, 2),
+    }
+
+
+# -- mock upstreams ------------------------------------------------------
+
+class UpstreamProfile:
+    """Latency distribution and failure behaviour of one mock upstream."""
+
+    def __init__(self, latency: float, jitter: float, error_rate: float,
+                 hang_rate: float, hang_seconds: float):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.calls = 0
+
+    async def respond(self) -> None:
+        """Sleep for a sampled latency; raise HTTP 500 for injected errors."""
+        self.calls += 1
+        roll = random.random()
+        if roll < self.hang_rate:
+            await asyncio.sleep(self.hang_seconds)
+        elif self.latency > 0:
+            # Log-normal around the median latency; jitter is the sigma
+            await asyncio.sleep(self.latency * math.exp(random.gauss(0, self.jitter)))
+        if random.random() < self.error_rate:
+            raise HTTPException(status_code=500, detail="injected upstream error")
+
+
+def build_mock_app(n8n: UpstreamProfile, openai: UpstreamProfile) -> FastAPI:
+    """FastAPI app serving a fake n8n webhook and a fake OpenAI chat completions API."""
+    mock = FastAPI()
+
+    @mock.post("/webhook/chat")
+    async def n8n_webhook(body: Dict[str, Any]):
+        await n8n.respond()
+        return {"output": f"Réponse n8n simulée: {str(body.get('chatInput', ''))[:40]}"}
+
+    @mock.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        await openai.respond()
+        words = ["Réponse", " OpenAI", " simulée", " pour", " le", " benchmark."]
+        usage = {"prompt_tokens": 300, "completion_tokens": len(words),
+                 "total_tokens": 300 + len(words)}
+        if body.get("stream"):
+            async def events():
+                for word in words:
+                    chunk = {"id": "bench", "object": "chat.completion.chunk", "created": 0,
+                             "model": body.get("model", "mock"),
+                             "choices": [{"index": 0, "delta": {"content": word}, "finish_reason": None}]}
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                yield "data: [DONE]\n\n"
+            return StreamingResponse(events(), media_type="text/event-stream")
+        return {
+            "id": "bench", "object": "chat.completion", "created": 0,
+            "model": body.get("model", "mock"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": "".join(words)}}],
+            "usage": usage,
+        }
+
+    return mock
+
+
+# -- backend under test (separate process) -------------------------------
+
+def serve_backend(port: int, env: Dict[str, str], lag_file: str) -> None:
+    """Run the backend app with an event-loop lag probe; write lag stats to `lag_file` on shutdown."""
+    os.environ.update(env)
+    os.chdir(BACKEND_DIR)
+    sys.path.insert(0, str(BACKEND_DIR))
+    import main  # noqa: E402
+
+    lag_samples: List[float] = []
+    interval = 0.01
+
+    async def probe() -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + interval
+            await asyncio.sleep(interval)
+            lag_samples.append(max(0.0, loop.time() - expected))
+
+    async def start_probe() -> None:
+        main.app.state.lag_probe = asyncio.ensure_future(probe())
+
+    async def report_lag() -> None:
+        main.app.state.lag_probe.cancel()
+        Path(lag_file).write_text(json.dumps(percentiles_ms(lag_samples)), encoding="utf-8")
+
+    main.app.router.on_startup.append(start_probe)
+    # Report before the app's own shutdown so a slow drain cannot swallow it
+    main.app.router.on_shutdown.insert(0, report_lag)
+
+    from runtime_profile import uvicorn_options  # noqa: E402
+
+    uvicorn.run(main.app, host="127.0.0.1", port=port,
+                log_level="warning", **{"access_log": False, **uvicorn_options()})
+
+
+# -- load driver -----------------------------------------------------------
+
+def served_path(body: Dict[str, Any]) -> str:
+    """Which tier answered a /chat reply, from its conversation_id prefix."""
+    conversation_id = body.get("conversation_id") or ""
+    parts = conversation_id.split("_")
+    if len(parts) >= 3 and parts[1] == "cache":
+        return "cache"
+    if len(parts) >= 4:
+        return parts[2]
+    return "unknown"
+
+
+def chat_body(index: int, repeat_ratio: float) -> Dict[str, Any]:
+    repeated = random.random() < repeat_ratio
+    message = "C'est quoi le pilote ?" if repeated else f"Question de charge numéro {index}"
+    return {"message": message, "language": "fr", "context": {"page": "general"}}
+
+
+def contact_body(index: int, repeat_ratio: float) -> Dict[str, Any]:
+    return {"name": f"Bench {index}", "email": f"bench{index}@example.fr",
+            "company": "Bench SA", "sector": "industrie",
+            "message": "Demande de pilote", "gdpr": True}
+
+
+def recorded_upstreams(traffic_file: Path) -> Dict[str, str]:
+    """N8N_URL / OPENAI_BASE_URL of a recording, so replayed calls hit the recorded paths."""
+    from upstream_traffic import read_records
+
+    env: Dict[str, str] = {}
+    for record in read_records(traffic_file):
+        url = record["u"]
+        if url.endswith("/chat/completions"):
+            env.setdefault("OPENAI_BASE_URL", url[:-len("/chat/completions")])
+        else:
+            env.setdefault("N8N_URL", url)
+    return env
+
+
+async def drive_load(base_url: str, path: str, total: int, concurrency: int,
+                     repeat_ratio: float, timeout: float,
+                     bodies: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """Send `total` requests with `concurrency` in flight and collect results.
+
+    With `bodies` the requests cycle through them instead of generated ones.
+    """
+    make_body = contact_body if path == "/contact" else chat_body
+    if bodies:
+        def make_body(index: int, repeat_ratio: float) -> Dict[str, Any]:
+            return bodies[index % len(bodies)]
+    latencies: List[float] = []
+    status_counts: Dict[str, int] = {}
+    path_counts: Dict[str, int] = {}
+    errors = 0
+    next_index = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        async def worker(worker_id: int) -> None:
+            nonlocal next_index, errors
+            while next_index < total:
+                index = next_index
+                next_index += 1
+                headers = {"X-Forwarded-For": f"10.{worker_id // 250}.{worker_id % 250}.1"}
+                started = time.perf_counter()
+                try:
+                    if path in GET_PATHS:
+                        response = await client.get(path, headers=headers)
+                    else:
+                        response = await client.post(path, json=make_body(index, repeat_ratio), headers=headers)
+                    latencies.append(time.perf_counter() - started)
+                    key = str(response.status_code)
+                    status_counts[key] = status_counts.get(key, 0) + 1
+                    if response.status_code == 200 and path == "/chat":
+                        served = served_path(response.json())
+                        path_counts[served] = path_counts.get(served, 0) + 1
+                except Exception:
+                    latencies.append(time.perf_counter() - started)
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "requests": total,
+        "errors": errors,
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": percentiles_ms(latencies),
+        "status_counts": status_counts,
+        "paths": path_counts,
+    }
+
+
+async def wait_healthy(base_url: str, deadline: float) -> float:
+    """Poll /health until it answers; return seconds waited."""
+    started = time.perf_counter()
+    async with httpx.AsyncClient(base_url=base_url, timeout=1.0) as client:
+        while time.perf_counter() - started < deadline:
+            try:
+                if (await client.get("/health")).status_code == 200:
+                    return time.perf_counter() - started
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.05)
+    raise RuntimeError("backend did not become healthy")
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+            stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+async def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    n8n = UpstreamProfile(args.n8n_latency, args.n8n_jitter, args.n8n_error_rate,
+                          args.n8n_hang_rate, args.hang_seconds)
+    openai = UpstreamProfile(args.openai_latency, args.openai_jitter, args.openai_error_rate,
+                             args.openai_hang_rate, args.hang_seconds)
+    mock_url = f"http://127.0.0.1:{args.mock_port}"
+    env = {
+        "N8N_URL": f"{mock_url}/webhook/chat",
+        "OPENAI_API_KEY": "benchmark",
+        "OPENAI_BASE_URL": f"{mock_url}/v1",
+        "RATE_LIMIT_CHAT": "1000000/minute",
+        "RATE_LIMIT_CONTACT": "1000000/minute",
+        "LOG_LEVEL": args.log_level,
+        "CONTACT_QUEUE_DB": str(Path(args.workdir) / "bench_contact_jobs.db"),
+        "LEAD_STORE_DB": str(Path(args.workdir) / "bench_leads.db"),
+    }
+    bodies = None
+    if args.replay:
+        # Recorded upstreams instead of the mocks, and the recorded questions as load
+        traffic_file = Path(args.replay).resolve()
+        env.update(recorded_upstreams(traffic_file))
+        env.update({"UPSTREAM_TRAFFIC_MODE": "replay", "UPSTREAM_TRAFFIC_FILE": str(traffic_file),
+                    "UPSTREAM_REPLAY_TIME_SCALE": str(args.replay_time_scale)})
+        if args.path == "/chat":
+            from upstream_traffic import recorded_chat_requests
+
+            bodies = recorded_chat_requests(traffic_file) or None
+    elif args.record:
+        env.update({"UPSTREAM_TRAFFIC_MODE": "record",
+                    "UPSTREAM_TRAFFIC_FILE": str(Path(args.record).resolve())})
+    env.update(dict(item.split("=", 1) for item in args.env))
+
+    mock_server = None
+    mock_task = None
+    if not args.replay:
+        mock_server = uvicorn.Server(uvicorn.Config(
+            build_mock_app(n8n, openai), host="127.0.0.1", port=args.mock_port,
+            log_level="warning", access_log=False))
+        mock_task = asyncio.ensure_future(mock_server.serve())
+
+    ctx = multiprocessing.get_context("spawn")
+    lag_file = Path(args.workdir) / f"bench_lag_{os.getpid()}.json"
+    lag_file.unlink(missing_ok=True)
+    backend = ctx.Process(target=serve_backend, args=(args.port, env, str(lag_file)))
+    launched = time.perf_counter()
+    backend.start()
+    base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        await wait_healthy(base_url, 30.0)
+        time_to_healthy = time.perf_counter() - launched
+        results = await drive_load(base_url, args.path, args.requests, args.concurrency,
+                                   args.repeat_ratio, args.timeout, bodies)
+        async with httpx.AsyncClient(base_url=base_url, timeout=5.0) as client:
+            traffic = (await client.get("/api/v1/status")).json().get("upstream_traffic")
+    finally:
+        backend.terminate()
+        await asyncio.to_thread(backend.join, 30)
+        try:
+            lag = json.loads(lag_file.read_text(encoding="utf-8"))
+            lag_file.unlink()
+        except (OSError, ValueError):
+            lag = None
+        if mock_server is not None:
+            mock_server.should_exit = True
+            await mock_task
+
+    results["event_loop_lag_ms"] = lag
+    results["time_to_healthy_s"] = round(time_to_healthy, 3)
+    if args.replay:
+        results["upstream_traffic"] = traffic
+    else:
+        results["upstream_calls"] = {"n8n": n8n.calls, "openai": openai.calls}
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": {k: v for k, v in vars(args).items() if k not in ("output",)},
+        "results": results,
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the Kokotajlo backend")
+    parser.add_argument("--path", choices=["/chat", "/contact", *GET_PATHS], default="/chat")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--repeat-ratio", type=float, default=0.0,
+                        help="share of /chat requests repeating the same question")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--n8n-latency", type=float, default=0.3, help="median seconds")
+    parser.add_argument("--n8n-jitter", type=float, default=0.3, help="log-normal sigma")
+    parser.add_argument("--n8n-error-rate", type=float, default=0.0)
+    parser.add_argument("--n8n-hang-rate", type=float, default=0.0)
+    parser.add_argument("--openai-latency", type=float, default=0.8, help="median seconds")
+    parser.add_argument("--openai-jitter", type=float, default=0.3, help="log-normal sigma")
+    parser.add_argument("--openai-error-rate", type=float, default=0.0)
+    parser.add_argument("--openai-hang-rate", type=float, default=0.0)
+    parser.add_argument("--hang-seconds", type=float, default=120.0)
+    parser.add_argument("--record", metavar="FILE",
+                        help="record the backend's upstream traffic to FILE")
+    parser.add_argument("--replay", metavar="FILE",
+                        help="serve upstreams from recorded traffic instead of the mocks")
+    parser.add_argument("--replay-time-scale", type=float, default=1.0,
+                        help="multiplier on recorded upstream delays (0 = none)")
+    parser.add_argument("--port", type=int, default=4101)
+    parser.add_argument("--mock-port", type=int, default=4102)
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--workdir", default=str(BACKEND_DIR / "data"))
+    parser.add_argument("--env", action="append", default=[],
+                        help="extra KEY=VALUE for the backend, e.g. CHAT_ROUTING_MODE=hedged")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    return parser.parse_args(argv)
+
+
+def main_cli() -> None:
+    args = parse_args()
+    Path(args.workdir).mkdir(parents=True, exist_ok=True)
+    report = asyncio.run(run_benchmark(args))
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    print(text)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,142 @@
+"""
+Upstream Circuit Breakers
+Per-upstream health tracking over rolling error-rate and latency windows
+"""
+
+import math
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from logging_config import logger
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of `values`, or None when empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker for a single upstream.
+
+    The breaker opens when, over the last `window` seconds and at least
+    `min_calls` calls, the error rate or the slow-call rate reaches its
+    threshold. While open every call is skipped. After `open_seconds` it
+    becomes half-open and lets one trial call through at most every
+    `trial_interval` seconds; a successful trial closes it again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window: float = 60.0,
+        min_calls: int = 5,
+        error_rate: float = 0.5,
+        slow_call_seconds: float = 10.0,
+        slow_call_rate: float = 0.8,
+        open_seconds: float = 30.0,
+        trial_interval: float = 5.0,
+        max_samples: int = 1000,
+    ):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.trial_interval = trial_interval
+        # (monotonic time, ok, latency seconds)
+        self._calls: Deque[Tuple[float, bool, float]] = deque(maxlen=max_samples)
+        self.state = CLOSED
+        self._opened_at = 0.0
+        self._last_trial_at = 0.0
+        self._trial_in_flight = False
+        self.skipped = 0
+        self.trips = 0
+
+    def _prune(self, now: float) -> None:
+        cutoff = now - self.window
+        while self._calls and self._calls[0][0] < cutoff:
+            self._calls.popleft()
+
+    def _transition(self, state: str, now: float) -> None:
+        if state == self.state:
+            return
+        logger.warning(f"Circuit breaker '{self.name}': {self.state} -> {state}")
+        self.state = state
+        if state == OPEN:
+            self._opened_at = now
+            self.trips += 1
+        elif state == CLOSED:
+            self._calls.clear()
+        self._trial_in_flight = False
+
+    def allow_request(self) -> bool:
+        """Return True if a call may go to this upstream right now."""
+        now = time.monotonic()
+        if self.state == OPEN and now - self._opened_at >= self.open_seconds:
+            self._transition(HALF_OPEN, now)
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN and not self._trial_in_flight \
+                and now - self._last_trial_at >= self.trial_interval:
+            self._trial_in_flight = True
+            self._last_trial_at = now
+            logger.info(f"Circuit breaker '{self.name}': sending trial request")
+            return True
+        self.skipped += 1
+        return False
+
+    def record(self, ok: bool, latency: float) -> None:
+        """Record the outcome of a call that allow_request() let through."""
+        now = time.monotonic()
+        if self.state == HALF_OPEN:
+            self._transition(CLOSED if ok else OPEN, now)
+            self._calls.append((now, ok, latency))
+            return
+
+        self._calls.append((now, ok, latency))
+        self._prune(now)
+        if self.state != CLOSED or len(self._calls) < self.min_calls:
+            return
+        total = len(self._calls)
+        errors = sum(1 for _, call_ok, _ in self._calls if not call_ok)
+        slow = sum(1 for _, _, took in self._calls if took >= self.slow_call_seconds)
+        if errors / total >= self.error_rate or slow / total >= self.slow_call_rate:
+            logger.warning(
+                f"Circuit breaker '{self.name}' tripped: {errors}/{total} errors, {slow}/{total} slow calls")
+            self._transition(OPEN, now)
+
+    def release(self) -> None:
+        """Forget a call that was let through but cancelled before finishing."""
+        self._trial_in_flight = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        """State, rolling error rate and latency percentiles for /api/v1/status."""
+        now = time.monotonic()
+        self._prune(now)
+        latencies = [took for _, _, took in self._calls]
+        total = len(self._calls)
+        errors = sum(1 for _, call_ok, _ in self._calls if not call_ok)
+
+        def ms(pct: float) -> Any:
+            value = percentile(latencies, pct)
+            return round(value * 1000, 1) if value is not None else None
+
+        return {
+            "state": self.state,
+            "calls": total,
+            "error_rate": round(errors / total, 3) if total else 0.0,
+            "latency_ms": {"p50": ms(50), "p95": ms(95), "p99": ms(99)},
+            "skipped": self.skipped,
+            "trips": self.trips,
+        }
@@ -0,0 +1,307 @@
+"""
+Contact Job Queue
+Durable SQLite-backed background jobs for contact emails
+"""
+
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from logging_config import logger
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+DEAD = "dead"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    contact_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_run_at REAL NOT NULL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    owner TEXT,
+    claimed_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_due ON jobs (status, next_run_at);
+"""
+# Columns added after the first release, for journals created before them
+LEASE_COLUMNS = (("owner", "TEXT"), ("claimed_at", "REAL"))
+
+
+def owner_alive(owner: Optional[str]) -> bool:
+    """Whether the process of a claim owner ("<pid>:<token>") still runs on this host."""
+    try:
+        pid = int((owner or "").split(":", 1)[0])
+    except ValueError:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class ContactJobQueue:
+    """Background job queue for contact submissions, journaled in SQLite.
+
+    Each submission becomes one job per handler kind with id
+    "<contact_id>:<kind>", so enqueueing the same contact twice is a no-op.
+    Workers retry failed jobs with exponential backoff and jitter; after
+    `max_attempts` a job is kept with status 'dead' (the dead-letter store).
+
+    Several queues (one per server worker process) share the journal. A
+    claim records its owner ("<pid>:<token>") and time; a 'running' job is
+    only taken back when its owner process is gone (checked on start) or its
+    lease of `lease_seconds` has expired, never from a live sibling.
+    SQLite calls run in a worker thread so the event loop never blocks.
+    """
+
+    def __init__(
+        self,
+        db_path: Path,
+        handlers: Dict[str, JobHandler],
+        workers: int = 2,
+        max_attempts: int = 5,
+        base_delay: float = 2.0,
+        max_delay: float = 300.0,
+        poll_interval: float = 1.0,
+        lease_seconds: float = 300.0,
+        job_timeout: float = 60.0,
+        legacy_handlers: Optional[Dict[str, JobHandler]] = None,
+    ):
+        self.db_path = db_path
+        # Kinds queued for every contact
+        self.handlers = handlers
+        # Kinds no longer queued whose journaled jobs still need to run once
+        self.legacy_handlers = legacy_handlers or {}
+        self.kinds = tuple({**self.legacy_handlers, **handlers})
+        self.worker_count = workers
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        # A handler gets cut off well before its lease expires, so a hung call
+        # is retried by its owner rather than run again by a sibling
+        self.job_timeout = min(job_timeout, lease_seconds / 2)
+        self.owner = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._workers: List["asyncio.Task[None]"] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+
+    # -- SQLite helpers (run in a thread) --------------------------------
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(
+                str(self.db_path), check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column, kind in LEASE_COLUMNS:
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+            self._conn = conn
+        return self._conn
+
+    def _execute(self, sql: str, params: tuple = ()) -> List[tuple]:
+        with self._lock:
+            return self._connect().execute(sql, params).fetchall()
+
+    def _enqueue_sync(self, contact_id: str, payload: Dict[str, Any]) -> int:
+        now = time.time()
+        data = json.dumps(payload, ensure_ascii=False)
+        created = 0
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for kind in self.handlers:
+                    cursor = conn.execute(
+                        "INSERT OR IGNORE INTO jobs (id, contact_id, kind, payload, status, next_run_at, created_at, updated_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (f"{contact_id}:{kind}", contact_id, kind, data, PENDING, now, now, now))
+                    created += cursor.rowcount
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return created
+
+    def _recover_sync(self) -> int:
+        """Re-queue 'running' jobs whose owner process is gone or whose lease expired."""
+        expired = time.time() - self.lease_seconds
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = conn.execute(
+                    "SELECT id, owner, claimed_at FROM jobs WHERE status = ?", (RUNNING,)).fetchall()
+                stale = [(PENDING, job_id, RUNNING) for job_id, owner, claimed_at in rows
+                         if not owner_alive(owner) or (claimed_at or 0.0) <= expired]
+                conn.executemany(
+                    "UPDATE jobs SET status = ?, owner = NULL, claimed_at = NULL WHERE id = ? AND status = ?",
+                    stale)
+                conn.execute("COMMIT")
+                return len(stale)
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def _release_sync(self) -> int:
+        """Hand this queue's unfinished jobs back (after a stop cancelled them)."""
+        with self._lock:
+            cursor = self._connect().execute(
+                "UPDATE jobs SET status = ?, owner = NULL, claimed_at = NULL WHERE status = ? AND owner = ?",
+                (PENDING, RUNNING, self.owner))
+            return cursor.rowcount
+
+    def _claim_sync(self) -> Optional[tuple]:
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Due jobs, and jobs whose claim outlived its lease (a hung owner),
+                # of the kinds this queue has a handler for
+                kinds = ", ".join("?" * len(self.kinds))
+                row = conn.execute(
+                    "SELECT id, kind, payload, attempts FROM jobs "
+                    "WHERE ((status = ? AND next_run_at <= ?) OR (status = ? AND claimed_at <= ?)) "
+                    f"AND kind IN ({kinds}) ORDER BY next_run_at LIMIT 1",
+                    (PENDING, now, RUNNING, now - self.lease_seconds, *self.kinds)).fetchone()
+                if row:
+                    conn.execute(
+                        "UPDATE jobs SET status = ?, owner = ?, claimed_at = ?, updated_at = ? WHERE id = ?",
+                        (RUNNING, self.owner, now, now, row[0]))
+                conn.execute("COMMIT")
+                return row
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    # -- public API -------------------------------------------------------
+
+    async def enqueue(self, contact_id: str, payload: Dict[str, Any]) -> int:
+        """Durably record the jobs for a contact; returns how many were new."""
+        created = await asyncio.to_thread(self._enqueue_sync, contact_id, payload)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return created
+
+    async def start(self) -> None:
+        """Recover jobs orphaned by a dead process and start the worker tasks."""
+        recovered = await asyncio.to_thread(self._recover_sync)
+        if recovered:
+            logger.warning(f"Contact queue: re-queued {recovered} interrupted jobs")
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._workers = [asyncio.ensure_future(self._worker(i))
+                         for i in range(self.worker_count)]
+        logger.info(
+            f"Contact queue started with {self.worker_count} workers ({self.db_path})")
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Let running jobs finish (up to `timeout`), then stop the workers."""
+        self._stopping = True
+        if self._wakeup is not None:
+            self._wakeup.set()
+        if self._workers:
+            _, pending = await asyncio.wait(self._workers, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.wait(pending)
+            self._workers = []
+            released = await asyncio.to_thread(self._release_sync)
+            if released:
+                logger.warning(f"Contact queue: handed back {released} unfinished jobs")
+        if self._conn is not None:
+            with self._lock:
+                self._conn.close()
+                self._conn = None
+
+    async def _worker(self, index: int) -> None:
+        assert self._wakeup is not None
+        while not self._stopping:
+            try:
+                job = await asyncio.to_thread(self._claim_sync)
+            except Exception as e:
+                logger.error(f"Contact queue: claim failed: {str(e)}")
+                job = None
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run_job(*job)
+
+    async def _run_job(self, job_id: str, kind: str, payload: str, attempts: int) -> None:
+        handler = self.handlers.get(kind) or self.legacy_handlers.get(kind)
+        attempts += 1
+        try:
+            if handler is None:
+                raise RuntimeError(f"no handler for job kind '{kind}'")
+            try:
+                await asyncio.wait_for(handler(json.loads(payload)), self.job_timeout)
+            except asyncio.TimeoutError:
+                raise RuntimeError(f"timed out after {self.job_timeout:.0f}s")
+        except Exception as e:
+            if attempts >= self.max_attempts:
+                logger.error(
+                    f"Contact queue: job {job_id} moved to dead letters after {attempts} attempts: {str(e)}")
+                status, next_run_at = DEAD, time.time()
+            else:
+                delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+                delay *= random.uniform(0.8, 1.2)
+                logger.warning(
+                    f"Contact queue: job {job_id} failed (attempt {attempts}), retrying in {delay:.1f}s: {str(e)}")
+                status, next_run_at = PENDING, time.time() + delay
+            await asyncio.to_thread(
+                self._execute,
+                "UPDATE jobs SET status = ?, attempts = ?, next_run_at = ?, last_error = ?, updated_at = ?, "
+                "owner = NULL, claimed_at = NULL WHERE id = ?",
+                (status, attempts, next_run_at, str(e)[:500], time.time(), job_id))
+            return
+
+        await asyncio.to_thread(
+            self._execute,
+            "UPDATE jobs SET status = ?, attempts = ?, last_error = NULL, updated_at = ?, "
+            "owner = NULL, claimed_at = NULL WHERE id = ?",
+            (DONE, attempts, time.time(), job_id))
+        logger.info(f"Contact queue: job {job_id} done")
+
+    async def stats(self) -> Dict[str, Any]:
+        """Job counts by status for /api/v1/status."""
+        try:
+            rows = await asyncio.to_thread(
+                self._execute, "SELECT status, COUNT(*) FROM jobs GROUP BY status")
+        except Exception as e:
+            return {"error": str(e)}
+        counts = {PENDING: 0, RUNNING: 0, DONE: 0, DEAD: 0}
+        counts.update({status: count for status, count in rows})
+        return {"workers": len(self._workers), "jobs": counts}
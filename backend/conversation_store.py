@@ -0,0 +1,232 @@
+"""
+Conversation Store
+Bounded per-session chat history (in-memory LRU + TTL, optional SQLite tier)
+"""
+
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from logging_config import logger
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token) used for prompt budgets."""
+    return max(1, len(text) // 4)
+
+
+class Session:
+    """History of one conversation: a running summary plus recent turns."""
+
+    __slots__ = ("summary", "turns", "tokens", "updated_at")
+
+    def __init__(self, summary: str = "", turns: Optional[List[Dict[str, str]]] = None,
+                 updated_at: float = 0.0):
+        self.summary = summary
+        self.turns: List[Dict[str, str]] = turns or []
+        self.tokens = estimate_tokens(summary) if summary else 0
+        self.tokens += sum(estimate_tokens(t["content"]) for t in self.turns)
+        self.updated_at = updated_at or time.time()
+
+    def to_json(self) -> str:
+        return json.dumps({"summary": self.summary, "turns": self.turns},
+                          ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, data: str, updated_at: float) -> "Session":
+        raw = json.loads(data)
+        return cls(raw.get("summary", ""), raw.get("turns", []), updated_at)
+
+
+class ConversationStore:
+    """Conversation history keyed by sessionId.
+
+    Sessions live in an in-memory LRU (at most `max_sessions`, expired after
+    `ttl` seconds idle). Each session is kept under `max_tokens`: when it
+    grows past that, the oldest turns are folded into a short extractive
+    summary (itself capped at `summary_tokens`) and only `keep_turns`
+    messages are kept verbatim; if those are still over budget, the oldest
+    of them are truncated. With `db_path` set, SQLite is the source of
+    truth: sessions are written through, and a lookup reloads the row when
+    it is newer than the memory copy (another worker on the host answered
+    in between). Two workers appending to the same session at the same
+    moment still race; the last write wins.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 5000,
+        ttl: float = 3600.0,
+        max_tokens: int = 1200,
+        keep_turns: int = 6,
+        summary_tokens: int = 200,
+        db_path: Optional[Path] = None,
+    ):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_tokens = max_tokens
+        self.keep_turns = keep_turns
+        self.summary_tokens = summary_tokens
+        self.db_path = db_path
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self.evictions = 0
+        self.compactions = 0
+
+    # -- durable tier ---------------------------------------------------
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            assert self.db_path is not None
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(
+                str(self.db_path), check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS conversations ("
+                "session_id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)")
+            self._conn = conn
+        return self._conn
+
+    def _load_sync(self, session_id: str, newer_than: float = 0.0) -> Optional[Session]:
+        with self._lock:
+            row = self._db().execute(
+                "SELECT data, updated_at FROM conversations WHERE session_id = ? AND updated_at > ?",
+                (session_id, newer_than)).fetchone()
+        if row is None or row[1] < time.time() - self.ttl:
+            return None
+        return Session.from_json(row[0], row[1])
+
+    def _save_sync(self, session_id: str, data: str, updated_at: float) -> None:
+        with self._lock:
+            self._db().execute(
+                "INSERT OR REPLACE INTO conversations (session_id, data, updated_at) VALUES (?, ?, ?)",
+                (session_id, data, updated_at))
+
+    # -- memory tier ----------------------------------------------------
+
+    async def _get(self, session_id: str) -> Optional[Session]:
+        session = self._sessions.get(session_id)
+        if session is not None:
+            if session.updated_at < time.time() - self.ttl:
+                del self._sessions[session_id]
+                session = None
+            else:
+                self._sessions.move_to_end(session_id)
+        if self.db_path is None:
+            return session
+        try:
+            # Only returns a row written since our copy (by another worker)
+            newer = await asyncio.to_thread(
+                self._load_sync, session_id, session.updated_at if session else 0.0)
+        except Exception as e:
+            logger.error(f"Conversation store load failed: {str(e)}")
+            return session
+        if newer is not None:
+            self._remember(session_id, newer)
+            return newer
+        return session
+
+    def _remember(self, session_id: str, session: Session) -> None:
+        self._sessions[session_id] = session
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self.evictions += 1
+
+    def _compact(self, session: Session) -> None:
+        """Fold the oldest turns into the summary, then truncate the oldest kept
+        turns, until the session fits its budget."""
+        if session.tokens <= self.max_tokens:
+            return
+        if len(session.turns) > self.keep_turns:
+            folded = session.turns[:-self.keep_turns]
+            session.turns = session.turns[-self.keep_turns:]
+            lines = [session.summary] if session.summary else []
+            for turn in folded:
+                speaker = "User" if turn["role"] == "user" else "Assistant"
+                lines.append(f"{speaker}: {turn['content'][:160]}")
+            summary = "\n".join(lines)
+            # Keep the most recent part of the summary within its own budget
+            max_chars = self.summary_tokens * 4
+            if len(summary) > max_chars:
+                summary = "…" + summary[-max_chars:]
+            session.summary = summary
+            session.tokens = estimate_tokens(summary) + sum(
+                estimate_tokens(t["content"]) for t in session.turns)
+        # A few long messages can still be over budget on their own
+        for turn in session.turns:
+            excess = session.tokens - self.max_tokens
+            if excess <= 0:
+                break
+            tokens = estimate_tokens(turn["content"])
+            turn["content"] = turn["content"][:max(0, tokens - excess) * 4] + "…"
+            session.tokens += estimate_tokens(turn["content"]) - tokens
+        self.compactions += 1
+
+    # -- public API -----------------------------------------------------
+
+    async def get_history(self, session_id: Optional[str]) -> List[Dict[str, str]]:
+        """Chat messages to prepend before the new user message."""
+        if not session_id:
+            return []
+        session = await self._get(session_id)
+        if session is None:
+            return []
+        history: List[Dict[str, str]] = []
+        if session.summary:
+            history.append({"role": "system",
+                            "content": f"Summary of the earlier conversation:\n{session.summary}"})
+        history.extend({"role": t["role"], "content": t["content"]} for t in session.turns)
+        return history
+
+    async def has_turns(self, session_id: Optional[str]) -> bool:
+        """True once the session has an exchange (it is no longer a first question)."""
+        if not session_id:
+            return False
+        session = await self._get(session_id)
+        return session is not None and bool(session.turns or session.summary)
+
+    async def append(self, session_id: Optional[str], user_message: str, assistant_message: str) -> None:
+        """Record one exchange and compact the session if it is over budget."""
+        if not session_id:
+            return
+        session = await self._get(session_id) or Session()
+        for role, content in (("user", user_message), ("assistant", assistant_message)):
+            session.turns.append({"role": role, "content": content})
+            session.tokens += estimate_tokens(content)
+        session.updated_at = time.time()
+        self._compact(session)
+        self._remember(session_id, session)
+        if self.db_path is not None:
+            try:
+                await asyncio.to_thread(
+                    self._save_sync, session_id, session.to_json(), session.updated_at)
+            except Exception as e:
+                logger.error(f"Conversation store save failed: {str(e)}")
+
+    def close(self) -> None:
+        if self._conn is not None:
+            with self._lock:
+                self._conn.close()
+                self._conn = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Session counts and memory use for /api/v1/status."""
+        tokens = sum(s.tokens for s in self._sessions.values())
+        return {
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "tokens": tokens,
+            "max_tokens_per_session": self.max_tokens,
+            "approx_bytes": tokens * 4,
+            "evictions": self.evictions,
+            "compactions": self.compactions,
+            "durable": self.db_path is not None,
+        }
@@ -0,0 +1,140 @@
+"""
+Idempotency Keys
+Retried /chat and /contact requests get the original response; concurrent duplicates wait on the first
+"""
+
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+from metrics import IDEMPOTENT_REQUESTS
+from single_flight import SingleFlight
+
+T = TypeVar("T")
+
+IDEMPOTENCY_ENABLED = os.getenv("IDEMPOTENCY_ENABLED", "true").lower() == "true"
+# Seconds a response is replayed for a request carrying an Idempotency-Key
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "3600"))
+# Seconds identical /contact forms without a key are treated as duplicates (double-clicks, proxy retries)
+IDEMPOTENCY_WINDOW = float(os.getenv("IDEMPOTENCY_WINDOW", "30"))
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000"))
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+KEY_MAX_CHARS = 128
+
+
+class InvalidIdempotencyKey(ValueError):
+    """The Idempotency-Key header is too long or not printable ASCII."""
+
+
+class IdempotencyConflict(Exception):
+    """The key was already used for a different request."""
+
+
+def fingerprint(*parts: Any) -> str:
+    """Digest of the parts of a request that make it "the same request"."""
+    data = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+class IdempotencyStore:
+    """Responses of completed requests by key, bounded (LRU) and expiring (TTL).
+
+    A key is the client's Idempotency-Key, or without one (for endpoints
+    that allow it) the request fingerprint, which only holds for the short
+    `window`; both are scoped to the endpoint and client address so one
+    visitor cannot read another's response. A key seen again gets the stored response; while the first
+    request runs, duplicates await it through a SingleFlight. Failures are
+    not stored, so a retry after an error runs again.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = IDEMPOTENCY_MAX_ENTRIES,
+        ttl: float = IDEMPOTENCY_TTL,
+        window: float = IDEMPOTENCY_WINDOW,
+        enabled: bool = IDEMPOTENCY_ENABLED,
+        max_waiters: int = 100,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.window = window
+        self.enabled = enabled
+        # key -> (expires_at, fingerprint, response)
+        self._entries: "OrderedDict[str, Tuple[float, str, Any]]" = OrderedDict()
+        self._flights = SingleFlight(max_waiters=max_waiters)
+        self.evictions = 0
+
+    async def run(
+        self,
+        scope: str,
+        client: str,
+        idempotency_key: Optional[str],
+        request_fingerprint: str,
+        fn: Callable[[], Awaitable[T]],
+        keep: Optional[Callable[[T], bool]] = None,
+        by_content: bool = True,
+    ) -> Tuple[T, bool]:
+        """Run `fn` once per key; return (response, replayed).
+
+        `keep` can refuse to store a response (e.g. a canned fallback a
+        retry should not be stuck with). With `by_content` false, only
+        requests carrying an Idempotency-Key are deduplicated.
+        """
+        if not self.enabled or (idempotency_key is None and not by_content):
+            return await fn(), False
+        if idempotency_key is not None:
+            if (not idempotency_key or len(idempotency_key) > KEY_MAX_CHARS
+                    or not idempotency_key.isascii() or not idempotency_key.isprintable()):
+                raise InvalidIdempotencyKey(
+                    f"{IDEMPOTENCY_HEADER} invalide (max {KEY_MAX_CHARS} caractères ASCII)")
+            key, ttl = f"{scope}|{client}|key:{idempotency_key}", self.ttl
+        else:
+            key, ttl = f"{scope}|{client}|hash:{request_fingerprint}", self.window
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, stored_fingerprint, response = entry
+            if expires_at > time.monotonic():
+                if stored_fingerprint != request_fingerprint:
+                    IDEMPOTENT_REQUESTS.inc(scope, "conflict")
+                    raise IdempotencyConflict(f"{IDEMPOTENCY_HEADER} déjà utilisée pour une autre requête")
+                self._entries.move_to_end(key)
+                IDEMPOTENT_REQUESTS.inc(scope, "replayed")
+                return response, True
+            del self._entries[key]
+
+        async def first() -> T:
+            response = await fn()
+            if keep is None or keep(response):
+                self._store(key, request_fingerprint, response, ttl)
+            return response
+
+        # Only identical requests share a flight; a key reused for another
+        # request while the first runs is caught once the first is stored
+        response, shared = await self._flights.do(f"{key}|{request_fingerprint}", first)
+        IDEMPOTENT_REQUESTS.inc(scope, "joined" if shared else "new")
+        return response, shared
+
+    def _store(self, key: str, request_fingerprint: str, response: Any, ttl: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl, request_fingerprint, response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for /api/v1/status."""
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "window_seconds": self.window,
+            "evictions": self.evictions,
+            "in_flight": self._flights.stats(),
+        }
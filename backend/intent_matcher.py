@@ -0,0 +1,155 @@
+"""
+Intent Matcher
+Local TF-IDF classifier answering common questions from the curated fallback answers
+"""
+
+import math
+import random
+from collections import Counter
+from typing import Any, Dict, FrozenSet, List, Optional, Set, Tuple
+
+from retrieval import tokenize
+
+Vector = Dict[str, float]
+
+# Greetings and politeness, ignored when scoring and checking a question
+FILLER_WORDS = frozenset(tokenize("""
+bonjour salut merci svp stp please hello hi hey thanks thank kokotajlo
+"""))
+
+
+def features(text: str) -> Counter:
+    """Word unigrams and bigrams of the normalized text, without filler words."""
+    tokens = [t for t in tokenize(text) if t not in FILLER_WORDS]
+    grams = Counter(tokens)
+    grams.update(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+    return grams
+
+
+def normalize(vector: Vector) -> Vector:
+    norm = math.sqrt(sum(v * v for v in vector.values()))
+    return {k: v / norm for k, v in vector.items()} if norm else {}
+
+
+class IntentMatch:
+    __slots__ = ("intent", "answer", "confidence")
+
+    def __init__(self, intent: str, answer: str, confidence: float):
+        self.intent = intent
+        self.answer = answer
+        self.confidence = confidence
+
+
+class IntentMatcher:
+    """Nearest-example classifier over the `intents:` section of fallback.yaml.
+
+    Each intent lists example questions, key terms and answers per language.
+    Examples are turned into unit TF-IDF vectors once; a question is scored by
+    cosine similarity against the examples of its language, so a match costs a
+    few dict lookups and never leaves the process. The best intent is only
+    returned when the question contains one of its key terms and no word outside
+    its vocabulary (examples and key terms): "Quel est le prix du pétrole ?"
+    shares "prix" with the pricing examples but is not about our pricing.
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        self.answers: Dict[str, Dict[str, List[str]]] = {}
+        # intent -> language -> key terms (one must appear) and known words
+        self.keywords: Dict[str, Dict[str, FrozenSet[str]]] = {}
+        self.vocabulary: Dict[str, Dict[str, Set[str]]] = {}
+        examples: List[Tuple[str, str, Counter]] = []
+        for intent, entry in config.items():
+            if not isinstance(entry, dict):
+                continue
+            answers = {}
+            for language, answer in (entry.get("answers") or {}).items():
+                texts = [answer] if isinstance(answer, str) else list(answer or [])
+                answers[language] = [t.strip() for t in texts if isinstance(t, str) and t.strip()]
+            if not any(answers.values()):
+                continue
+            self.answers[intent] = answers
+            vocabulary = self.vocabulary[intent] = {}
+            for language, questions in (entry.get("examples") or {}).items():
+                for question in questions or []:
+                    if isinstance(question, str) and tokenize(question):
+                        examples.append((intent, language, features(question)))
+                        vocabulary.setdefault(language, set()).update(tokenize(question))
+            keywords = self.keywords[intent] = {}
+            for language, terms in (entry.get("keywords") or {}).items():
+                tokens = frozenset(
+                    t for term in terms or [] if isinstance(term, str) for t in tokenize(term))
+                if tokens:
+                    keywords[language] = tokens
+                    vocabulary.setdefault(language, set()).update(tokens)
+
+        document_frequency: Counter = Counter()
+        for _, _, grams in examples:
+            document_frequency.update(grams.keys())
+        count = len(examples)
+        self.idf = {g: math.log((1 + count) / (1 + df)) + 1 for g, df in document_frequency.items()}
+        self.examples: Dict[str, List[Tuple[str, Vector]]] = {}
+        for intent, language, grams in examples:
+            self.examples.setdefault(language, []).append((intent, self._vector(grams)))
+
+    def _vector(self, grams: Counter) -> Vector:
+        # Unseen grams get the highest idf, so off-topic words lower the confidence
+        unseen = math.log(1 + len(self.idf)) + 1
+        return normalize({g: tf * self.idf.get(g, unseen) for g, tf in grams.items()})
+
+    def __len__(self) -> int:
+        return len(self.answers)
+
+    def on_topic(self, intent: str, tokens: Set[str], language: str) -> bool:
+        """True when `tokens` hold one of the intent's key terms and nothing outside its vocabulary."""
+        keywords = self.keywords[intent]
+        required = keywords.get(language) or frozenset().union(*keywords.values())
+        if required and not tokens & required:
+            return False
+        vocabulary = self.vocabulary[intent]
+        known = vocabulary.get(language) or set().union(*vocabulary.values())
+        return not (tokens - known)
+
+    def match(self, text: str, language: str = "fr") -> Optional[IntentMatch]:
+        """Best intent for `text` with its confidence (cosine, 0-1); None without
+        examples or when the question is not about that intent (see on_topic)."""
+        candidates = self.examples.get(language) or [
+            example for examples in self.examples.values() for example in examples]
+        query = self._vector(features(text))
+        if not query or not candidates:
+            return None
+        best_intent, best_score = "", 0.0
+        for intent, example in candidates:
+            score = sum(weight * example.get(gram, 0.0) for gram, weight in query.items())
+            if score > best_score:
+                best_intent, best_score = intent, score
+        if not best_intent or not self.on_topic(best_intent, set(tokenize(text)) - FILLER_WORDS, language):
+            return None
+        answers = self.answers[best_intent]
+        choices = answers.get(language) or answers.get("en") or next(iter(answers.values()))
+        return IntentMatch(best_intent, random.choice(choices), best_score)
+
+
+class MatchStats:
+    """Hit rate and confidence of the fast path, kept across prompt reloads."""
+
+    def __init__(self):
+        self.checked = 0
+        self.hits = 0
+        self.hit_confidence = 0.0
+        self.by_intent: Counter = Counter()
+
+    def record(self, match: Optional[IntentMatch], hit: bool) -> None:
+        self.checked += 1
+        if hit and match is not None:
+            self.hits += 1
+            self.hit_confidence += match.confidence
+            self.by_intent[match.intent] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "checked": self.checked,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.checked, 4) if self.checked else 0.0,
+            "avg_hit_confidence": round(self.hit_confidence / self.hits, 3) if self.hits else 0.0,
+            "by_intent": dict(self.by_intent),
+        }
@@ -0,0 +1,89 @@
+"""
+Lazy Resources
+Heavy clients and modules built on first use or by a background warm-up
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Generic, List, Optional, TypeVar
+
+from logging_config import logger
+
+T = TypeVar("T")
+
+_resources: List["LazyResource[Any]"] = []
+
+
+class LazyResource(Generic[T]):
+    """A value built once, on the first get() or by warm_up(), whichever comes first.
+
+    The factory is synchronous (typically an import plus a constructor) and
+    runs in a worker thread so a slow import never blocks the event loop.
+    Concurrent callers wait for the same build. A failed build is retried on
+    the next get().
+    """
+
+    def __init__(self, name: str, factory: Callable[[], T],
+                 close: Optional[Callable[[T], Awaitable[None]]] = None):
+        self.name = name
+        self.factory = factory
+        self.close_fn = close
+        self.value: Optional[T] = None
+        self.init_seconds: Optional[float] = None
+        self.error: Optional[str] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._warm_task: Optional["asyncio.Task[Any]"] = None
+        _resources.append(self)
+
+    @property
+    def ready(self) -> bool:
+        return self.value is not None
+
+    async def get(self) -> T:
+        if self.value is not None:
+            return self.value
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self.value is None:
+                started = time.perf_counter()
+                try:
+                    self.value = await asyncio.to_thread(self.factory)
+                except Exception as e:
+                    self.error = str(e)
+                    raise
+                self.error = None
+                self.init_seconds = time.perf_counter() - started
+                logger.info(
+                    f"Lazy resource '{self.name}' ready in {self.init_seconds * 1000:.0f}ms")
+        return self.value  # type: ignore[return-value]
+
+    def warm_up(self) -> None:
+        """Start building in the background without delaying the caller."""
+        if self.value is None and self._warm_task is None:
+            async def warm() -> None:
+                try:
+                    await self.get()
+                except Exception as e:
+                    logger.error(f"Warm-up of '{self.name}' failed: {str(e)}")
+            self._warm_task = asyncio.ensure_future(warm())
+
+    async def aclose(self) -> None:
+        if self._warm_task is not None and not self._warm_task.done():
+            self._warm_task.cancel()
+        self._warm_task = None
+        value, self.value = self.value, None
+        if value is not None and self.close_fn is not None:
+            await self.close_fn(value)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "init_ms": round(self.init_seconds * 1000, 1) if self.init_seconds is not None else None,
+            "error": self.error,
+        }
+
+
+def lazy_status() -> Dict[str, Any]:
+    """State of every lazy resource for /api/v1/status."""
+    return {resource.name: resource.stats() for resource in _resources}
@@ -0,0 +1,405 @@
+"""
+Lead Store
+Indexed SQLite (WAL) store of contact leads with batched writes and keyset pagination
+
+Usage:
+    python lead_store.py bench --leads 1000000 --output leads.json
+    python lead_store.py import-contacts data/contact_jobs.db
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from batching import MicroBatcher
+from logging_config import logger
+
+LEAD_STORE_DB = Path(os.getenv(
+    "LEAD_STORE_DB", str(Path(__file__).parent / "data" / "leads.db")))
+# Concurrent inserts are committed together: up to this many rows per transaction...
+LEAD_STORE_BATCH_MAX = int(os.getenv("LEAD_STORE_BATCH_MAX", "256"))
+# ...gathered for at most this many seconds
+LEAD_STORE_BATCH_WINDOW = float(os.getenv("LEAD_STORE_BATCH_WINDOW", "0.005"))
+LEADS_PAGE_MAX = 200
+
+CROCKFORD = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+
+# The id is time-sortable and the table is clustered on it, so the primary
+# key doubles as the timestamp index (created ranges map to id ranges)
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS leads (
+    id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    email TEXT NOT NULL,
+    name TEXT NOT NULL,
+    company TEXT NOT NULL COLLATE NOCASE,
+    sector TEXT NOT NULL COLLATE NOCASE,
+    source TEXT,
+    data TEXT NOT NULL,
+    request_key TEXT
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_leads_email ON leads (email, id);
+CREATE INDEX IF NOT EXISTS idx_leads_company ON leads (company, id);
+CREATE INDEX IF NOT EXISTS idx_leads_sector ON leads (sector, id);
+"""
+# The submission a lead came from (Idempotency-Key or form digest), so a retry
+# finds it; added after the first release, indexed once the column exists
+REQUEST_KEY_INDEX = "CREATE INDEX IF NOT EXISTS idx_leads_request_key ON leads (request_key, id)"
+
+LEAD_COLUMNS = "id, created_at, email, name, company, sector, source, data"
+
+
+class LeadIdGenerator:
+    """ULID-style ids: 48-bit millisecond time + 80 random bits, Crockford base32.
+
+    Ids sort by creation time as plain strings. Within one millisecond the
+    random part is incremented, so ids from one process stay strictly
+    increasing; across processes the 80 random bits make collisions
+    practically impossible.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._last_random = 0
+
+    def new(self, now: Optional[float] = None) -> str:
+        ms = int((time.time() if now is None else now) * 1000)
+        with self._lock:
+            if ms <= self._last_ms:
+                ms = self._last_ms
+                self._last_random = (self._last_random + 1) % (1 << 80)
+            else:
+                self._last_random = random.getrandbits(80)
+            self._last_ms = ms
+            value = (ms << 80) | self._last_random
+        return encode_id(value)
+
+
+def encode_id(value: int) -> str:
+    chars = []
+    for _ in range(26):
+        chars.append(CROCKFORD[value & 31])
+        value >>= 5
+    return "".join(reversed(chars))
+
+
+def id_floor(timestamp: float) -> str:
+    """Smallest id that can be created at `timestamp` (for time-range queries)."""
+    return encode_id(int(timestamp * 1000) << 80)
+
+
+new_lead_id = LeadIdGenerator().new
+
+
+def parse_iso_timestamp(value: str) -> float:
+    """Unix timestamp of an ISO 8601 date or datetime; a trailing Z (which
+    fromisoformat only accepts from Python 3.11) and naive values mean UTC."""
+    value = value.strip()
+    if value[-1:] in ("Z", "z"):
+        value = value[:-1] + "+00:00"
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def lead_row(lead_id: str, contact: Dict[str, Any], created_at: float,
+             request_key: Optional[str] = None) -> tuple:
+    return (
+        lead_id,
+        created_at,
+        str(contact.get("email", "")).strip().lower(),
+        str(contact.get("name", "")),
+        str(contact.get("company", "")),
+        str(contact.get("sector", "")),
+        contact.get("source"),
+        json.dumps(contact, ensure_ascii=False),
+        request_key,
+    )
+
+
+def row_to_lead(row: tuple) -> Dict[str, Any]:
+    lead = json.loads(row[7])
+    lead.update({"id": row[0], "created_at": row[1]})
+    return lead
+
+
+class LeadStore:
+    """Contact leads in SQLite (WAL), written in batches off the event loop.
+
+    add() hands the row to a MicroBatcher: inserts arriving together are
+    committed in one transaction on the writer connection, in a worker
+    thread, and each caller resumes once its row is durable. Queries use a
+    separate reader connection, which WAL lets run alongside the writer.
+    """
+
+    def __init__(self, db_path: Path = LEAD_STORE_DB, batch_max: int = LEAD_STORE_BATCH_MAX,
+                 batch_window: float = LEAD_STORE_BATCH_WINDOW):
+        self.db_path = db_path
+        self._write_lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        self._writer: Optional[sqlite3.Connection] = None
+        self._reader: Optional[sqlite3.Connection] = None
+        self.batcher = MicroBatcher(self._insert_batch, batch_max, batch_window)
+        self.written = 0
+
+    # -- SQLite helpers (run in a thread) --------------------------------
+
+    def _open(self) -> sqlite3.Connection:
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    def _writer_conn(self) -> sqlite3.Connection:
+        if self._writer is None:
+            writer = self._open()
+            writer.executescript(SCHEMA)
+            if "request_key" not in {row[1] for row in writer.execute("PRAGMA table_info(leads)")}:
+                writer.execute("ALTER TABLE leads ADD COLUMN request_key TEXT")
+            writer.execute(REQUEST_KEY_INDEX)
+            self._writer = writer
+        return self._writer
+
+    def _reader_conn(self) -> sqlite3.Connection:
+        if self._reader is None:
+            self._writer_conn()  # creates the schema
+            self._reader = self._open()
+        return self._reader
+
+    def _insert_batch(self, rows: List[tuple]) -> List[str]:
+        with self._write_lock:
+            conn = self._writer_conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    f"INSERT OR IGNORE INTO leads ({LEAD_COLUMNS}, request_key) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        self.written += len(rows)
+        return [row[0] for row in rows]
+
+    def _query_sync(self, sql: str, params: tuple) -> List[tuple]:
+        with self._read_lock:
+            return self._reader_conn().execute(sql, params).fetchall()
+
+    # -- public API -------------------------------------------------------
+
+    async def add(self, contact: Dict[str, Any], lead_id: Optional[str] = None,
+                  request_key: Optional[str] = None) -> str:
+        """Durably store a lead (idempotent on its id) and return the id."""
+        now = time.time()
+        lead_id = lead_id or new_lead_id(now)
+        return await self.batcher.submit(lead_row(lead_id, contact, now, request_key))
+
+    async def find_request(self, request_key: str, since: float) -> Optional[str]:
+        """Id of the newest lead stored since `since` for a submission key, if any."""
+        rows = await asyncio.to_thread(
+            self._query_sync,
+            "SELECT id FROM leads WHERE request_key = ? AND id >= ? ORDER BY id DESC LIMIT 1",
+            (request_key, id_floor(since)))
+        return rows[0][0] if rows else None
+
+    async def get(self, lead_id: str) -> Optional[Dict[str, Any]]:
+        rows = await asyncio.to_thread(
+            self._query_sync, f"SELECT {LEAD_COLUMNS} FROM leads WHERE id = ?", (lead_id,))
+        return row_to_lead(rows[0]) if rows else None
+
+    async def query(
+        self,
+        email: Optional[str] = None,
+        company: Optional[str] = None,
+        sector: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        cursor: Optional[str] = None,
+        limit: int = 50,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """One page of leads, newest first, and the cursor of the next page.
+
+        Filters are exact (email and company/sector case-insensitive);
+        `since`/`until` are Unix timestamps. Pages are keyset-paginated on
+        the id, so deep pages cost the same as the first.
+        """
+        limit = max(1, min(limit, LEADS_PAGE_MAX))
+        clauses: List[str] = []
+        params: List[Any] = []
+        for column, value in (("email", email.strip().lower() if email else None),
+                              ("company", company), ("sector", sector)):
+            if value:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("id >= ?")
+            params.append(id_floor(since))
+        if until is not None:
+            clauses.append("id < ?")
+            params.append(id_floor(until))
+        if cursor:
+            clauses.append("id < ?")
+            params.append(cursor)
+        where = f"WHERE {' AND '.join(clauses)} " if clauses else ""
+        rows = await asyncio.to_thread(
+            self._query_sync,
+            f"SELECT {LEAD_COLUMNS} FROM leads {where}ORDER BY id DESC LIMIT ?",
+            (*params, limit + 1))
+        next_cursor = rows[limit - 1][0] if len(rows) > limit else None
+        return [row_to_lead(row) for row in rows[:limit]], next_cursor
+
+    async def close(self) -> None:
+        await self.batcher.aclose()
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        with self._read_lock:
+            if self._reader is not None:
+                self._reader.close()
+                self._reader = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Writes by this process and their batching, for /api/v1/status."""
+        return {"db": str(self.db_path), "written": self.written, "batching": self.batcher.stats()}
+
+
+# Tools
+
+
+def import_contacts(store: LeadStore, jobs_db: Path) -> int:
+    """Copy the records of the former contacts table of the job queue database."""
+    conn = sqlite3.connect(str(jobs_db))
+    try:
+        rows = conn.execute("SELECT contact_id, data, created_at FROM contacts").fetchall()
+    except sqlite3.OperationalError:
+        rows = []
+    finally:
+        conn.close()
+    batch = []
+    for _, data, created_at in rows:
+        contact = json.loads(data)
+        batch.append(lead_row(new_lead_id(created_at), contact, created_at))
+    for start in range(0, len(batch), 1000):
+        store._insert_batch(batch[start:start + 1000])
+    return len(batch)
+
+
+SECTORS = ["industrie", "energie", "logistique", "sante", "finance", "retail", "agro", "btp"]
+
+
+def fake_lead(i: int) -> Dict[str, Any]:
+    company = f"Entreprise {i % 50000}"
+    return {
+        "name": f"Prospect {i}",
+        "email": f"prospect{i}@example{i % 1000}.fr",
+        "company": company,
+        "sector": SECTORS[i % len(SECTORS)],
+        "message": "Nous souhaitons un pilote d'agent IA pour notre usine.",
+        "gdpr": True,
+        "source": "contact_form",
+    }
+
+
+async def run_benchmark(leads: int, concurrency: int, db_path: Path) -> Dict[str, Any]:
+    """Write `leads` through the batched add() path, then time typical sales queries."""
+    for suffix in ("", "-wal", "-shm"):
+        Path(f"{db_path}{suffix}").unlink(missing_ok=True)
+    store = LeadStore(db_path)
+
+    started = time.perf_counter()
+    next_index = 0
+
+    async def writer() -> None:
+        nonlocal next_index
+        while next_index < leads:
+            i = next_index
+            next_index += 1
+            await store.add(fake_lead(i))
+
+    await asyncio.gather(*(writer() for _ in range(concurrency)))
+    write_seconds = time.perf_counter() - started
+
+    async def timed(**filters: Any) -> float:
+        began = time.perf_counter()
+        await store.query(**filters)
+        return (time.perf_counter() - began) * 1000
+
+    page, cursor = await store.query(limit=50)
+    for _ in range(100):  # walk 100 pages deep
+        page, cursor = await store.query(limit=50, cursor=cursor)
+    deep_cursor = cursor
+    now = time.time()
+    cases = {
+        "latest_page": lambda: timed(limit=50),
+        "deep_page": lambda: timed(limit=50, cursor=deep_cursor),
+        "by_email": lambda: timed(email=fake_lead(random.randrange(leads))["email"]),
+        "by_company": lambda: timed(company=f"entreprise {random.randrange(50000)}"),
+        "by_sector": lambda: timed(sector=random.choice(SECTORS), limit=50),
+        "last_minute": lambda: timed(since=now - 60, limit=50),
+    }
+    queries = {}
+    for name, run in cases.items():
+        samples = sorted([await run() for _ in range(200)])
+        queries[name] = {
+            "p50_ms": round(statistics.median(samples), 3),
+            "p99_ms": round(samples[int(len(samples) * 0.99) - 1], 3),
+        }
+    stats = store.stats()
+    await store.close()
+    return {
+        "leads": leads,
+        "concurrency": concurrency,
+        "write": {
+            "seconds": round(write_seconds, 2),
+            "leads_per_second": round(leads / write_seconds),
+            "avg_batch": stats["batching"]["avg_batch"],
+            "transactions": stats["batching"]["batches"],
+        },
+        "db_bytes": sum(Path(f"{db_path}{s}").stat().st_size
+                        for s in ("", "-wal") if Path(f"{db_path}{s}").exists()),
+        "queries": queries,
+    }
+
+
+def main_cli(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Lead store tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    bench = sub.add_parser("bench", help="write throughput and query latency")
+    bench.add_argument("--leads", type=int, default=1_000_000)
+    bench.add_argument("--concurrency", type=int, default=256, help="concurrent add() callers")
+    bench.add_argument("--db", default=str(Path(tempfile.gettempdir()) / "bench_leads.db"))
+    bench.add_argument("--output", help="write the JSON report to this file")
+    migrate = sub.add_parser("import-contacts", help="copy leads from the old contacts table")
+    migrate.add_argument("jobs_db")
+    args = parser.parse_args(argv)
+
+    if args.command == "bench":
+        report = asyncio.run(run_benchmark(args.leads, args.concurrency, Path(args.db)))
+        text = json.dumps(report, indent=2)
+        if args.output:
+            Path(args.output).write_text(text + "\n", encoding="utf-8")
+        print(text)
+    else:
+        store = LeadStore()
+        count = import_contacts(store, Path(args.jobs_db))
+        logger.info(f"Imported {count} contacts into {store.db_path}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -7,29 +7,234 @@ import os
 import logging
 import json
 import sys
+import queue
+import threading
+import time
+import atexit
+from contextvars import ContextVar
 from datetime import datetime
+from typing import Optional
+
+try:
+    import orjson  # type: ignore
+except ImportError:  # optional faster encoder
+    orjson = None
+
+
+# ID of the request being handled, set by tracing.TracingMiddleware
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+
+def _dumps(log_entry: dict) -> str:
+    """Encode a log entry with orjson when available, else the stdlib json."""
+    if orjson is not None:
+        return orjson.dumps(log_entry, default=str).decode("utf-8")
+    return json.dumps(log_entry)
 
 
 class RailwayJSONFormatter(logging.Formatter):
     """Custom JSON formatter for Railway logs."""
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Timestamp prefix ("YYYY-MM-DDTHH:MM:SS") cached per wall-clock second
+        self._cached_second = -1
+        self._cached_prefix = ""
+
+    def format_timestamp(self, created: float) -> str:
+        second = int(created)
+        if second != self._cached_second:
+            self._cached_prefix = datetime.fromtimestamp(
+                second).isoformat()
+            self._cached_second = second
+        micros = int((created - second) * 1_000_000)
+        return f"{self._cached_prefix}.{micros:06d}Z"
+
     def format(self, record):
         # Create the log entry
         log_entry = {
             "level": record.levelname.lower(),
             "message": record.getMessage(),
-            "timestamp": datetime.fromtimestamp(record.created).isoformat() + "Z",
+            "timestamp": self.format_timestamp(record.created),
             "logger": record.name,
             "module": record.module,
             "function": record.funcName,
             "line": record.lineno
         }
 
+        # Request ID (stamped by RequestIdFilter) and a request's stage timings
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            log_entry["request_id"] = request_id
+        trace = getattr(record, "trace", None)
+        if trace is not None:
+            log_entry["trace"] = trace
+
         # Add exception info if present
         if record.exc_info:
             log_entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            log_entry["exception"] = record.exc_text
+
+        return _dumps(log_entry)
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp records with the current request ID.
+
+    Runs in the thread that logs, where the request's context is visible;
+    AsyncBatchingHandler formats records later on its writer thread.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "request_id"):
+            record.request_id = request_id_var.get()
+        return True
+
 
-        return json.dumps(log_entry)
+class AsyncBatchingHandler(logging.Handler):
+    """Queue-based handler whose background thread formats and writes in batches.
+
+    The calling thread only enqueues the record. When the bounded queue is
+    above `sample_watermark` of its capacity, only one in `sample_rate`
+    records below WARNING is kept; when it is full, records are dropped
+    (WARNING and above wait up to `block_timeout` first). Records that fail
+    to format or to reach the stream count as errors, not as written.
+    Counters are available through stats().
+    """
+
+    def __init__(self, stream=None, max_queue: int = 10000, batch_size: int = 256,
+                 flush_interval: float = 0.05, sample_rate: int = 10,
+                 sample_watermark: float = 0.75, block_timeout: float = 0.05):
+        super().__init__()
+        self.stream = stream or sys.stdout
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.sample_rate = max(1, sample_rate)
+        self.block_timeout = block_timeout
+        self._queue: "queue.Queue[logging.LogRecord]" = queue.Queue(max_queue)
+        self._high_water = int(max_queue * sample_watermark)
+        self._sample_counter = 0
+        self._stop = object()
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self.sampled_out = 0
+        self.batches = 0
+        self.emit_seconds = 0.0
+        self._start_writer()
+        atexit.register(self.close)
+        if hasattr(os, "register_at_fork"):
+            # Threads do not survive fork: give forked workers their own queue and writer
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _start_writer(self) -> None:
+        self._thread = threading.Thread(
+            target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def _after_fork(self) -> None:
+        self._queue = queue.Queue(self._queue.maxsize)
+        self.createLock()
+        self._start_writer()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Freeze message and exception text so the record is safe to format later."""
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def emit(self, record: logging.LogRecord) -> None:
+        started = time.perf_counter()
+        try:
+            if record.levelno < logging.WARNING and self._queue.qsize() >= self._high_water:
+                self._sample_counter += 1
+                if self._sample_counter % self.sample_rate:
+                    self.sampled_out += 1
+                    return
+            record = self.prepare(record)
+            try:
+                if record.levelno >= logging.WARNING:
+                    self._queue.put(record, timeout=self.block_timeout)
+                else:
+                    self._queue.put_nowait(record)
+                self.enqueued += 1
+            except queue.Full:
+                self.dropped += 1
+        except Exception:
+            self.handleError(record)
+        finally:
+            self.emit_seconds += time.perf_counter() - started
+
+    def _run(self) -> None:
+        while True:
+            try:
+                record = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            batch = [record]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = self._stop in batch
+            self._write([r for r in batch if r is not self._stop])
+            if stop:
+                return
+            if len(batch) < self.batch_size:
+                # Let records accumulate so writes stay batched under light load
+                time.sleep(self.flush_interval)
+
+    def _write(self, batch) -> None:
+        if not batch:
+            return
+        lines = []
+        for record in batch:
+            try:
+                lines.append(self.format(record))
+            except Exception:
+                self.errors += 1
+                self.handleError(record)
+        if not lines:
+            return
+        try:
+            self.stream.write("\n".join(lines) + "\n")
+            self.stream.flush()
+        except Exception:
+            self.errors += len(lines)
+            return
+        self.written += len(lines)
+        self.batches += 1
+
+    def close(self) -> None:
+        """Flush queued records and stop the writer thread."""
+        if self._thread.is_alive():
+            try:
+                self._queue.put(self._stop, timeout=1.0)  # type: ignore
+            except queue.Full:
+                pass
+            self._thread.join(timeout=2.0)
+        super().close()
+
+    def stats(self) -> dict:
+        """Queue and throughput counters (emit_us_avg is the calling-thread cost)."""
+        handled = self.enqueued + self.dropped + self.sampled_out
+        return {
+            "mode": "async",
+            "queued": self._queue.qsize(),
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "sampled_out": self.sampled_out,
+            "batches": self.batches,
+            "emit_us_avg": round(self.emit_seconds / handled * 1_000_000, 2) if handled else 0.0,
+        }
 
 
 def setup_railway_logging():
@@ -51,9 +256,21 @@ def setup_railway_logging():
         logger.removeHandler(handler)
 
     # Create console handler with Railway JSON formatter
-    console_handler = logging.StreamHandler(sys.stdout)
+    # LOG_ASYNC=true moves formatting and stdout writes off the calling thread
+    console_handler: logging.Handler
+    if os.getenv("LOG_ASYNC", "false").lower() == "true":
+        console_handler = AsyncBatchingHandler(
+            sys.stdout,
+            max_queue=int(os.getenv("LOG_QUEUE_SIZE", "10000")),
+            batch_size=int(os.getenv("LOG_BATCH_SIZE", "256")),
+            flush_interval=float(os.getenv("LOG_FLUSH_INTERVAL", "0.05")),
+            sample_rate=int(os.getenv("LOG_SAMPLE_RATE", "10")),
+        )
+    else:
+        console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setLevel(log_level)
     console_handler.setFormatter(RailwayJSONFormatter())
+    console_handler.addFilter(RequestIdFilter())
 
     # Add handler to root logger so all logs are formatted consistently
     root_logger = logging.getLogger()
@@ -61,14 +278,18 @@ def setup_railway_logging():
     root_logger.handlers.clear()
     root_logger.addHandler(console_handler)
 
-    # Test the logging format on startup
-    logger.info("Railway JSON logging initialized successfully")
-    logger.debug("Debug logging enabled")
-    logger.warning("This is a warning message for testing")
+    logger.debug("Railway JSON logging initialized")
 
     return logger, console_handler, log_level
 
 
+def log_stats(handler: logging.Handler) -> dict:
+    """Logging pipeline counters for the status endpoint."""
+    if isinstance(handler, AsyncBatchingHandler):
+        return handler.stats()
+    return {"mode": "sync"}
+
+
 def configure_uvicorn_logging(console_handler):
     """
     Configure uvicorn to use the same JSON formatter.
@@ -90,4 +311,5 @@ logger, console_handler, log_level = setup_railway_logging()
 
 # Make sure console_handler is available globally
 __all__ = ['logger', 'console_handler', 'log_level',
-           'configure_uvicorn_logging', 'RailwayJSONFormatter']
+           'configure_uvicorn_logging', 'RailwayJSONFormatter',
+           'AsyncBatchingHandler', 'RequestIdFilter', 'request_id_var', 'log_stats']
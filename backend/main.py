@@ -3,51 +3,132 @@ Kokotajlo Backend API
 FastAPI application for AI agent services targeting French businesses
 """
 
-from fastapi import FastAPI, HTTPException, Request
+import time
+
+# Module import start, for the startup timings in /api/v1/status
+IMPORT_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
+from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
-from slowapi.middleware import SlowAPIMiddleware
+from slowapi.middleware import SlowAPIASGIMiddleware, SlowAPIMiddleware
 import os
 from dotenv import load_dotenv
-from typing import Optional, Dict, Any, List
+from typing import TYPE_CHECKING, Optional, Dict, Any, List, AsyncIterator, Tuple
 import logging
-import uvicorn
-from openai import OpenAI
-import yaml  # type: ignore
 from pathlib import Path
-import requests  # type: ignore
-from logging_config import logger, console_handler, log_level, configure_uvicorn_logging
+import httpx
+from logging_config import logger, console_handler, log_level, configure_uvicorn_logging, log_stats
+from routing import ChatRouter, RouteResult
+from circuit_breaker import CircuitBreaker
+from streaming import StreamFailed, sse_event, extract_n8n_text, iter_n8n_chunks
+from response_cache import ResponseCache, cache_key
+from prompt_registry import PromptRegistry
+from contact_jobs import ContactJobQueue
+from conversation_store import ConversationStore
+from rate_limit import (build_limiter, limiter_status, client_ip, RATE_LIMIT_CHAT, RATE_LIMIT_CONTACT,
+                        TRUSTED_PROXY_HOPS)
+from single_flight import SingleFlight, SingleFlightOverflow
+from metrics import (METRICS_ENABLED, MetricsExporter, MetricsMiddleware, observe_upstream,
+                     CHAT_REPLIES, RATE_LIMITED, OPENAI_TOKENS, USAGE_BUDGET_REJECTIONS,
+                     FAST_PATH_CHECKS, FAST_PATH_CONFIDENCE)
+from usage import USAGE_IP_TOKENS_PER_HOUR, UsageTracker, prompt_size_report
+from lazy import LazyResource, lazy_status
+from intent_matcher import IntentMatch, MatchStats
+from upstream_traffic import UpstreamTraffic
+from runtime_profile import (PERFORMANCE, STATUS_CACHE_SECONDS, FastJSONResponse, dump_json,
+                             json_bytes_response, model_response, profile_status, uvicorn_options)
+from tracing import (TRACING_ENABLED, TracingMiddleware, add_stage, request_id_headers, stage,
+                     tracing_status)
+from idempotency import (IDEMPOTENCY_HEADER, REPLAYED_HEADER, IdempotencyConflict, IdempotencyStore,
+                         InvalidIdempotencyKey, fingerprint)
+from lead_store import LEAD_STORE_DB, LeadStore, new_lead_id, parse_iso_timestamp
+from payload_limits import (MAX_REQUEST_BODY_BYTES, BodySizeLimitMiddleware, check_chat_payload,
+                            sanitize_context)
+from model_providers import ModelProvider, OpenAIChatProvider, build_providers, LOCAL_LLM_URL
+from retrieval import (RETRIEVAL_ENABLED, RETRIEVAL_INDEX_PATH, RetrievalIndex, format_snippets,
+                       open_index)
 import uuid
+from functools import lru_cache
+import asyncio
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
 
 # Load environment variables
 load_dotenv()
 
 # Constants
-OPENAI_MODEL = "gpt-4o-mini"
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 N8N_URL = os.getenv("N8N_URL", "")
 
+# Upstream HTTP tuning (shared pooled clients, created on startup)
+N8N_TIMEOUT = float(os.getenv("N8N_TIMEOUT", "30"))
+N8N_CONNECT_TIMEOUT = float(os.getenv("N8N_CONNECT_TIMEOUT", "5"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "30"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "1"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(
+    os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+
+# Upstream routing policy between n8n and OpenAI (sequential | hedged | race)
+CHAT_ROUTING_MODE = os.getenv("CHAT_ROUTING_MODE", "sequential").lower()
+CHAT_LATENCY_BUDGET = float(os.getenv("CHAT_LATENCY_BUDGET", "35"))
+CHAT_HEDGE_DELAY = float(os.getenv("CHAT_HEDGE_DELAY", "2"))
+CHAT_HEDGE_PERCENTILE = float(os.getenv("CHAT_HEDGE_PERCENTILE", "95"))
+CHAT_HEDGE_MIN_SAMPLES = int(os.getenv("CHAT_HEDGE_MIN_SAMPLES", "20"))
+
+# Per-upstream circuit breakers (rolling error rate / latency windows)
+BREAKER_WINDOW = float(os.getenv("BREAKER_WINDOW", "60"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "5"))
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))
+BREAKER_SLOW_CALL_SECONDS = float(os.getenv("BREAKER_SLOW_CALL_SECONDS", "10"))
+BREAKER_SLOW_CALL_RATE = float(os.getenv("BREAKER_SLOW_CALL_RATE", "0.8"))
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))
+BREAKER_TRIAL_INTERVAL = float(os.getenv("BREAKER_TRIAL_INTERVAL", "5"))
+
+# Response cache for repeated first questions
+CHAT_CACHE_ENABLED = os.getenv("CHAT_CACHE_ENABLED", "true").lower() == "true"
+CHAT_CACHE_MAX_ENTRIES = int(os.getenv("CHAT_CACHE_MAX_ENTRIES", "1024"))
+CHAT_CACHE_TTL = float(os.getenv("CHAT_CACHE_TTL", "3600"))
+CHAT_CACHE_MAX_BYTES = int(os.getenv("CHAT_CACHE_MAX_BYTES", str(2 * 1024 * 1024)))
+
+# Coalescing of identical in-flight chat requests (same cache key)
+CHAT_COALESCE_ENABLED = os.getenv("CHAT_COALESCE_ENABLED", "true").lower() == "true"
+CHAT_COALESCE_MAX_WAITERS = int(os.getenv("CHAT_COALESCE_MAX_WAITERS", "100"))
+
+# Background contact job queue (emails), journaled in SQLite
+CONTACT_QUEUE_DB = Path(os.getenv(
+    "CONTACT_QUEUE_DB", str(Path(__file__).parent / "data" / "contact_jobs.db")))
+CONTACT_QUEUE_WORKERS = int(os.getenv("CONTACT_QUEUE_WORKERS", "2"))
+CONTACT_QUEUE_MAX_ATTEMPTS = int(os.getenv("CONTACT_QUEUE_MAX_ATTEMPTS", "5"))
+CONTACT_QUEUE_RETRY_DELAY = float(os.getenv("CONTACT_QUEUE_RETRY_DELAY", "2"))
+# Seconds a claimed job belongs to its worker process before another may take it back
+CONTACT_QUEUE_LEASE = float(os.getenv("CONTACT_QUEUE_LEASE", "300"))
+# Seconds a job handler may run before it is abandoned and retried (at most half the lease)
+CONTACT_QUEUE_JOB_TIMEOUT = float(os.getenv("CONTACT_QUEUE_JOB_TIMEOUT", "60"))
+
+# Sales team access to GET /api/v1/leads (Bearer token); empty disables the endpoint
+LEADS_API_KEY = os.getenv("LEADS_API_KEY", "")
+
+# Server-side conversation memory per sessionId (used by the OpenAI fallback)
+CONVERSATION_MAX_SESSIONS = int(os.getenv("CONVERSATION_MAX_SESSIONS", "5000"))
+CONVERSATION_TTL = float(os.getenv("CONVERSATION_TTL", "3600"))
+CONVERSATION_MAX_TOKENS = int(os.getenv("CONVERSATION_MAX_TOKENS", "1200"))
+CONVERSATION_KEEP_TURNS = int(os.getenv("CONVERSATION_KEEP_TURNS", "6"))
+CONVERSATION_DB = os.getenv("CONVERSATION_DB", "")
+
+# Canned-answer fast path: first questions of a session answered from fallback.yaml intents
+FAQ_FAST_PATH_ENABLED = os.getenv("FAQ_FAST_PATH_ENABLED", "true").lower() == "true"
+FAQ_MATCH_THRESHOLD = float(os.getenv("FAQ_MATCH_THRESHOLD", "0.7"))
+
+# Seconds between prompt YAML change checks (0 disables hot reload)
+PROMPTS_RELOAD_INTERVAL = float(os.getenv("PROMPTS_RELOAD_INTERVAL", "2"))
 
-def load_prompts(file_path: str) -> dict:
-    """Load prompts from YAML file with error handling."""
-    try:
-        logger.info(
-            f"Attempting to load prompts from absolute path: {Path(file_path).absolute()}")
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return yaml.safe_load(f)
-    except FileNotFoundError:
-        logger.error(f"Prompts file not found: {file_path}")
-        return {}
-    except yaml.YAMLError as e:
-        logger.error(f"Error parsing YAML file {file_path}: {str(e)}")
-        return {}
-    except Exception as e:
-        logger.error(
-            f"Unexpected error loading prompts from {file_path}: {str(e)}")
-        return {}
 
 # Pydantic models
 
@@ -83,97 +164,197 @@ class ContactResponse(BaseModel):
     timestamp: str
 
 
-# Initialize OpenAI client (only if API key is available)
+# OpenAI availability (the async client itself is created on startup)
 openai_api_key = os.getenv("OPENAI_API_KEY")
 if openai_api_key and openai_api_key != "stub":
-    openai_client: Optional[OpenAI] = OpenAI(api_key=openai_api_key)
     OPENAI_AVAILABLE = True
 else:
-    openai_client = None
     OPENAI_AVAILABLE = False
     logger.warning("OpenAI API key not configured - using fallback responses")
 
-# Load prompts from YAML files
+# Shared upstream clients, owned by startup_event/shutdown_event
+http_client: Optional[httpx.AsyncClient] = None
+
+
+def build_http_limits() -> httpx.Limits:
+    """Connection pool limits shared by the n8n and OpenAI clients."""
+    return httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+
+
+# Record/replay of upstream exchanges (UPSTREAM_TRAFFIC_MODE), off by default
+upstream_traffic = UpstreamTraffic()
+
+
+def build_openai_client(base_url: Optional[str] = None,
+                        api_key: Optional[str] = None) -> "AsyncOpenAI":
+    """Import the OpenAI SDK (slow) and create a pooled async client.
+
+    With `base_url` the client targets an OpenAI-compatible server instead.
+    """
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+    return AsyncOpenAI(
+        api_key=api_key or openai_api_key,
+        base_url=base_url,
+        timeout=OPENAI_TIMEOUT,
+        max_retries=OPENAI_MAX_RETRIES,
+        http_client=DefaultAsyncHttpxClient(
+            limits=build_http_limits(),
+            transport=upstream_traffic.transport(build_http_limits(), DefaultAsyncHttpxClient)),
+    )
+
+
+async def close_openai_client(client: "AsyncOpenAI") -> None:
+    await client.close()
+
+
+# Built by a background warm-up after startup, or on the first OpenAI call
+openai_client = LazyResource("openai", build_openai_client, close_openai_client)
+
+# Model providers for the fallback tier; each page picks one in system.yaml
+model_providers = build_providers(
+    OpenAIChatProvider("openai", OPENAI_MODEL, openai_client) if OPENAI_AVAILABLE else None,
+    build_openai_client,
+    close_openai_client,
+)
+
+
+async def init_upstream_clients() -> None:
+    """Create the n8n client and start warming up the model providers."""
+    global http_client
+    if http_client is None:
+        http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(N8N_TIMEOUT, connect=N8N_CONNECT_TIMEOUT),
+            limits=build_http_limits(),
+            transport=upstream_traffic.transport(build_http_limits()),
+        )
+    if upstream_traffic.mode != "off":
+        logger.warning(f"Upstream traffic {upstream_traffic.mode} mode ({upstream_traffic.path})")
+    model_providers.warm_up()
+    logger.info(
+        f"Upstream clients ready (max_connections={HTTP_MAX_CONNECTIONS}, keepalive={HTTP_MAX_KEEPALIVE_CONNECTIONS})")
+
+
+async def close_upstream_clients() -> None:
+    """Close the pooled async clients and release their connections."""
+    global http_client
+    if http_client is not None:
+        await http_client.aclose()
+        http_client = None
+    await model_providers.aclose()
+    upstream_traffic.close()
+
+# Load prompts from YAML files into the precompiled registry
 # Get the directory of the current file and construct paths to YAML files
 current_dir = Path(__file__).parent
 textprompts_dir = current_dir / "prompts"
 system_prompts_file = textprompts_dir / "system.yaml"
 fallback_prompts_file = textprompts_dir / "fallback.yaml"
 
-SYSTEM_PROMPTS = load_prompts(str(system_prompts_file))
-FALLBACK_PROMPTS = load_prompts(str(fallback_prompts_file))
+prompt_registry = PromptRegistry(system_prompts_file, fallback_prompts_file)
 
 
-def get_system_prompt(language: str = "fr", context: Optional[Dict[str, Any]] = None) -> str:
-    """Get system prompt based on context (language handled within prompt)."""
-    try:
-        logger.debug(f"Loaded SYSTEM_PROMPTS: {SYSTEM_PROMPTS}")
-        # Default to general context if no context provided
-        context_key = "general"
-        if context and "page" in context:
-            context_key = context["page"]
-        else:
-            logger.debug(
-                f"No context provided or missing page key, using default 'general' context")
-
-        # Get prompt from YAML directly by context key
-        prompt = SYSTEM_PROMPTS.get(context_key, {}).get("system_prompt")
-        if prompt:
-            logger.debug(f"Using system prompt for context: {context_key}")
-            return prompt.strip()
-
-        # Try fallback to general context
-        if context_key != "general":
-            logger.warning(
-                f"Context '{context_key}' not found, falling back to 'general'")
-            prompt = SYSTEM_PROMPTS.get("general", {}).get("system_prompt")
-            if prompt:
-                return prompt.strip()
+async def close_retrieval_index(index: RetrievalIndex) -> None:
+    index.close()
 
-    except Exception as e:
-        logger.warning(f"Error retrieving system prompt: {str(e)}")
 
-    # Final fallback when all else fails
-    logger.warning("Using final fallback system prompt")
-    return "You are a helpful AI assistant for Kokotajlo, a startup building AI solutions for French businesses. Always respond in French by default."
+# Memory-mapped BM25 index over the site content, (re)built on startup when stale
+retrieval_index = LazyResource(
+    "retrieval", lambda: open_index(RETRIEVAL_INDEX_PATH), close_retrieval_index)
+
+
+def get_context_key(context: Optional[Dict[str, Any]] = None) -> str:
+    """Prompt context key for a request (the page it came from), 'general' by default."""
+    if context and isinstance(context, dict) and context.get("page"):
+        return str(context["page"])
+    return "general"
+
+
+def get_system_prompt(language: str = "fr", context: Optional[Dict[str, Any]] = None,
+                      query: Optional[str] = None) -> str:
+    """Get system prompt based on context (language handled within prompt).
+
+    With a `query` and the retrieval index loaded, the snippets most relevant
+    to it replace the page's fact sheet; its core facts are always kept.
+    """
+    page = get_context_key(context)
+    with stage("prompt"):
+        if query and retrieval_index.ready and prompt_registry.has_facts_slot(page):
+            snippets = retrieval_index.value.search(query, language)  # type: ignore[union-attr]
+            if snippets:
+                return prompt_registry.system_prompt_with(page, format_snippets(snippets))
+        return prompt_registry.system_prompt(page)
 
 
 def get_fallback_responses(language: str = "fr", context: Optional[Dict[str, Any]] = None) -> List[str]:
     """Get fallback responses based on language and context."""
-    try:
-        logger.debug(f"Loaded FALLBACK_PROMPTS: {FALLBACK_PROMPTS}")
-        # Default to general context if no context provided
-        context_key = "general"
-        if context and "page" in context:
-            context_key = context["page"]
-
-        # Get responses from YAML
-        responses = FALLBACK_PROMPTS.get(language, {}).get(
-            context_key, {}).get("responses", [])
-        if responses:
-            return responses
-
-        # Try fallback to general context in same language
-        if context_key != "general":
-            responses = FALLBACK_PROMPTS.get(language, {}).get(
-                "general", {}).get("responses", [])
-            if responses:
-                return responses
-
-        # Try English fallback
-        responses = FALLBACK_PROMPTS.get("en", {}).get(
-            "general", {}).get("responses", [])
-        if responses:
-            return responses
+    return prompt_registry.fallback_responses(language, get_context_key(context))
+
+
+fast_path_stats = MatchStats()
+
+
+async def match_fast_path(chat_request: ChatRequest, message: str, session_id: str) -> Optional[IntentMatch]:
+    """Canned intent answer for a common question, None when the upstreams should answer.
+
+    Only the first question of a session is matched: a follow-up ("and for a
+    smaller team?") needs the conversation, which the canned answers ignore.
+    """
+    page = get_context_key(chat_request.context)
+    if not FAQ_FAST_PATH_ENABLED or not prompt_registry.fast_path_enabled(page):
+        return None
+    if await conversation_store.has_turns(session_id):
+        return None
+    match = prompt_registry.match_intent(message, chat_request.language or "fr")
+    hit = match is not None and match.confidence >= FAQ_MATCH_THRESHOLD
+    fast_path_stats.record(match, hit)
+    FAST_PATH_CHECKS.inc("hit" if hit else "miss")
+    FAST_PATH_CONFIDENCE.observe(match.confidence if match else 0.0)
+    if match is None:
+        return None
+    if hit:
+        logger.info(
+            f"Fast path: intent '{match.intent}' (confidence {match.confidence:.2f}) on page {page}")
+        return match
+    logger.debug(
+        f"Fast path miss: best intent '{match.intent}' (confidence {match.confidence:.2f}) on page {page}")
+    return None
+
+
+def build_n8n_payload(chat_request: ChatRequest) -> Dict[str, Any]:
+    """Build the JSON body sent to the n8n chat agent webhook."""
+    return {
+        "chatInput": chat_request.message,
+        "language": chat_request.language,
+        "context": chat_request.context,
+        "sessionId": (chat_request.context or {}).get("sessionId") if isinstance(chat_request.context, dict) else None,
+    }
+
+
+def build_openai_messages(chat_request: ChatRequest, message: str,
+                          history: Optional[List[Dict[str, str]]] = None) -> List[Dict[str, str]]:
+    """Build the chat messages sent to OpenAI (system prompt, history, user message)."""
+    system_prompt = get_system_prompt(
+        chat_request.language or "fr", chat_request.context, message)
+    return [
+        {"role": "system", "content": system_prompt},
+        *(history or []),
+        {"role": "user", "content": message}
+    ]
 
-    except Exception as e:
-        logger.warning(f"Error retrieving fallback responses: {str(e)}")
 
-    # Final fallback when all else fails
-    return ["Bonjour! Je suis l'assistant virtuel de Kokotajlo. Comment puis-je vous aider aujourd'hui?"]
+def get_session_id(chat_request: ChatRequest) -> Optional[str]:
+    """sessionId from the request context, if any."""
+    if isinstance(chat_request.context, dict):
+        return chat_request.context.get("sessionId")
+    return None
 
 
-def call_n8n_chat_agent(chat_request: ChatRequest) -> tuple[str, bool]:
+async def call_n8n_chat_agent(chat_request: ChatRequest) -> tuple[str, bool]:
     """Call the n8n chat agent webhook and return the assistant reply.
 
     Expects the n8n workflow to return JSON with one of the keys: 'output',
@@ -184,27 +365,17 @@ def call_n8n_chat_agent(chat_request: ChatRequest) -> tuple[str, bool]:
         logger.warning(
             "N8N_URL not configured; cannot route chat to n8n agent")
         return ("Service indisponible pour le moment. Réessayez plus tard.", False)
-
-    payload: Dict[str, Any] = {
-        "chatInput": chat_request.message,
-        "language": chat_request.language,
-        "context": chat_request.context,
-        "sessionId": (chat_request.context or {}).get("sessionId") if isinstance(chat_request.context, dict) else None,
-    }
+    if http_client is None:
+        logger.warning("HTTP client not initialized; cannot reach n8n agent")
+        return ("Service indisponible pour le moment. Réessayez plus tard.", False)
 
     try:
-        response = requests.post(N8N_URL, json=payload, timeout=30)
+        response = await http_client.post(
+            N8N_URL, json=build_n8n_payload(chat_request), headers=request_id_headers())
         response.raise_for_status()
-        data: Any = response.json()
-
-        if isinstance(data, dict):
-            for key in ("output", "response", "text", "message"):
-                value = data.get(key)
-                if isinstance(value, str) and value.strip():
-                    return (value.strip(), True)
-
-        if isinstance(data, str) and data.strip():
-            return (data.strip(), True)
+        text = extract_n8n_text(response.json())
+        if text:
+            return (text, True)
 
         logger.error("n8n webhook returned unexpected payload structure")
         return ("Désolé, une erreur est survenue avec le service n8n.", False)
@@ -213,54 +384,289 @@ def call_n8n_chat_agent(chat_request: ChatRequest) -> tuple[str, bool]:
         return ("Erreur de traitement, réessayez.", False)
 
 
-def call_openai_fallback(chat_request: ChatRequest, message: str) -> tuple[str, bool]:
-    """Call OpenAI API as fallback when N8N fails.
+def record_openai_usage(chat_request: ChatRequest, client: str, messages: List[Dict[str, str]],
+                        usage: Any, completion: str) -> None:
+    """Account one OpenAI call against the usage counters and budgets."""
+    # Bucketed by prompt key: the page string comes from the client
+    prompt_tokens, completion_tokens = usage_tracker.record_response(
+        get_session_id(chat_request), client, prompt_registry.page_key(get_context_key(chat_request.context)),
+        usage, "\n".join(m["content"] for m in messages), completion)
+    OPENAI_TOKENS.inc("prompt", amount=prompt_tokens)
+    OPENAI_TOKENS.inc("completion", amount=completion_tokens)
+
+
+def openai_budget_exceeded(chat_request: ChatRequest, client: str) -> bool:
+    """True when a token budget rules out an OpenAI call for this request."""
+    reason = usage_tracker.exceeded(get_session_id(chat_request), client)
+    if reason is None:
+        return False
+    logger.warning(f"OpenAI {reason} token budget exhausted, skipping OpenAI")
+    USAGE_BUDGET_REJECTIONS.inc(reason)
+    return True
+
+
+def fallback_provider(chat_request: ChatRequest, client: str) -> Optional[ModelProvider]:
+    """Model provider for this request's page, None when none is usable.
+
+    Metered providers are left out once a token budget is spent (canned
+    fallback instead); self-hosted ones are not budgeted.
+    """
+    provider = model_providers.get(
+        prompt_registry.provider(get_context_key(chat_request.context)))
+    if provider is None:
+        return None
+    if provider.metered and openai_budget_exceeded(chat_request, client):
+        return None
+    return provider
+
+
+async def call_openai_fallback(chat_request: ChatRequest, message: str, client: str = "",
+                               provider: Optional[ModelProvider] = None) -> tuple[str, bool]:
+    """Call the page's model provider (OpenAI by default) as fallback when N8N fails.
 
     Returns the AI response and success flag. Success is False on API errors.
     """
-    if not OPENAI_AVAILABLE or not openai_client:
-        logger.warning("OpenAI client not available for fallback")
+    provider = provider or model_providers.get(
+        prompt_registry.provider(get_context_key(chat_request.context)))
+    if provider is None:
+        logger.warning("No model provider available for fallback")
         return ("Service OpenAI indisponible.", False)
 
     try:
-        logger.warning("n8n agent failed, falling back to OpenAI")
-        system_prompt = get_system_prompt(
-            chat_request.language or "fr", chat_request.context)
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": message}
-        ]
-        response = openai_client.chat.completions.create(
-            model=OPENAI_MODEL,
-            messages=messages,  # type: ignore
-            max_tokens=200,
-            temperature=0.7,
-        )
-        ai_response = (response.choices[0].message.content or "").strip()
+        history = await conversation_store.get_history(get_session_id(chat_request))
+        messages = build_openai_messages(chat_request, message, history)
+        ai_response, usage = await provider.complete(messages, max_tokens=200, temperature=0.7)
+        if provider.metered:
+            record_openai_usage(chat_request, client, messages, usage, ai_response)
         if not ai_response:
             ai_response = "Désolé, je n'ai pas pu générer une réponse appropriée. Contactez-nous directement pour en savoir plus sur nos services."
 
         return (ai_response, True)
     except Exception as e:
-        logger.error(f"OpenAI API error: {str(e)}")
+        logger.error(f"Model provider {provider.name} error: {str(e)}")
         return ("Erreur OpenAI, réessayez.", False)
 
 
+async def stream_n8n_chat_agent(chat_request: ChatRequest) -> AsyncIterator[str]:
+    """Stream the n8n chat agent reply, passing through chunked output.
+
+    Raises StreamFailed (or an httpx error) when n8n cannot answer.
+    """
+    if not N8N_URL or http_client is None:
+        raise StreamFailed("n8n agent not configured")
+
+    async with http_client.stream("POST", N8N_URL, json=build_n8n_payload(chat_request),
+                                  headers=request_id_headers()) as response:
+        response.raise_for_status()
+        async for chunk in iter_n8n_chunks(response):
+            yield chunk
+
+
+async def stream_openai_fallback(chat_request: ChatRequest, message: str, client: str = "",
+                                 provider: Optional[ModelProvider] = None) -> AsyncIterator[str]:
+    """Stream a completion from the page's model provider chunk by chunk.
+
+    Raises StreamFailed (or a provider error) when the provider cannot answer.
+    """
+    provider = provider or model_providers.get(
+        prompt_registry.provider(get_context_key(chat_request.context)))
+    if provider is None:
+        raise StreamFailed("No model provider available")
+
+    history = await conversation_store.get_history(get_session_id(chat_request))
+    messages = build_openai_messages(chat_request, message, history)
+    parts: List[str] = []
+    usage = None
+    stream = provider.stream(messages, max_tokens=200, temperature=0.7)
+    try:
+        async for text, chunk_usage in stream:
+            if chunk_usage is not None:
+                usage = chunk_usage
+            if text:
+                parts.append(text)
+                yield text
+    finally:
+        await stream.aclose()  # type: ignore[attr-defined]
+        if parts and provider.metered:
+            # Abandoned streams are still billed for what was generated
+            record_openai_usage(chat_request, client, messages, usage, "".join(parts))
+
+
+def build_breaker(name: str) -> CircuitBreaker:
+    """Circuit breaker for one upstream, configured from the environment."""
+    return CircuitBreaker(
+        name,
+        window=BREAKER_WINDOW,
+        min_calls=BREAKER_MIN_CALLS,
+        error_rate=BREAKER_ERROR_RATE,
+        slow_call_seconds=BREAKER_SLOW_CALL_SECONDS,
+        slow_call_rate=BREAKER_SLOW_CALL_RATE,
+        open_seconds=BREAKER_OPEN_SECONDS,
+        trial_interval=BREAKER_TRIAL_INTERVAL,
+    )
+
+
+def observe_chat_upstream(name: str, outcome: str, seconds: float) -> None:
+    """Record one upstream attempt in the metrics and on the request's trace."""
+    observe_upstream(name, outcome, seconds)
+    if outcome != "skipped":
+        add_stage(name, seconds, outcome)
+
+
+chat_router = ChatRouter(
+    mode=CHAT_ROUTING_MODE,
+    budget=CHAT_LATENCY_BUDGET,
+    hedge_delay=CHAT_HEDGE_DELAY,
+    hedge_percentile=CHAT_HEDGE_PERCENTILE,
+    hedge_min_samples=CHAT_HEDGE_MIN_SAMPLES,
+    breakers={name: build_breaker(name) for name in ["n8n", *model_providers.providers]},
+    observer=observe_chat_upstream,
+)
+
+# Without trusted proxy hops every client address is the proxy's, so a per-IP
+# budget would be a site-wide one
+if USAGE_IP_TOKENS_PER_HOUR and TRUSTED_PROXY_HOPS == 0:
+    logger.warning("USAGE_IP_TOKENS_PER_HOUR is ignored: set TRUSTED_PROXY_HOPS to enforce per-IP budgets")
+usage_tracker = UsageTracker(
+    ip_hourly_budget=USAGE_IP_TOKENS_PER_HOUR if TRUSTED_PROXY_HOPS > 0 else 0)
+
+response_cache = ResponseCache(
+    max_entries=CHAT_CACHE_MAX_ENTRIES,
+    ttl=CHAT_CACHE_TTL,
+    max_bytes=CHAT_CACHE_MAX_BYTES,
+)
+
+chat_flights = SingleFlight(max_waiters=CHAT_COALESCE_MAX_WAITERS)
+
+# Retried and double-submitted /chat and /contact requests get the first response
+idempotency = IdempotencyStore()
+
+conversation_store = ConversationStore(
+    max_sessions=CONVERSATION_MAX_SESSIONS,
+    ttl=CONVERSATION_TTL,
+    max_tokens=CONVERSATION_MAX_TOKENS,
+    keep_turns=CONVERSATION_KEEP_TURNS,
+    db_path=Path(CONVERSATION_DB) if CONVERSATION_DB else None,
+)
+
+
+def mailjet_configured() -> bool:
+    """True when Mailjet credentials are set (not the 'stub' placeholder)."""
+    email_key = os.getenv("MAILJET_API_KEY")
+    email_secret = os.getenv("MAILJET_SECRET_KEY")
+    return bool(email_key and email_secret and email_key != "stub")
+
+
+async def send_internal_email(contact: Dict[str, Any]) -> None:
+    """Contact queue job: notify the team about a new contact."""
+    if not mailjet_configured():
+        logger.info(
+            f"Mailjet not configured; skipping internal email for {contact['contact_id']}")
+        return
+
+    # Email content for internal notification
+    internal_subject = f"Nouveau contact: {contact['name']} - {contact['company']}"
+    internal_body = f"""
+    Nouveau contact depuis le formulaire:
+
+    Nom: {contact['name']}
+    Email: {contact['email']}
+    Entreprise: {contact['company']}
+    Secteur: {contact['sector']}
+    Message: {contact['message']}
+    GDPR accepté: {contact['gdpr']}
+    Source: {contact['source']}
+    """
+
+    # TODO: Implement actual Mailjet integration (raise on failure so the job retries)
+    # For now, just log the email that would be sent
+    logger.info(
+        f"Would send email to contact@kokotajlo.fr with contact details from {contact['email']} ({internal_subject}, {len(internal_body)} chars)")
+
+
+async def send_client_email(contact: Dict[str, Any]) -> None:
+    """Contact queue job: send the confirmation email to the client."""
+    if not mailjet_configured():
+        logger.info(
+            f"Mailjet not configured; skipping client email for {contact['contact_id']}")
+        return
+
+    # Email content for client confirmation
+    client_subject = "Votre demande de contact chez Kokotajlo"
+    client_body = f"""
+    Bonjour {contact['name']},
+
+    Merci pour votre intérêt pour nos solutions IA conformes.
+
+    Nous avons bien reçu votre demande concernant:
+    - Entreprise: {contact['company']}
+    - Secteur: {contact['sector']}
+
+    Notre équipe va analyser votre projet et vous contacter sous 24h ouvrées.
+
+    Cordialement,
+    L'équipe Kokotajlo
+    """
+
+    # TODO: Implement actual Mailjet integration (raise on failure so the job retries)
+    logger.info(
+        f"Would send email to {contact['email']} ({client_subject}, {len(client_body)} chars)")
+
+
+lead_store = LeadStore(LEAD_STORE_DB)
+
+
+async def store_legacy_contact(contact: Dict[str, Any]) -> None:
+    """Legacy 'persist' job, journaled before leads were stored inline: move the
+    contact into the lead store (once, keyed on its old contact id)."""
+    request_key = f"persist:{contact.get('contact_id')}"
+    if await lead_store.find_request(request_key, 0.0) is None:
+        await lead_store.add(contact, request_key=request_key)
+
+
+contact_queue = ContactJobQueue(
+    CONTACT_QUEUE_DB,
+    handlers={
+        "internal_email": send_internal_email,
+        "client_email": send_client_email,
+    },
+    workers=CONTACT_QUEUE_WORKERS,
+    max_attempts=CONTACT_QUEUE_MAX_ATTEMPTS,
+    base_delay=CONTACT_QUEUE_RETRY_DELAY,
+    lease_seconds=CONTACT_QUEUE_LEASE,
+    job_timeout=CONTACT_QUEUE_JOB_TIMEOUT,
+    legacy_handlers={"persist": store_legacy_contact},
+)
+
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Kokotajlo API",
     description="Backend API for AI agents platform targeting French businesses",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=FastJSONResponse,
 )
 
 # Rate limiting
-limiter = Limiter(key_func=get_remote_address)
+limiter = build_limiter()
 app.state.limiter = limiter
+
+
+def rate_limit_exceeded_handler(request: Request, exc: RateLimitExceeded):
+    """Count the rejection, then answer with slowapi's 429 response."""
+    RATE_LIMITED.inc(request.url.path)
+    return _rate_limit_exceeded_handler(request, exc)
+
+
 app.add_exception_handler(
-    RateLimitExceeded, _rate_limit_exceeded_handler)  # type: ignore
-app.add_middleware(SlowAPIMiddleware)
+    RateLimitExceeded, rate_limit_exceeded_handler)  # type: ignore
+# The pure ASGI variant skips BaseHTTPMiddleware's per-request task group and streams
+app.add_middleware(SlowAPIASGIMiddleware if PERFORMANCE else SlowAPIMiddleware)
+
+# Oversized bodies get a 413 before any JSON parsing (inside CORS, so browsers see it)
+app.add_middleware(BodySizeLimitMiddleware, max_bytes=MAX_REQUEST_BODY_BYTES)
 
 # CORS middleware
 app.add_middleware(
@@ -272,169 +678,495 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request metrics (outside the rest, so rejected and failed requests are counted too)
+metrics_exporter = MetricsExporter()
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+# Request IDs and stage timings (outermost, so the trace total covers the whole stack)
+if TRACING_ENABLED:
+    app.add_middleware(TracingMiddleware)
+
 # Health check endpoint
 
 
+HEALTH_BODY = dump_json({"status": "healthy", "service": "kokotajlo-backend"})
+
+
 @app.get("/health")
 async def health_check():
-    """Health check endpoint"""
-    return {"status": "healthy", "service": "kokotajlo-backend"}
+    """Health check endpoint (liveness: the process is up and serving)"""
+    return json_bytes_response(HEALTH_BODY)
+
+
+# Readiness: false until startup has finished and again once a drain starts
+lifecycle = {"ready": False, "draining": False}
+READY_BODIES = {
+    "ready": dump_json({"status": "ready", "service": "kokotajlo-backend"}),
+    "starting": dump_json({"status": "starting"}),
+    "draining": dump_json({"status": "draining"}),
+}
+
+
+def begin_drain() -> None:
+    """Called on SIGTERM: stop reporting ready while in-flight requests finish."""
+    if not lifecycle["draining"]:
+        lifecycle["draining"] = True
+        logger.info("Draining: finishing in-flight requests before shutdown")
+
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness endpoint: 503 while starting up or draining"""
+    if lifecycle["draining"] or not lifecycle["ready"]:
+        return json_bytes_response(
+            READY_BODIES["draining" if lifecycle["draining"] else "starting"], status_code=503)
+    return json_bytes_response(READY_BODIES["ready"])
+
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    """Prometheus metrics (text exposition format)"""
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics disabled")
+    return PlainTextResponse(
+        await metrics_exporter.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8")
 
 # API v1 routes
 
 
+# Last status body and when it expires (STATUS_CACHE_SECONDS)
+status_body: Dict[str, Any] = {"expires_at": 0.0, "body": b""}
+
+
 @app.get("/api/v1/status")
 async def api_status():
     """API status endpoint"""
+    now = time.monotonic()
+    if now >= status_body["expires_at"]:
+        body = dump_json(await build_status())
+        status_body.update(expires_at=now + STATUS_CACHE_SECONDS, body=body)
+    return json_bytes_response(status_body["body"])
+
+
+async def build_status() -> Dict[str, Any]:
+    await prompt_registry.ready()
+    contact_jobs = await contact_queue.stats()
     return {
         "status": "operational",
         "version": "1.0.0",
-        "features": ["chatbot", "rate_limiting", "cors"],
+        "features": ["chatbot", "chat_streaming", "faq_fast_path", "response_cache", "lead_store", "rate_limiting", "metrics", "tracing", "cors"],
+        "runtime": profile_status(),
+        "routing": {
+            "mode": chat_router.mode,
+            "latency_budget": chat_router.budget,
+            "hedge_delay": chat_router.hedge_delay_for("n8n"),
+        },
+        "upstreams": {
+            name: breaker.snapshot() for name, breaker in chat_router.breakers.items()
+        },
+        "cache": response_cache.stats(),
+        "coalescing": chat_flights.stats(),
+        "logging": log_stats(console_handler),
+        "rate_limiting": limiter_status(limiter),
+        "contact_queue": contact_jobs,
+        "leads": lead_store.stats(),
+        "idempotency": idempotency.stats(),
+        "tracing": tracing_status(),
+        "upstream_traffic": upstream_traffic.stats(),
+        "conversations": conversation_store.stats(),
+        "fast_path": {
+            "enabled": FAQ_FAST_PATH_ENABLED,
+            "threshold": FAQ_MATCH_THRESHOLD,
+            "intents": len(prompt_registry.tables.intents),
+            **fast_path_stats.stats(),
+        },
+        "retrieval": {
+            "enabled": RETRIEVAL_ENABLED,
+            **(retrieval_index.value.stats() if retrieval_index.ready else {}),  # type: ignore[union-attr]
+        },
+        "model_providers": model_providers.stats(),
+        "startup": {**startup_timings, "lazy": lazy_status()},
+        "usage": {
+            **usage_tracker.stats(),
+            "prompt_sizes": prompt_size_report(
+                prompt_registry.tables.system_prompts,
+                {page: t.calls for page, t in usage_tracker.pages.items()}),
+        },
         "environment": os.getenv("DEBUG", "False").lower() == "true"
     }
 
+def bound_chat_request(chat_request: ChatRequest) -> str:
+    """Reject oversized chat input with a 413 and keep only the whitelisted context keys.
+
+    Returns the message to answer.
+    """
+    message = chat_request.message or getattr(
+        chat_request, 'query', 'No message provided')
+    reason = check_chat_payload(message, chat_request.language, chat_request.context)
+    if reason is not None:
+        logger.warning(f"Chat payload rejected: {reason}")
+        raise HTTPException(status_code=413, detail=reason)
+    chat_request.context = sanitize_context(chat_request.context)
+    return message
+
+
+def ensure_session_id(chat_request: ChatRequest) -> str:
+    """Ensure a stable sessionId for stateful conversations and return it."""
+    session_id = None
+    try:
+        if chat_request.context and isinstance(chat_request.context, dict):
+            session_id = chat_request.context.get("sessionId")
+    except Exception:
+        session_id = None
+    if not session_id:
+        session_id = str(uuid.uuid4())
+
+    # Inject sessionId back into context for downstream consumers (n8n, logs)
+    if chat_request.context is None or not isinstance(chat_request.context, dict):
+        chat_request.context = {}
+    chat_request.context["sessionId"] = session_id
+    return session_id
+
+async def run_idempotent(request: Request, scope: str, request_fingerprint: str,
+                         fn: Any, keep: Any = None, by_content: bool = True) -> Response:
+    """Run an endpoint body once per Idempotency-Key (or, with `by_content`, identical
+    request within the window) and serialize the reply it returns."""
+    try:
+        result, replayed = await idempotency.run(
+            scope, client_ip(request), request.headers.get(IDEMPOTENCY_HEADER),
+            request_fingerprint, fn, keep, by_content)
+    except InvalidIdempotencyKey as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except SingleFlightOverflow as e:
+        logger.warning(f"Idempotency: {str(e)}")
+        raise HTTPException(status_code=409, detail="Requête identique déjà en cours de traitement")
+    with stage("response"):
+        return model_response(result, headers={REPLAYED_HEADER: "true"} if replayed else None)
+
 # Chatbot proxy endpoint (placeholder for OpenAI integration)
 
 
 @app.post("/chat")
-@limiter.limit("10/minute")
+@limiter.limit(RATE_LIMIT_CHAT)
 async def chat_endpoint(request: Request, chat_request: ChatRequest):
     """
     Chat endpoint with OpenAI GPT-4o-mini integration
     Rate limited to 10 requests per minute
     Accepts ChatRequest with message (or query fallback), optional language and context
+    A retry with the same Idempotency-Key gets the first answer
     """
+    # Normalize input: Accept 'query' or 'message' from frontend (413 when oversized)
+    message = bound_chat_request(chat_request)
+    request_fingerprint = fingerprint(
+        message, chat_request.language, get_context_key(chat_request.context),
+        get_session_id(chat_request))
+    return await run_idempotent(
+        request, "chat", request_fingerprint,
+        lambda: answer_chat(request, chat_request, message),
+        # A canned fallback is not replayed: the retry should try the upstreams again
+        keep=lambda reply: "_fallback_" not in reply.conversation_id,
+        # Without a key, a repeated question is a new question (and the client
+        # address is the proxy's, shared by every visitor)
+        by_content=False)
+
+
+async def answer_chat(request: Request, chat_request: ChatRequest, message: str) -> ChatResponse:
+    """Answer one chat message: fast path, cache, then the upstreams."""
     try:
         from datetime import datetime
         import random
 
-        # Normalize input: Accept 'query' or 'message' from frontend
-        message = chat_request.message or getattr(
-            chat_request, 'query', 'No message provided')
         # Log for Railway
         logger.info(
             f"Chat request received: {message[:50]}... (lang: {chat_request.language})")
 
-        # Ensure a stable sessionId for stateful conversations
-        session_id = None
-        try:
-            if chat_request.context and isinstance(chat_request.context, dict):
-                session_id = chat_request.context.get("sessionId")
-        except Exception:
-            session_id = None
-        if not session_id:
-            session_id = str(uuid.uuid4())
-
-        # Inject sessionId back into context for downstream consumers (n8n, logs)
-        if chat_request.context is None or not isinstance(chat_request.context, dict):
-            chat_request.context = {}
-        chat_request.context["sessionId"] = session_id
-
-        # Try n8n chat agent first (availability checker)
-        n8n_text, n8n_ok = call_n8n_chat_agent(chat_request)
-        if n8n_ok:
+        session_id = ensure_session_id(chat_request)
+        # Prompts load off the event loop; only the first requests wait for them
+        await prompt_registry.ready()
+
+        # Answer common questions locally, without any upstream call
+        with stage("faq"):
+            faq = await match_fast_path(chat_request, message, session_id)
+        if faq is not None:
+            response_cache.note_turn(session_id)
+            await conversation_store.append(session_id, message, faq.answer)
+            CHAT_REPLIES.inc("chat", "faq")
             return ChatResponse(
-                response=n8n_text,
+                response=faq.answer,
                 language=chat_request.language or "fr",
                 timestamp=datetime.utcnow().isoformat() + "Z",
-                conversation_id=f"conv_n8n_{random.randint(1000, 9999)}"
+                conversation_id=f"conv_fast_faq_{random.randint(1000, 9999)}"
             )
 
-        # OpenAI fallback
-        openai_text, openai_ok = call_openai_fallback(chat_request, message)
-        if openai_ok:
+        # Serve repeated first questions from the response cache
+        key = None
+        if CHAT_CACHE_ENABLED and not response_cache.is_bypassed(session_id):
+            key = cache_key(message, get_context_key(
+                chat_request.context), chat_request.language or "fr")
+            cached = response_cache.get(key)
+            if cached:
+                response_cache.note_turn(session_id)
+                await conversation_store.append(session_id, message, cached[0])
+                CHAT_REPLIES.inc("chat", "cache")
+                return ChatResponse(
+                    response=cached[0],
+                    language=chat_request.language or "fr",
+                    timestamp=datetime.utcnow().isoformat() + "Z",
+                    conversation_id=f"conv_cache_{cached[1]}_{random.randint(1000, 9999)}"
+                )
+
+        client = client_ip(request)
+
+        async def route_chat() -> RouteResult:
+            # Route across n8n (primary) and the page's model provider according
+            # to the routing mode
+            calls = [("n8n", lambda: call_n8n_chat_agent(chat_request))]
+            provider = fallback_provider(chat_request, client)
+            if provider is not None:
+                calls.append((provider.name, lambda: call_openai_fallback(
+                    chat_request, message, client, provider)))
+            result = await chat_router.route(calls)
+            if result.ok and key:
+                response_cache.put(key, result.text, result.source)
+            return result
+
+        # Identical cacheable requests already in flight share one upstream call
+        if key and CHAT_COALESCE_ENABLED:
+            try:
+                routed, _ = await chat_flights.do(key, route_chat)
+            except SingleFlightOverflow as e:
+                logger.warning(f"Single-flight overflow: {str(e)}")
+                routed = RouteResult("", False, "none", chat_router.mode, 0.0)
+        else:
+            routed = await route_chat()
+
+        response_cache.note_turn(session_id)
+        if routed.ok:
+            await conversation_store.append(session_id, message, routed.text)
+            CHAT_REPLIES.inc("chat", routed.source)
             return ChatResponse(
-                response=openai_text,
+                response=routed.text,
                 language=chat_request.language or "fr",
                 timestamp=datetime.utcnow().isoformat() + "Z",
-                conversation_id=f"conv_openai_{random.randint(1000, 9999)}"
+                conversation_id=f"conv_{routed.mode}_{routed.source}_{random.randint(1000, 9999)}"
             )
 
         # Final canned fallback
+        logger.warning(
+            f"Routing ({routed.mode}): no upstream answered, using canned fallback")
         fallback_responses = get_fallback_responses(
             chat_request.language or "fr", chat_request.context)
+        CHAT_REPLIES.inc("chat", "fallback")
         return ChatResponse(
             response=random.choice(fallback_responses),
             language=chat_request.language or "fr",
             timestamp=datetime.utcnow().isoformat() + "Z",
-            conversation_id=f"conv_fallback_{random.randint(1000, 9999)}"
+            conversation_id=f"conv_{routed.mode}_fallback_{random.randint(1000, 9999)}"
         )
     except Exception as e:
         logger.error(f"Chat endpoint error: {str(e)}")
         raise HTTPException(
             status_code=500, detail="Erreur lors du traitement de la requête chat")
 
+
+async def chat_event_stream(request: Request, chat_request: ChatRequest, message: str) -> AsyncIterator[str]:
+    """Yield SSE chunk events from the first upstream that streams, then a done event.
+
+    Chunks are pulled from the upstream only as fast as the client reads them,
+    and a client disconnect cancels the upstream call so it stops generating.
+    """
+    import random
+    from datetime import datetime
+
+    language = chat_request.language or "fr"
+    session_id = ensure_session_id(chat_request)
+    started = time.monotonic()
+    first_chunk_at: Optional[float] = None
+    source = "fallback"
+    parts: List[str] = []
+
+    key = None
+    cached = None
+    await prompt_registry.ready()
+    with stage("faq"):
+        faq = await match_fast_path(chat_request, message, session_id)
+    if faq is None and CHAT_CACHE_ENABLED and not response_cache.is_bypassed(session_id):
+        key = cache_key(message, get_context_key(chat_request.context), language)
+        cached = response_cache.get(key)
+    client = client_ip(request)
+    streams = [] if cached or faq else [
+        ("n8n", lambda: stream_n8n_chat_agent(chat_request)),
+    ]
+    provider = None if cached or faq else fallback_provider(chat_request, client)
+    if provider is not None:
+        streams.append((provider.name, lambda: stream_openai_fallback(
+            chat_request, message, client, provider)))
+
+    for name, open_stream in streams:
+        breaker = chat_router.breakers.get(name)
+        if breaker is not None and not breaker.allow_request():
+            logger.info(f"Streaming: circuit for {name} is {breaker.state}, skipping")
+            observe_chat_upstream(name, "skipped", 0.0)
+            continue
+
+        call_started = time.monotonic()
+        upstream = open_stream()
+        sent = False
+        try:
+            async for chunk in upstream:
+                if await request.is_disconnected():
+                    logger.info(f"Streaming: client disconnected, cancelling {name}")
+                    if breaker is not None:
+                        breaker.release()
+                    observe_chat_upstream(name, "cancelled", time.monotonic() - call_started)
+                    return
+                if first_chunk_at is None:
+                    first_chunk_at = time.monotonic()
+                sent = True
+                parts.append(chunk)
+                yield sse_event({"text": chunk}, "chunk")
+            if breaker is not None:
+                breaker.record(sent, time.monotonic() - call_started)
+            observe_chat_upstream(name, "ok" if sent else "error", time.monotonic() - call_started)
+            if sent:
+                source = name
+                if key:
+                    response_cache.put(key, "".join(parts), name)
+                break
+            logger.warning(f"Streaming: {name} returned no content")
+        except asyncio.CancelledError:
+            if breaker is not None:
+                breaker.release()
+            observe_chat_upstream(name, "cancelled", time.monotonic() - call_started)
+            raise
+        except Exception as e:
+            logger.error(f"Streaming: {name} error: {str(e)}")
+            if breaker is not None:
+                breaker.record(False, time.monotonic() - call_started)
+            observe_chat_upstream(name, "error", time.monotonic() - call_started)
+            if sent:
+                # Part of the answer already went out; do not mix in another upstream
+                source = name
+                yield sse_event({"message": "Réponse interrompue, réessayez."}, "error")
+                break
+        finally:
+            await upstream.aclose()
+
+    if faq:
+        source = "faq"
+        first_chunk_at = time.monotonic()
+        parts.append(faq.answer)
+        yield sse_event({"text": faq.answer}, "chunk")
+    elif cached:
+        source = "cache"
+        first_chunk_at = time.monotonic()
+        yield sse_event({"text": cached[0]}, "chunk")
+    elif source == "fallback":
+        logger.warning("Streaming: no upstream answered, using canned fallback")
+        first_chunk_at = time.monotonic()
+        fallback_responses = get_fallback_responses(language, chat_request.context)
+        yield sse_event({"text": random.choice(fallback_responses)}, "chunk")
+
+    CHAT_REPLIES.inc("chat_stream", source)
+    response_cache.note_turn(session_id)
+    if cached:
+        await conversation_store.append(session_id, message, cached[0])
+    elif parts:
+        await conversation_store.append(session_id, message, "".join(parts))
+    finished = time.monotonic()
+    yield sse_event({
+        "conversation_id": f"conv_stream_{source}_{random.randint(1000, 9999)}",
+        "language": language,
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "timing": {
+            "first_chunk_ms": round(((first_chunk_at or finished) - started) * 1000, 1),
+            "total_ms": round((finished - started) * 1000, 1),
+        },
+    }, "done")
+
+
+@app.post("/chat/stream")
+@limiter.limit(RATE_LIMIT_CHAT)
+async def chat_stream_endpoint(request: Request, chat_request: ChatRequest):
+    """
+    Streaming chat endpoint (server-sent events)
+    Rate limited to 10 requests per minute
+    Emits `chunk` events as text arrives and a final `done` event with metadata
+    """
+    message = bound_chat_request(chat_request)
+    logger.info(
+        f"Chat stream request received: {message[:50]}... (lang: {chat_request.language})")
+
+    return StreamingResponse(
+        chat_event_stream(request, chat_request, message),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 # Contact endpoint with Mailjet stub
 
 
 @app.post("/contact")
-@limiter.limit("5/minute")
+@limiter.limit(RATE_LIMIT_CONTACT)
 async def contact_endpoint(request: Request, contact_request: ContactRequest):
     """
     Contact form endpoint with Mailjet email integration stub
     Rate limited to 5 requests per minute
     Accepts ContactRequest with contact form data
+    A double submission (same Idempotency-Key, or same form within seconds) is stored and emailed once
+    """
+    # source and timestamp are set per submission by the frontend, not by the visitor
+    request_fingerprint = fingerprint(contact_request.model_dump(exclude={"source", "timestamp"}))
+    return await run_idempotent(
+        request, "contact", request_fingerprint,
+        lambda: submit_contact(contact_request, request.headers.get(IDEMPOTENCY_HEADER), request_fingerprint))
+
+
+async def submission_lead(idempotency_key: Optional[str],
+                          request_fingerprint: str) -> Tuple[Optional[str], Optional[str]]:
+    """Submission key of a contact form and the lead already stored for it, if any.
+
+    The lead and its email jobs live in separate databases, so a retry after
+    the enqueue failed must reuse the stored lead rather than create a second
+    one whose first copy never gets its emails.
     """
+    if not idempotency.enabled:
+        return None, None
+    if idempotency_key:
+        request_key, window = fingerprint(idempotency_key, request_fingerprint), idempotency.ttl
+    else:
+        request_key, window = request_fingerprint, idempotency.window
+    return request_key, await lead_store.find_request(request_key, time.time() - window)
+
+
+async def submit_contact(contact_request: ContactRequest, idempotency_key: Optional[str] = None,
+                         request_fingerprint: str = "") -> ContactResponse:
+    """Store the lead (or find the one a failed attempt stored) and queue its emails."""
     try:
-        import random
         from datetime import datetime
 
         # Log the contact request
         logger.info(
             f"Contact request from {contact_request.name} ({contact_request.email}) - {contact_request.company}")
 
-        # Generate contact ID
-        contact_id = f"contact_{random.randint(10000, 99999)}_{int(datetime.utcnow().timestamp())}"
-
-        # Mailjet stub implementation
-        # In production, replace with actual Mailjet API calls
-        email_key = os.getenv("MAILJET_API_KEY")
-        email_secret = os.getenv("MAILJET_SECRET_KEY")
+        request_key, stored_id = await submission_lead(idempotency_key, request_fingerprint)
+        # Time-sortable, collision-free contact ID
+        contact_id = stored_id or new_lead_id()
 
-        if email_key and email_secret and email_key != "stub":
-            try:
-                # TODO: Implement actual Mailjet integration
-                # For now, just log the email that would be sent
-                logger.info(
-                    f"Would send email to contact@kokotajlo.fr with contact details from {contact_request.email}")
-
-                # Email content for internal notification
-                internal_subject = f"Nouveau contact: {contact_request.name} - {contact_request.company}"
-                internal_body = f"""
-                Nouveau contact depuis le formulaire:
-
-                Nom: {contact_request.name}
-                Email: {contact_request.email}
-                Entreprise: {contact_request.company}
-                Secteur: {contact_request.sector}
-                Message: {contact_request.message}
-                GDPR accepté: {contact_request.gdpr}
-                Source: {contact_request.source}
-                """
-
-                # Email content for client confirmation
-                client_subject = "Votre demande de contact chez Kokotajlo"
-                client_body = f"""
-                Bonjour {contact_request.name},
-
-                Merci pour votre intérêt pour nos solutions IA conformes.
-
-                Nous avons bien reçu votre demande concernant:
-                - Entreprise: {contact_request.company}
-                - Secteur: {contact_request.sector}
-
-                Notre équipe va analyser votre projet et vous contacter sous 24h ouvrées.
-
-                Cordialement,
-                L'équipe Kokotajlo
-                """
-
-            except Exception as e:
-                logger.error(f"Email sending error: {str(e)}")
-                # Continue with success response even if email fails
-
-        # Store contact in database (placeholder)
-        # TODO: Implement database storage
+        # The lead is stored (batched with concurrent submissions) before we answer;
+        # emails are delivered by the background contact queue (enqueue is idempotent)
+        payload = contact_request.model_dump()
+        payload["contact_id"] = contact_id
+        if stored_id is None:
+            await lead_store.add(payload, contact_id, request_key)
+        else:
+            logger.info(f"Contact {contact_id} already stored for this submission, queueing its emails")
+        await contact_queue.enqueue(contact_id, payload)
         logger.info(f"Contact stored with ID: {contact_id}")
 
         return ContactResponse(
@@ -451,57 +1183,130 @@ async def contact_endpoint(request: Request, contact_request: ContactRequest):
             detail="Erreur lors du traitement de votre demande de contact"
         )
 
+@app.get("/api/v1/leads")
+async def leads_endpoint(
+    request: Request,
+    email: Optional[str] = None,
+    company: Optional[str] = None,
+    sector: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = 50,
+):
+    """
+    Lead query endpoint for the sales team (Bearer LEADS_API_KEY)
+    Newest first; filters are exact, since/until are ISO 8601 timestamps
+    Returns a page of leads and the cursor of the next page
+    """
+    import hmac
+
+    if not LEADS_API_KEY:
+        raise HTTPException(status_code=404, detail="Not Found")
+    token = request.headers.get("authorization", "").removeprefix("Bearer ").strip()
+    if not hmac.compare_digest(token.encode(), LEADS_API_KEY.encode()):
+        raise HTTPException(status_code=401, detail="Clé API invalide")
+
+    try:
+        since_ts = parse_iso_timestamp(since) if since else None
+        until_ts = parse_iso_timestamp(until) if until else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="since/until doivent être au format ISO 8601")
+
+    leads, next_cursor = await lead_store.query(
+        email=email, company=company, sector=sector,
+        since=since_ts, until=until_ts, cursor=cursor, limit=limit)
+    return {"leads": leads, "next_cursor": next_cursor, "count": len(leads)}
+
 # Error handlers
 
 
+@lru_cache(maxsize=256)
+def error_body(message: str, error_type: str, status_code: int) -> bytes:
+    """Serialized error payload; the same few messages come back over and over."""
+    return dump_json({
+        "error": {
+            "message": message,
+            "type": error_type,
+            "status_code": status_code
+        }
+    })
+
+
+INTERNAL_ERROR_BODY = error_body("Erreur interne du serveur", "internal_server_error", 500)
+
+
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
     """Custom HTTP exception handler"""
-    return JSONResponse(
-        status_code=exc.status_code,
-        content={
-            "error": {
-                "message": exc.detail,
-                "type": "http_exception",
-                "status_code": exc.status_code
-            }
-        }
-    )
+    if isinstance(exc.detail, str):
+        body = error_body(exc.detail, "http_exception", exc.status_code)
+    else:
+        body = dump_json({"error": {"message": exc.detail, "type": "http_exception",
+                                    "status_code": exc.status_code}})
+    return json_bytes_response(body, status_code=exc.status_code)
 
 
 @app.exception_handler(Exception)
 async def general_exception_handler(request: Request, exc: Exception):
     """General exception handler"""
     logger.error(f"Unhandled exception: {str(exc)}")
-    return JSONResponse(
-        status_code=500,
-        content={
-            "error": {
-                "message": "Erreur interne du serveur",
-                "type": "internal_server_error",
-                "status_code": 500
-            }
-        }
-    )
+    return json_bytes_response(INTERNAL_ERROR_BODY, status_code=500)
 
 # Startup and shutdown events
 
 
+startup_timings: Dict[str, Optional[float]] = {
+    "import_ms": round((time.perf_counter() - IMPORT_STARTED) * 1000, 1),
+    "startup_ms": None,
+}
+warm_up_tasks: List["asyncio.Task[None]"] = []
+
+
 @app.on_event("startup")
 async def startup_event():
     """Application startup event"""
+    started = time.perf_counter()
     logger.info("Starting Kokotajlo backend...")
     logger.debug("Starting Kokotajlo backend in debug mode...")
-    # TODO: Initialize database connections, AI clients, etc.
+    await init_upstream_clients()
+    # Prompts load in the background; /health does not wait for them
+    warm_up_tasks.append(asyncio.ensure_future(prompt_registry.warm_up()))
+    if RETRIEVAL_ENABLED:
+        retrieval_index.warm_up()
+    prompt_registry.start_watching(PROMPTS_RELOAD_INTERVAL)
+    await contact_queue.start()
+    if METRICS_ENABLED:
+        metrics_exporter.start()
+    lifecycle["ready"] = True
+    startup_timings["startup_ms"] = round((time.perf_counter() - started) * 1000, 1)
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Application shutdown event"""
     logger.info("Shutting down Kokotajlo backend...")
-    # TODO: Close database connections, cleanup resources, etc.
+    lifecycle["ready"] = False
+    for task in warm_up_tasks:
+        task.cancel()
+    await close_upstream_clients()
+    await prompt_registry.stop_watching()
+    await retrieval_index.aclose()
+    await contact_queue.stop()
+    await lead_store.close()
+    conversation_store.close()
+    await metrics_exporter.stop()
 
 if __name__ == "__main__":
+    import sys
+
+    if "--profile-startup" in sys.argv:
+        from startup_profile import main_cli
+        main_cli(sys.argv[sys.argv.index("--profile-startup") + 1:])
+        sys.exit(0)
+
+    import uvicorn
+
     # Dual-stack: IPv4 for public/health, IPv6 for private
     host = os.getenv("HOST", "0.0.0.0")
     # Use $PORT (Railway sets to 8080)
@@ -523,6 +1328,28 @@ if __name__ == "__main__":
     else:
         log_level = "info"  # default
 
+    if not debug:
+        # Production: supervised workers sharing this preloaded module
+        import tempfile
+        from server import serve, worker_count
+
+        sys.modules.setdefault("main", sys.modules[__name__])
+        # Load what workers would otherwise each load lazily, so forks share it
+        prompt_registry.reload()
+        if RETRIEVAL_ENABLED:
+            # Build a stale index once here instead of racing in every worker
+            open_index(RETRIEVAL_INDEX_PATH).close()
+        if OPENAI_AVAILABLE or LOCAL_LLM_URL:
+            import openai  # noqa: F401
+        if METRICS_ENABLED and worker_count() > 1 and metrics_exporter.metrics_dir is None:
+            # Workers publish snapshots here so a scrape sees all of them
+            metrics_dir = tempfile.mkdtemp(prefix="kokotajlo-metrics-")
+            os.environ["METRICS_DIR"] = metrics_dir
+            metrics_exporter.metrics_dir = Path(metrics_dir)
+        serve("main:app", host, port, log_level, drain_path="main:begin_drain")
+        sys.exit(0)
+
+    # Development: single process with auto-reload
     # Configure uvicorn logging to use our JSON formatter
     uvicorn_config = uvicorn.Config(
         "main:app",
@@ -530,7 +1357,7 @@ if __name__ == "__main__":
         port=port,
         reload=debug,
         log_level=log_level,
-        access_log=True
+        **{"access_log": True, **uvicorn_options()}
     )
 
     # Configure uvicorn to use the same JSON formatter
@@ -0,0 +1,441 @@
+"""
+Metrics
+Prometheus text-format counters, gauges and histograms for the chat pipeline
+"""
+
+import asyncio
+import json
+import os
+import time
+from bisect import bisect_left
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from logging_config import logger
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+# Directory of one supervisor's workers: each worker writes its snapshot
+# there and a scrape of any worker sums all of them
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))
+EVENT_LOOP_LAG_INTERVAL = float(os.getenv("EVENT_LOOP_LAG_INTERVAL", "0.5"))
+
+# Counters and histograms of exited workers, folded in by the supervisor
+ROLLUP_FILE = "metrics_rollup.json"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+CONFIDENCE_BUCKETS = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names: Tuple[str, ...], values: Labels, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Metric:
+    """Base for a named metric family with a fixed set of label names.
+
+    Updates are plain dict operations on the event-loop thread, so no lock
+    is taken on the request path; everything is read at scrape time.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+
+    def snapshot(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"series": [[list(k), v] for k, v in self.values.items()]}
+
+
+class Gauge(Metric):
+    """Gauge; `merge` says how workers combine on scrape ('sum' or 'max')."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 merge: str = "sum"):
+        super().__init__(name, documentation, labelnames)
+        self.merge = merge
+        self.values: Dict[Labels, float] = {}
+
+    def set(self, value: float, *labels: str) -> None:
+        self.values[labels] = value
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        self.values[labels] = self.values.get(labels, 0.0) - amount
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"series": [[list(k), v] for k, v in self.values.items()]}
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+        # labels -> [per-bucket counts (last is +Inf), sum, count]
+        self.values: Dict[Labels, List[Any]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self.values.get(labels)
+        if series is None:
+            series = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"series": [[list(k), list(v[0]), v[1], v[2]] for k, v in self.values.items()]}
+
+
+class MetricsRegistry:
+    """Set of metric families rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+
+    def _add(self, metric: Metric) -> Any:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._add(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+              merge: str = "sum") -> Gauge:
+        return self._add(Gauge(name, documentation, labelnames, merge))
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, documentation, labelnames, buckets))
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {name: metric.snapshot() for name, metric in self.metrics.items()}
+
+    def merge(self, snapshots: List[Tuple[Dict[str, Any], bool]]) -> Dict[str, Any]:
+        """Combine worker snapshots; gauges only from workers marked live."""
+        merged: Dict[str, Dict[Labels, Any]] = {name: {} for name in self.metrics}
+        for snapshot, live in snapshots:
+            for name, data in snapshot.items():
+                metric = self.metrics.get(name)
+                if metric is None:
+                    continue
+                target = merged[name]
+                for entry in data.get("series", []):
+                    labels = tuple(entry[0])
+                    if isinstance(metric, Histogram):
+                        current = target.get(labels)
+                        if current is None:
+                            target[labels] = [list(entry[1]), entry[2], entry[3]]
+                        elif len(current[0]) == len(entry[1]):
+                            current[0] = [a + b for a, b in zip(current[0], entry[1])]
+                            current[1] += entry[2]
+                            current[2] += entry[3]
+                    elif isinstance(metric, Gauge):
+                        if not live:
+                            continue
+                        if metric.merge == "max":
+                            target[labels] = max(target.get(labels, entry[1]), entry[1])
+                        else:
+                            target[labels] = target.get(labels, 0.0) + entry[1]
+                    else:
+                        target[labels] = target.get(labels, 0.0) + entry[1]
+        return merged
+
+    def to_snapshot(self, values: Dict[str, Dict[Labels, Any]]) -> Dict[str, Any]:
+        """Merged values back in the snapshot file format."""
+        snapshot: Dict[str, Any] = {}
+        for name, series in values.items():
+            if isinstance(self.metrics[name], Histogram):
+                snapshot[name] = {"series": [[list(k), list(v[0]), v[1], v[2]] for k, v in series.items()]}
+            else:
+                snapshot[name] = {"series": [[list(k), v] for k, v in series.items()]}
+        return snapshot
+
+    def render(self, values: Optional[Dict[str, Dict[Labels, Any]]] = None) -> str:
+        """Text exposition format; `values` defaults to this process's metrics."""
+        lines: List[str] = []
+        for name, metric in self.metrics.items():
+            series = values[name] if values is not None else metric.values
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for labels, value in sorted(series.items()):
+                if isinstance(metric, Histogram):
+                    cumulative = 0
+                    bounds = list(metric.buckets) + [float("inf")]
+                    for bound, count in zip(bounds, value[0]):
+                        cumulative += count
+                        le = f'le="{_number(bound)}"'
+                        lines.append(
+                            f"{name}_bucket{_label_text(metric.labelnames, labels, le)} {cumulative}")
+                    label_text = _label_text(metric.labelnames, labels)
+                    lines.append(f"{name}_sum{label_text} {_number(value[1])}")
+                    lines.append(f"{name}_count{label_text} {value[2]}")
+                else:
+                    lines.append(
+                        f"{name}{_label_text(metric.labelnames, labels)} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+HTTP_REQUESTS = registry.counter(
+    "kokotajlo_http_requests_total", "HTTP requests by route, method and status",
+    ("route", "method", "status"))
+HTTP_DURATION = registry.histogram(
+    "kokotajlo_http_request_duration_seconds", "HTTP request latency by route (until the last body byte)",
+    ("route",))
+HTTP_IN_FLIGHT = registry.gauge(
+    "kokotajlo_http_requests_in_flight", "Requests currently being served", ("route",))
+UPSTREAM_CALLS = registry.counter(
+    "kokotajlo_upstream_calls_total",
+    "Upstream calls by outcome (ok, error, timeout, cancelled, skipped)",
+    ("upstream", "outcome"))
+UPSTREAM_DURATION = registry.histogram(
+    "kokotajlo_upstream_duration_seconds", "Upstream call latency by upstream and outcome",
+    ("upstream", "outcome"))
+CHAT_REPLIES = registry.counter(
+    "kokotajlo_chat_replies_total",
+    "Chat replies by the tier that served them (faq, cache, n8n, model provider, fallback)",
+    ("endpoint", "tier"))
+FAST_PATH_CHECKS = registry.counter(
+    "kokotajlo_fast_path_checks_total", "Canned-answer intent checks by outcome (hit, miss)",
+    ("outcome",))
+FAST_PATH_CONFIDENCE = registry.histogram(
+    "kokotajlo_fast_path_confidence", "Best intent confidence of each fast path check",
+    buckets=CONFIDENCE_BUCKETS)
+RATE_LIMITED = registry.counter(
+    "kokotajlo_rate_limit_rejections_total", "Requests rejected by the rate limiter", ("route",))
+OPENAI_TOKENS = registry.counter(
+    "kokotajlo_openai_tokens_total", "OpenAI tokens by kind (prompt, completion)", ("kind",))
+USAGE_BUDGET_REJECTIONS = registry.counter(
+    "kokotajlo_usage_budget_rejections_total",
+    "OpenAI calls skipped because a token budget was exhausted", ("budget",))
+PAYLOAD_REJECTIONS = registry.counter(
+    "kokotajlo_payload_rejections_total",
+    "Requests rejected with 413 by reason (body_size, message_length, language, context)",
+    ("reason",))
+IDEMPOTENT_REQUESTS = registry.counter(
+    "kokotajlo_idempotent_requests_total",
+    "Idempotency outcome by endpoint (new, replayed, joined, conflict)", ("endpoint", "outcome"))
+LOOP_LAG = registry.histogram(
+    "kokotajlo_event_loop_lag_seconds", "Event loop scheduling delay", buckets=LAG_BUCKETS)
+LOOP_LAG_LAST = registry.gauge(
+    "kokotajlo_event_loop_lag_last_seconds", "Most recent event loop lag sample (max across workers)",
+    merge="max")
+
+
+def observe_upstream(name: str, outcome: str, seconds: float) -> None:
+    """Record one upstream call (routing observer hook)."""
+    UPSTREAM_CALLS.inc(name, outcome)
+    if outcome != "skipped":
+        UPSTREAM_DURATION.observe(seconds, name, outcome)
+
+
+class MetricsMiddleware:
+    """ASGI middleware counting requests, latency and in-flight requests per route.
+
+    Routes are labelled by their declared path; anything else (404s, probes)
+    is folded into 'other' to keep label cardinality bounded.
+    """
+
+    def __init__(self, app: Any):
+        self.app = app
+        self._routes: Optional[frozenset] = None
+
+    def _route(self, scope: Dict[str, Any]) -> str:
+        if self._routes is None:
+            app = scope.get("app")
+            self._routes = frozenset(
+                getattr(route, "path", "") for route in getattr(app, "routes", []))
+        path = scope.get("path", "")
+        return path if path in self._routes else "other"
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        route = self._route(scope)
+        status = 500
+
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        HTTP_IN_FLIGHT.inc(route)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec(route)
+            HTTP_DURATION.observe(time.perf_counter() - started, route)
+            HTTP_REQUESTS.inc(route, scope.get("method", ""), str(status))
+
+
+def snapshot_path(metrics_dir: Path, pid: int) -> Path:
+    return metrics_dir / f"metrics_{pid}.json"
+
+
+def write_atomic(path: Path, data: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(data, encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def clear_snapshots(metrics_dir: Path) -> int:
+    """Remove the snapshots and roll-up of a previous run; returns how many files."""
+    removed = 0
+    for pattern in ("metrics_*.json", "metrics_*.tmp"):
+        for path in metrics_dir.glob(pattern):
+            try:
+                path.unlink()
+                removed += 1
+            except OSError:
+                continue
+    return removed
+
+
+def fold_worker_snapshot(metrics_dir: Path, pid: int) -> bool:
+    """Add an exited worker's counters and histograms to the roll-up file and
+    remove its snapshot (its gauges died with it). Returns False without a snapshot."""
+    path = snapshot_path(metrics_dir, pid)
+    try:
+        worker = json.loads(path.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return False
+    except (OSError, ValueError):
+        path.unlink()
+        return False
+    rollup = metrics_dir / ROLLUP_FILE
+    snapshots = [(worker, False)]
+    try:
+        snapshots.append((json.loads(rollup.read_text(encoding="utf-8")), False))
+    except FileNotFoundError:
+        pass
+    write_atomic(rollup, json.dumps(registry.to_snapshot(registry.merge(snapshots))))
+    path.unlink()
+    return True
+
+
+class MetricsExporter:
+    """Background tasks for one worker: loop lag sampling and snapshot files."""
+
+    def __init__(self, metrics_dir: str = METRICS_DIR,
+                 flush_interval: float = METRICS_FLUSH_INTERVAL,
+                 lag_interval: float = EVENT_LOOP_LAG_INTERVAL):
+        self.metrics_dir = Path(metrics_dir) if metrics_dir else None
+        self.flush_interval = flush_interval
+        self.lag_interval = lag_interval
+        self._tasks: List["asyncio.Task[None]"] = []
+
+    @property
+    def snapshot_file(self) -> Optional[Path]:
+        if self.metrics_dir is None:
+            return None
+        return snapshot_path(self.metrics_dir, os.getpid())
+
+    async def _sample_lag(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.lag_interval
+            await asyncio.sleep(self.lag_interval)
+            lag = max(0.0, loop.time() - expected)
+            LOOP_LAG.observe(lag)
+            LOOP_LAG_LAST.set(lag)
+
+    def _write_sync(self, data: str) -> None:
+        path = self.snapshot_file
+        assert path is not None
+        write_atomic(path, data)
+
+    async def flush(self) -> None:
+        if self.metrics_dir is not None:
+            await asyncio.to_thread(self._write_sync, json.dumps(registry.snapshot()))
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Metrics snapshot write failed: {str(e)}")
+
+    def _read_all_sync(self) -> List[Tuple[Dict[str, Any], bool]]:
+        assert self.metrics_dir is not None
+        live_after = time.time() - 3 * self.flush_interval
+        snapshots = []
+        for path in self.metrics_dir.glob("metrics_*.json"):
+            try:
+                snapshots.append((json.loads(path.read_text(encoding="utf-8")),
+                                  path.stat().st_mtime >= live_after))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    async def render(self) -> str:
+        """Metrics for a scrape: this worker alone, or every worker in METRICS_DIR."""
+        if self.metrics_dir is None:
+            return registry.render()
+        await self.flush()
+        snapshots = await asyncio.to_thread(self._read_all_sync)
+        return registry.render(registry.merge(snapshots))
+
+    def start(self) -> None:
+        if self.lag_interval > 0:
+            self._tasks.append(asyncio.ensure_future(self._sample_lag()))
+        if self.metrics_dir is not None and self.flush_interval > 0:
+            self._tasks.append(asyncio.ensure_future(self._flush_loop()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Metrics snapshot write failed: {str(e)}")
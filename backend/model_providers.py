@@ -0,0 +1,248 @@
+"""
+Model Providers
+Pluggable LLM backends for the fallback tier: OpenAI, OpenAI-compatible servers
+and an in-process CPU runner with micro-batched generation
+"""
+
+import os
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from batching import MicroBatcher
+from lazy import LazyResource
+from logging_config import logger
+
+Messages = List[Dict[str, str]]
+
+
+class ProviderUnavailable(Exception):
+    """The provider is not configured or its runtime is not installed."""
+
+
+class Usage:
+    """Token counts in the shape of OpenAI's `response.usage`."""
+
+    __slots__ = ("prompt_tokens", "completion_tokens")
+
+    def __init__(self, prompt_tokens: int, completion_tokens: int):
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+
+
+class ModelProvider:
+    """Chat completion backend used behind call_openai_fallback.
+
+    `metered` providers are billed per token and count against the usage
+    budgets; self-hosted ones are not.
+    """
+
+    name = "provider"
+    metered = False
+
+    async def complete(self, messages: Messages, max_tokens: int,
+                       temperature: float) -> Tuple[str, Optional[Any]]:
+        """Return (text, usage) for one conversation."""
+        raise NotImplementedError
+
+    async def stream(self, messages: Messages, max_tokens: int,
+                     temperature: float) -> AsyncIterator[Tuple[str, Optional[Any]]]:
+        """Yield (text chunk, usage) pairs; usage is set on the final pair if known."""
+        text, usage = await self.complete(messages, max_tokens, temperature)
+        yield text, usage
+
+    def warm_up(self) -> None:
+        pass
+
+    async def aclose(self) -> None:
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {"metered": self.metered}
+
+
+class OpenAIChatProvider(ModelProvider):
+    """OpenAI, or any server speaking the OpenAI chat completions API
+    (vLLM, llama.cpp server, Ollama, LM Studio...) when `base_url` is set."""
+
+    def __init__(self, name: str, model: str, client: LazyResource, metered: bool = True):
+        self.name = name
+        self.model = model
+        self.client = client
+        self.metered = metered
+
+    async def complete(self, messages: Messages, max_tokens: int,
+                       temperature: float) -> Tuple[str, Optional[Any]]:
+        client = await self.client.get()
+        response = await client.chat.completions.create(
+            model=self.model,
+            messages=messages,  # type: ignore
+            max_tokens=max_tokens,
+            temperature=temperature,
+        )
+        text = (response.choices[0].message.content or "").strip()
+        return text, getattr(response, "usage", None)
+
+    async def stream(self, messages: Messages, max_tokens: int,
+                     temperature: float) -> AsyncIterator[Tuple[str, Optional[Any]]]:
+        client = await self.client.get()
+        stream = await client.chat.completions.create(
+            model=self.model,
+            messages=messages,  # type: ignore
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stream=True,
+            # Final chunk carries the token usage for accounting
+            stream_options={"include_usage": True},
+        )
+        try:
+            async for chunk in stream:
+                usage = getattr(chunk, "usage", None)
+                text = chunk.choices[0].delta.content if chunk.choices else None
+                if text or usage:
+                    yield text or "", usage
+        finally:
+            await stream.close()
+
+    def warm_up(self) -> None:
+        self.client.warm_up()
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"metered": self.metered, "model": self.model, "client": self.client.stats()}
+
+
+class CPUModelProvider(ModelProvider):
+    """In-process Hugging Face causal LM on CPU with micro-batched generation.
+
+    Needs the optional `transformers` and `torch` packages; the model is
+    loaded by a background warm-up or the first request.
+    """
+
+    def __init__(self, name: str, model_id: str, max_batch: int = 8,
+                 window: float = 0.02, threads: int = 0):
+        self.name = name
+        self.model_id = model_id
+        self.threads = threads
+        self.model = LazyResource(f"{name}-model", self._load)
+        self.batcher = MicroBatcher(self._generate_batch, max_batch, window)
+
+    def _load(self) -> Tuple[Any, Any]:
+        try:
+            import torch  # type: ignore
+            from transformers import AutoModelForCausalLM, AutoTokenizer  # type: ignore
+        except ImportError as e:
+            raise ProviderUnavailable(
+                f"provider '{self.name}' needs the transformers and torch packages") from e
+        if self.threads > 0:
+            torch.set_num_threads(self.threads)
+        tokenizer = AutoTokenizer.from_pretrained(self.model_id, padding_side="left")
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+        model = AutoModelForCausalLM.from_pretrained(self.model_id, torch_dtype=torch.float32)
+        model.eval()
+        return tokenizer, model
+
+    def _generate_batch(self, items: List[Tuple[Messages, int, float]]) -> List[Tuple[str, Usage]]:
+        """Run one padded generate() call for every conversation in the batch."""
+        import torch  # type: ignore
+
+        tokenizer, model = self.model.value  # loaded before any submit
+        prompts = [tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+                   for messages, _, _ in items]
+        inputs = tokenizer(prompts, return_tensors="pt", padding=True)
+        max_tokens = max(item[1] for item in items)
+        temperature = items[0][2]
+        with torch.inference_mode():
+            output = model.generate(
+                **inputs,
+                max_new_tokens=max_tokens,
+                do_sample=temperature > 0,
+                temperature=temperature if temperature > 0 else None,
+                pad_token_id=tokenizer.pad_token_id,
+            )
+        prompt_length = inputs["input_ids"].shape[1]
+        results = []
+        for row, (_, row_max_tokens, _) in enumerate(items):
+            new_tokens = output[row][prompt_length:][:row_max_tokens]
+            text = tokenizer.decode(new_tokens, skip_special_tokens=True).strip()
+            completion_tokens = int((new_tokens != tokenizer.pad_token_id).sum())
+            prompt_tokens = int(inputs["attention_mask"][row].sum())
+            results.append((text, Usage(prompt_tokens, completion_tokens)))
+        return results
+
+    async def complete(self, messages: Messages, max_tokens: int,
+                       temperature: float) -> Tuple[str, Optional[Any]]:
+        await self.model.get()
+        return await self.batcher.submit((messages, max_tokens, temperature))
+
+    def warm_up(self) -> None:
+        self.model.warm_up()
+
+    async def aclose(self) -> None:
+        await self.batcher.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"metered": False, "model": self.model_id,
+                "runner": self.model.stats(), "batching": self.batcher.stats()}
+
+
+class ProviderRegistry:
+    """Configured providers plus the per-page choice from the prompt YAML."""
+
+    def __init__(self, providers: Dict[str, ModelProvider], default: str):
+        self.providers = providers
+        self.default = default if default in providers else next(iter(providers), "")
+        self._warned: set = set()
+
+    def get(self, name: Optional[str]) -> Optional[ModelProvider]:
+        """Provider `name`, or the default when it is not set or not configured."""
+        if name and name not in self.providers and name not in self._warned:
+            self._warned.add(name)
+            logger.warning(f"Model provider '{name}' is not configured, using '{self.default}'")
+        return self.providers.get(name or "") or self.providers.get(self.default)
+
+    def warm_up(self) -> None:
+        for provider in self.providers.values():
+            provider.warm_up()
+
+    async def aclose(self) -> None:
+        for provider in self.providers.values():
+            await provider.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "default": self.default,
+            "providers": {name: p.stats() for name, p in self.providers.items()},
+        }
+
+
+# Environment configuration of the optional self-hosted providers
+LOCAL_LLM_URL = os.getenv("LOCAL_LLM_URL", "")
+LOCAL_LLM_MODEL = os.getenv("LOCAL_LLM_MODEL", "local-model")
+LOCAL_LLM_API_KEY = os.getenv("LOCAL_LLM_API_KEY", "not-needed")
+CPU_LLM_MODEL = os.getenv("CPU_LLM_MODEL", "")
+CPU_LLM_MAX_BATCH = int(os.getenv("CPU_LLM_MAX_BATCH", "8"))
+CPU_LLM_BATCH_WINDOW = float(os.getenv("CPU_LLM_BATCH_WINDOW", "0.02"))
+CPU_LLM_THREADS = int(os.getenv("CPU_LLM_THREADS", "0"))
+DEFAULT_MODEL_PROVIDER = os.getenv("DEFAULT_MODEL_PROVIDER", "openai")
+
+
+def build_providers(openai_provider: Optional[ModelProvider],
+                    client_factory: Callable[[str, str], Any],
+                    close_client: Callable[[Any], Any]) -> ProviderRegistry:
+    """Providers enabled by the environment: openai (if keyed), local, cpu."""
+    providers: Dict[str, ModelProvider] = {}
+    if openai_provider is not None:
+        providers[openai_provider.name] = openai_provider
+    if LOCAL_LLM_URL:
+        client = LazyResource(
+            "local", lambda: client_factory(LOCAL_LLM_URL, LOCAL_LLM_API_KEY), close_client)
+        providers["local"] = OpenAIChatProvider("local", LOCAL_LLM_MODEL, client, metered=False)
+    if CPU_LLM_MODEL:
+        providers["cpu"] = CPUModelProvider(
+            "cpu", CPU_LLM_MODEL, CPU_LLM_MAX_BATCH, CPU_LLM_BATCH_WINDOW, CPU_LLM_THREADS)
+    registry = ProviderRegistry(providers, DEFAULT_MODEL_PROVIDER)
+    logger.info(
+        f"Model providers: {', '.join(providers) or 'none'} (default: {registry.default or 'none'})")
+    return registry
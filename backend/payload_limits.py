@@ -0,0 +1,141 @@
+"""
+Payload Limits
+Request body cap enforced before parsing, and bounded chat message and context shapes
+"""
+
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from starlette.responses import JSONResponse
+
+from metrics import PAYLOAD_REJECTIONS
+
+# Bytes of request body accepted on any route; larger bodies get a 413 unread
+MAX_REQUEST_BODY_BYTES = int(os.getenv("MAX_REQUEST_BODY_BYTES", "32768"))
+# Chat input bounds (over them: 413)
+CHAT_MAX_MESSAGE_CHARS = int(os.getenv("CHAT_MAX_MESSAGE_CHARS", "2000"))
+CHAT_MAX_CONTEXT_DEPTH = int(os.getenv("CHAT_MAX_CONTEXT_DEPTH", "3"))
+CHAT_MAX_CONTEXT_KEYS = int(os.getenv("CHAT_MAX_CONTEXT_KEYS", "32"))
+
+# Context keys forwarded to the upstreams; everything else is dropped
+CHAT_CONTEXT_KEYS = ("page", "sessionId")
+CHAT_CONTEXT_VALUE_CHARS = 128
+CHAT_MAX_LANGUAGE_CHARS = 16
+
+BODY_METHODS = frozenset(["POST", "PUT", "PATCH"])
+
+
+def too_large_response(detail: str) -> JSONResponse:
+    """413 in the same shape as the app's HTTPException responses."""
+    return JSONResponse(
+        status_code=413,
+        content={"error": {"message": detail, "type": "http_exception", "status_code": 413}},
+    )
+
+
+class BodySizeLimitMiddleware:
+    """ASGI middleware rejecting request bodies over `max_bytes` with a 413.
+
+    A declared Content-Length over the limit is rejected before any byte is
+    read. Otherwise the body is buffered up to the limit (FastAPI reads it
+    whole anyway) and replayed to the app, so a chunked upload cannot make
+    the app parse more than `max_bytes`.
+    """
+
+    def __init__(self, app: Any, max_bytes: int = MAX_REQUEST_BODY_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if (scope["type"] != "http" or self.max_bytes <= 0
+                or scope.get("method") not in BODY_METHODS):
+            await self.app(scope, receive, send)
+            return
+
+        detail = f"Requête trop volumineuse (max {self.max_bytes} octets)"
+        for name, value in scope.get("headers", []):
+            if name == b"content-length":
+                if not value.isdigit() or int(value) > self.max_bytes:
+                    PAYLOAD_REJECTIONS.inc("body_size")
+                    await too_large_response(detail)(scope, receive, send)
+                    return
+                break
+
+        chunks: List[bytes] = []
+        size = 0
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                # Client went away before the body arrived
+                return
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > self.max_bytes:
+                PAYLOAD_REJECTIONS.inc("body_size")
+                await too_large_response(detail)(scope, receive, send)
+                return
+            chunks.append(chunk)
+            if not message.get("more_body", False):
+                break
+
+        body = b"".join(chunks)
+        replayed = False
+
+        async def replay() -> Dict[str, Any]:
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        await self.app(scope, replay, send)
+
+
+def context_shape(context: Any) -> Tuple[int, int]:
+    """(nesting depth, total keys and items) of a JSON value, walked iteratively."""
+    depth = 0
+    keys = 0
+    stack = [(context, 1)]
+    while stack:
+        value, level = stack.pop()
+        if isinstance(value, dict):
+            children = list(value.values())
+        elif isinstance(value, list):
+            children = value
+        else:
+            continue
+        depth = max(depth, level)
+        keys += len(children)
+        if keys > CHAT_MAX_CONTEXT_KEYS or depth > CHAT_MAX_CONTEXT_DEPTH:
+            break
+        stack.extend((child, level + 1) for child in children)
+    return depth, keys
+
+
+def check_chat_payload(message: str, language: Optional[str], context: Any) -> Optional[str]:
+    """Reason the chat input is over its bounds (for a 413), None when it is fine."""
+    if len(message) > CHAT_MAX_MESSAGE_CHARS:
+        PAYLOAD_REJECTIONS.inc("message_length")
+        return f"Message trop long (max {CHAT_MAX_MESSAGE_CHARS} caractères)"
+    if language is not None and len(language) > CHAT_MAX_LANGUAGE_CHARS:
+        PAYLOAD_REJECTIONS.inc("language")
+        return "Langue invalide"
+    if context is not None:
+        depth, keys = context_shape(context)
+        if depth > CHAT_MAX_CONTEXT_DEPTH or keys > CHAT_MAX_CONTEXT_KEYS:
+            PAYLOAD_REJECTIONS.inc("context")
+            return (f"Contexte trop volumineux (max {CHAT_MAX_CONTEXT_KEYS} clés, "
+                    f"profondeur {CHAT_MAX_CONTEXT_DEPTH})")
+    return None
+
+
+def sanitize_context(context: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Only the whitelisted context keys, as short strings."""
+    if not isinstance(context, dict):
+        return {}
+    clean = {}
+    for key in CHAT_CONTEXT_KEYS:
+        value = context.get(key)
+        if isinstance(value, (str, int)) and not isinstance(value, bool) and str(value):
+            clean[key] = str(value)[:CHAT_CONTEXT_VALUE_CHARS]
+    return clean
@@ -0,0 +1,262 @@
+"""
+Prompt Registry
+Precompiled (language, page) lookup tables for system prompts and fallback responses
+"""
+
+import asyncio
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from intent_matcher import IntentMatch, IntentMatcher
+from logging_config import logger
+
+DEFAULT_SYSTEM_PROMPT = "You are a helpful AI assistant for Kokotajlo, a startup building AI solutions for French businesses. Always respond in French by default."
+FACTS_PLACEHOLDER = "{facts}"
+DEFAULT_FALLBACK_RESPONSES = [
+    "Bonjour! Je suis l'assistant virtuel de Kokotajlo. Comment puis-je vous aider aujourd'hui?"]
+
+
+def load_prompts(file_path: str) -> dict:
+    """Load prompts from YAML file with error handling."""
+    import yaml  # type: ignore
+
+    try:
+        logger.info(
+            f"Attempting to load prompts from absolute path: {Path(file_path).absolute()}")
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return yaml.safe_load(f) or {}
+    except FileNotFoundError:
+        logger.error(f"Prompts file not found: {file_path}")
+        return {}
+    except yaml.YAMLError as e:
+        logger.error(f"Error parsing YAML file {file_path}: {str(e)}")
+        return {}
+    except Exception as e:
+        logger.error(
+            f"Unexpected error loading prompts from {file_path}: {str(e)}")
+        return {}
+
+
+def join_blocks(*blocks: str) -> str:
+    return "\n".join(block for block in blocks if block)
+
+
+def fill_facts(template: str, facts: str) -> str:
+    """Replace the {facts} placeholder, dropping the blank lines left by an empty block."""
+    return re.sub(r"\n{3,}", "\n\n", template.replace(FACTS_PLACEHOLDER, facts))
+
+
+class PromptTables:
+    """Immutable snapshot of resolved prompts, swapped in whole on reload."""
+
+    def __init__(self, system: dict, fallback: dict):
+        self.system_raw = system
+        self.fallback_raw = fallback
+
+        # page -> stripped prompt template; a {facts} line is filled with the
+        # page's 'core_facts:' and 'facts:' blocks (the 'general' ones when the
+        # page has none), or with 'core_facts:' and retrieved snippets
+        # (system_prompt_with)
+        self.templates: Dict[str, str] = {}
+        self.core_facts: Dict[str, str] = {}
+        self.facts: Dict[str, str] = {}
+        self.system_prompts: Dict[str, str] = {}
+        general = system.get("general") if isinstance(system.get("general"), dict) else {}
+        for page, entry in system.items():
+            prompt = entry.get("system_prompt") if isinstance(entry, dict) else None
+            if isinstance(prompt, str) and prompt.strip():
+                core, facts = (entry.get(key, general.get(key)) for key in ("core_facts", "facts"))
+                self.templates[page] = prompt.strip()
+                self.core_facts[page] = core.strip() if isinstance(core, str) else ""
+                self.facts[page] = facts.strip() if isinstance(facts, str) else ""
+                self.system_prompts[page] = fill_facts(
+                    prompt.strip(), join_blocks(self.core_facts[page], self.facts[page]))
+        self.default_system_prompt = self.system_prompts.get(
+            "general", DEFAULT_SYSTEM_PROMPT)
+
+        # page -> model provider name ('provider:' key), 'general' as the default
+        self.providers: Dict[str, str] = {}
+        for page, entry in system.items():
+            provider = entry.get("provider") if isinstance(entry, dict) else None
+            if isinstance(provider, str) and provider.strip():
+                self.providers[page] = provider.strip()
+        self.default_provider = self.providers.get("general")
+
+        # page -> canned-answer fast path switch ('fast_path:' key)
+        self.fast_path: Dict[str, bool] = {
+            page: bool(entry["fast_path"]) for page, entry in system.items()
+            if isinstance(entry, dict) and "fast_path" in entry}
+        self.intents = IntentMatcher(fallback.get("intents") or {})
+
+        # (language, page) -> responses, resolved through the same-language
+        # 'general' entry and then the English 'general' entry
+        def responses_for(language: str, page: str) -> List[str]:
+            entry = (fallback.get(language) or {}).get(page) or {}
+            responses = entry.get("responses") if isinstance(entry, dict) else None
+            return [r.strip() for r in responses if isinstance(r, str) and r.strip()] if responses else []
+
+        english_default = responses_for("en", "general") or DEFAULT_FALLBACK_RESPONSES
+        self.language_defaults: Dict[str, List[str]] = {}
+        self.fallback_responses: Dict[Tuple[str, str], List[str]] = {}
+        for language, pages in fallback.items():
+            if language == "intents" or not isinstance(pages, dict):
+                continue
+            default = responses_for(language, "general") or english_default
+            self.language_defaults[language] = default
+            for page in set(pages) | set(self.system_prompts):
+                self.fallback_responses[(language, page)] = responses_for(
+                    language, page) or default
+        self.english_default = english_default
+
+
+class PromptRegistry:
+    """Resolved prompt tables built once from the YAML files, hot-reloaded on change.
+
+    Lookups are plain dict hits on the current PromptTables snapshot; a
+    reload builds a new snapshot and swaps it in with a single assignment.
+    The YAML files are read in a worker thread: first by warm_up() after
+    startup, which request handlers await through ready() before their first
+    lookup, then by the watcher. Loads are serialized by a lock, so the
+    files are never parsed twice at once.
+    """
+
+    def __init__(self, system_file: Path, fallback_file: Path):
+        self.system_file = system_file
+        self.fallback_file = fallback_file
+        self._mtimes: Tuple[float, float] = (0.0, 0.0)
+        self._watch_task: Optional["asyncio.Task[None]"] = None
+        self.reloads = 0
+        self._tables: Optional[PromptTables] = None
+        self._lock = threading.RLock()
+        self._loading: Optional["asyncio.Future[None]"] = None
+
+    @property
+    def tables(self) -> PromptTables:
+        # Only loads synchronously outside the request path (CLI, preload);
+        # handlers await ready() first
+        if self._tables is None:
+            self._ensure_loaded()
+        return self._tables  # type: ignore[return-value]
+
+    def _ensure_loaded(self) -> None:
+        with self._lock:
+            if self._tables is None:
+                self.reload()
+
+    def _current_mtimes(self) -> Tuple[float, float]:
+        def mtime(path: Path) -> float:
+            try:
+                return os.stat(path).st_mtime
+            except OSError:
+                return 0.0
+        return (mtime(self.system_file), mtime(self.fallback_file))
+
+    def reload(self) -> None:
+        """Rebuild the tables from disk and swap them in atomically.
+
+        A file that fails to load (e.g. caught mid-save) keeps its previous
+        contents instead of wiping the prompts.
+        """
+        with self._lock:
+            mtimes = self._current_mtimes()
+            previous = self._tables or PromptTables({}, {})
+            tables = PromptTables(
+                load_prompts(str(self.system_file)) or previous.system_raw,
+                load_prompts(str(self.fallback_file)) or previous.fallback_raw,
+            )
+            self._tables = tables
+            self._mtimes = mtimes
+            self.reloads += 1
+        logger.info(
+            f"Prompt registry loaded: {len(tables.system_prompts)} system prompts, {len(tables.fallback_responses)} fallback tables, {len(tables.intents)} intents")
+
+    def reload_if_changed(self) -> bool:
+        """Reload when either YAML file's mtime changed; return True if reloaded."""
+        if self._current_mtimes() == self._mtimes:
+            return False
+        logger.info("Prompt files changed on disk, reloading")
+        self.reload()
+        return True
+
+    async def _watch(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.reload_if_changed)
+            except Exception as e:
+                logger.error(f"Prompt reload failed: {str(e)}")
+
+    async def ready(self) -> None:
+        """Wait for the first load, starting it in a worker thread if needed."""
+        if self._tables is not None:
+            return
+        if self._loading is None or self._loading.done():
+            self._loading = asyncio.ensure_future(asyncio.to_thread(self._ensure_loaded))
+        # Shielded: a cancelled request must not cancel the load others wait on
+        await asyncio.shield(self._loading)
+
+    async def warm_up(self) -> None:
+        """Load the YAML files in a worker thread if no lookup has yet."""
+        await self.ready()
+
+    def start_watching(self, interval: float) -> None:
+        """Poll the YAML files every `interval` seconds (0 disables hot reload)."""
+        if interval > 0 and self._watch_task is None:
+            self._watch_task = asyncio.ensure_future(self._watch(interval))
+
+    async def stop_watching(self) -> None:
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            try:
+                await self._watch_task
+            except asyncio.CancelledError:
+                pass
+            self._watch_task = None
+
+    def system_prompt(self, page: str) -> str:
+        tables = self.tables
+        return tables.system_prompts.get(page) or tables.default_system_prompt
+
+    def page_key(self, page: str) -> str:
+        """`page` when it has a system prompt, else 'general' (bounded keys for counters)."""
+        return page if page in self.tables.templates else "general"
+
+    def has_facts_slot(self, page: str) -> bool:
+        """True when the page's prompt has a {facts} block retrieval can fill."""
+        tables = self.tables
+        template = tables.templates.get(page) or tables.templates.get("general", "")
+        return FACTS_PLACEHOLDER in template
+
+    def system_prompt_with(self, page: str, snippets: str) -> str:
+        """System prompt for `page` with `snippets` in place of its fact sheet
+        (the core facts are kept). The full prompt is returned when the
+        snippets would not be shorter than the sheet they replace."""
+        tables = self.tables
+        key = self.page_key(page)
+        template = tables.templates.get(key)
+        if template is None:
+            return tables.default_system_prompt
+        if len(snippets) >= len(tables.facts[key]):
+            return tables.system_prompts[key]
+        return fill_facts(template, join_blocks(tables.core_facts[key], snippets))
+
+    def fast_path_enabled(self, page: str) -> bool:
+        tables = self.tables
+        return tables.fast_path.get(page, tables.fast_path.get("general", True))
+
+    def match_intent(self, text: str, language: str) -> Optional[IntentMatch]:
+        return self.tables.intents.match(text, language)
+
+    def fallback_responses(self, language: str, page: str) -> List[str]:
+        tables = self.tables
+        return (tables.fallback_responses.get((language, page))
+                or tables.language_defaults.get(language)
+                or tables.english_default)
+
+    def provider(self, page: str) -> Optional[str]:
+        """Model provider configured for `page`, None for the deployment default."""
+        tables = self.tables
+        return tables.providers.get(page) or tables.default_provider
@@ -0,0 +1,97 @@
+"""
+Rate Limiting
+Shared-storage slowapi limiter with proxy-aware client keys
+"""
+
+import os
+from typing import Any, Callable, Dict, Optional
+
+from slowapi import Limiter
+from starlette.requests import Request
+
+from logging_config import logger
+from tracing import stage
+
+# Storage for rate limit counters: memory:// (per process) or a shared
+# redis://host:port/db so every worker and replica sees the same counters
+RATE_LIMIT_STORAGE_URI = os.getenv("RATE_LIMIT_STORAGE_URI", "memory://")
+# fixed-window | moving-window | sliding-window-counter (atomic Lua on Redis)
+RATE_LIMIT_STRATEGY = os.getenv("RATE_LIMIT_STRATEGY", "moving-window")
+RATE_LIMIT_CHAT = os.getenv("RATE_LIMIT_CHAT", "10/minute")
+RATE_LIMIT_CONTACT = os.getenv("RATE_LIMIT_CONTACT", "5/minute")
+# Number of trusted proxies in front of the backend that append to X-Forwarded-For
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "0"))
+# Socket timeout (seconds) for the shared store before falling back to memory
+RATE_LIMIT_STORAGE_TIMEOUT = float(os.getenv("RATE_LIMIT_STORAGE_TIMEOUT", "0.05"))
+
+
+def client_ip(request: Request) -> str:
+    """Client address used as the rate limit key.
+
+    With TRUSTED_PROXY_HOPS=N, the Nth X-Forwarded-For entry from the right
+    is the address our first trusted proxy saw; entries further left are
+    client-controlled and ignored. With 0 hops the socket peer is used.
+    """
+    if TRUSTED_PROXY_HOPS > 0:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            hops = [hop.strip() for hop in forwarded.split(",") if hop.strip()]
+            if hops:
+                return hops[-min(TRUSTED_PROXY_HOPS, len(hops))]
+    if request.client and request.client.host:
+        return request.client.host
+    return "127.0.0.1"
+
+
+class TracedLimiter(Limiter):
+    """Limiter whose checks show up as the "limiter" stage of the request trace.
+
+    slowapi has no hook around a check; _check_request_limit is the one
+    path both middlewares and the route decorator go through.
+    """
+
+    def _check_request_limit(self, request: Request, endpoint_func: Optional[Callable[..., Any]],
+                             in_middleware: bool = True) -> None:
+        with stage("limiter"):
+            super()._check_request_limit(request, endpoint_func, in_middleware)
+
+
+def build_limiter() -> Limiter:
+    """Create the app limiter; a shared store falls back to memory when unreachable."""
+    storage_options: Dict[str, Any] = {}
+    if RATE_LIMIT_STORAGE_URI.startswith(("redis://", "rediss://", "redis+")):
+        storage_options = {
+            "socket_timeout": RATE_LIMIT_STORAGE_TIMEOUT,
+            "socket_connect_timeout": RATE_LIMIT_STORAGE_TIMEOUT,
+        }
+    logger.info(
+        f"Rate limiting with {RATE_LIMIT_STORAGE_URI.split('://')[0]} storage ({RATE_LIMIT_STRATEGY})")
+    try:
+        return TracedLimiter(
+            key_func=client_ip,
+            storage_uri=RATE_LIMIT_STORAGE_URI,
+            storage_options=storage_options,
+            strategy=RATE_LIMIT_STRATEGY,
+            in_memory_fallback_enabled=True,
+            key_prefix="kokotajlo",
+        )
+    except Exception as e:
+        # e.g. redis:// configured but the redis client package is not installed
+        logger.error(
+            f"Rate limit storage unavailable ({str(e)}); using in-process memory storage")
+        return TracedLimiter(
+            key_func=client_ip,
+            strategy=RATE_LIMIT_STRATEGY,
+            key_prefix="kokotajlo",
+        )
+
+
+def limiter_status(limiter: Limiter) -> Dict[str, Any]:
+    """Limiter configuration and fallback state for /api/v1/status."""
+    return {
+        "storage": type(getattr(limiter, "_storage", None)).__name__,
+        "strategy": RATE_LIMIT_STRATEGY,
+        "trusted_proxy_hops": TRUSTED_PROXY_HOPS,
+        "memory_fallback_active": bool(getattr(limiter, "_storage_dead", False)),
+        "limits": {"chat": RATE_LIMIT_CHAT, "contact": RATE_LIMIT_CONTACT},
+    }
@@ -0,0 +1,119 @@
+"""
+Chat Response Cache
+LRU + TTL cache of upstream answers keyed on normalized message, page and language
+"""
+
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+_PUNCTUATION = re.compile(r"[^\w\s]+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_message(message: str) -> str:
+    """Fold case, accents, punctuation and whitespace so near-identical questions match."""
+    text = unicodedata.normalize("NFKD", message.casefold())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = _PUNCTUATION.sub(" ", text)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def cache_key(message: str, context_key: str, language: str) -> str:
+    """Cache key for a chat message on a given page prompt and language."""
+    return f"{language}|{context_key}|{normalize_message(message)}"
+
+
+class ResponseCache:
+    """In-memory LRU cache with per-entry TTL and a total size cap.
+
+    Only first messages of a conversation are cacheable: once a session has
+    received a reply, later turns depend on upstream conversation state
+    (the n8n agent keeps memory per sessionId) and bypass the cache.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl: float = 3600.0,
+        max_bytes: int = 2 * 1024 * 1024,
+        max_sessions: int = 10000,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_sessions = max_sessions
+        # key -> (expires_at, text, source, size)
+        self._entries: "OrderedDict[str, Tuple[float, str, str, int]]" = OrderedDict()
+        self._sessions: "OrderedDict[str, None]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.bypasses = 0
+
+    def is_bypassed(self, session_id: Optional[str]) -> bool:
+        """True if the session already has history, so its answers must not be shared."""
+        if session_id and session_id in self._sessions:
+            self.bypasses += 1
+            return True
+        return False
+
+    def note_turn(self, session_id: Optional[str]) -> None:
+        """Remember that a session has received a reply (bounded LRU of sessions)."""
+        if not session_id:
+            return
+        self._sessions[session_id] = None
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Tuple[str, str]]:
+        """Return (text, source) for a fresh entry, or None."""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry[0] < time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1], entry[2]
+
+    def put(self, key: str, text: str, source: str) -> None:
+        """Store an upstream answer, evicting least recently used entries as needed."""
+        size = len(key) + len(text.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + self.ttl, text, source, size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= entry[3]
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for /api/v1/status."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "bypasses": self.bypasses,
+        }
@@ -0,0 +1,475 @@
+"""
+Retrieval Index
+BM25 index over the site content, memory-mapped from disk and searched on CPU
+
+Usage:
+    python retrieval.py build
+    python retrieval.py search "prix du pilote"
+    python retrieval.py bench --output retrieval.json
+"""
+
+import argparse
+import hashlib
+import heapq
+import json
+import math
+import mmap
+import os
+import re
+import statistics
+import struct
+import time
+import unicodedata
+from array import array
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from logging_config import logger
+
+BACKEND_DIR = Path(__file__).parent
+SITE_DIR = BACKEND_DIR.parent
+
+# Retrieved snippets replace the `facts:` block of the system prompts (`core_facts:` stay)
+RETRIEVAL_ENABLED = os.getenv("RETRIEVAL_ENABLED", "false").lower() == "true"
+RETRIEVAL_INDEX_PATH = Path(os.getenv(
+    "RETRIEVAL_INDEX_PATH", str(BACKEND_DIR / "data" / "retrieval.idx")))
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "3"))
+# Snippets scoring below this are left out (no snippet: the full fact sheet is used)
+RETRIEVAL_MIN_SCORE = float(os.getenv("RETRIEVAL_MIN_SCORE", "1.0"))
+RETRIEVAL_SNIPPET_CHARS = int(os.getenv("RETRIEVAL_SNIPPET_CHARS", "160"))
+# Total characters of snippets per prompt, kept below the fact sheet they replace
+# (longer snippets than the sheet are not used)
+RETRIEVAL_MAX_CHARS = int(os.getenv("RETRIEVAL_MAX_CHARS", "240"))
+
+MAGIC = b"KKRIDX01"
+BM25_K1 = 1.2
+BM25_B = 0.75
+MIN_DOC_TOKENS = 4
+# Message sections that are UI labels rather than content
+SKIPPED_MESSAGES = frozenset([
+    "navigation", "chatbot", "common", "contact.form", "contact.validation", "contact.map"])
+
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have in is it its of on or our that the this to was we
+were will with you your what how can do does
+au aux avec ce ces dans de des du elle en est et il ils je la le les leur mais me nos notre
+nous on ou par pas pour qu que qui sa se ses son sur ta te tes un une vos votre vous y
+c d j l m n s t qu est ce quoi comment
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased, accent-folded word tokens without stopwords, plurals stripped."""
+    folded = unicodedata.normalize("NFKD", text.lower())
+    folded = "".join(c for c in folded if not unicodedata.combining(c))
+    tokens = []
+    for word in re.findall(r"[a-z0-9€]+", folded):
+        if word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s"):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+
+class Document:
+    __slots__ = ("source", "lang", "title", "text")
+
+    def __init__(self, source: str, lang: str, title: str, text: str):
+        self.source = source
+        self.lang = lang
+        self.title = title
+        self.text = text
+
+
+# Document collection
+
+
+def _strip_html(html: str) -> str:
+    text = re.sub(r"<[^>]+>", " ", html)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _leaf_strings(value: Any) -> Iterator[str]:
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, list):
+        for item in value:
+            yield from _leaf_strings(item)
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _leaf_strings(item)
+
+
+def _group_documents(source: str, lang: str, title: str, group: Any) -> List[Document]:
+    """Documents for one message group: FAQ pairs and list items stand alone."""
+    if isinstance(group, dict) and any(key.endswith("_answer") for key in group):
+        return [Document(source, lang, f"{title}.{key}", f"{group[key]} {group[f'{key}_answer']}")
+                for key in group if f"{key}_answer" in group]
+    if isinstance(group, list) and all(isinstance(item, dict) for item in group):
+        return [Document(source, lang, f"{title}.{i}", " ".join(_leaf_strings(item)))
+                for i, item in enumerate(group)]
+    return [Document(source, lang, title, " ".join(_leaf_strings(group)))]
+
+
+def messages_documents(path: Path, lang: str) -> List[Document]:
+    """Documents per second-level section of a next-intl messages file (UI labels skipped)."""
+    with open(path, "r", encoding="utf-8") as f:
+        messages = json.load(f)
+    docs = []
+    for section, value in messages.items():
+        if section in SKIPPED_MESSAGES:
+            continue
+        groups = value.items() if isinstance(value, dict) else [("", value)]
+        loose: List[str] = []
+        for key, group in groups:
+            title = f"{section}.{key}"
+            if title in SKIPPED_MESSAGES:
+                continue
+            if isinstance(group, (dict, list)):
+                docs.extend(_group_documents(f"{path.name}#{title}", lang, title, group))
+            else:
+                loose.append(group)
+        if loose:
+            docs.append(Document(f"{path.name}#{section}", lang, section, " ".join(loose)))
+    return docs
+
+
+ARTICLE_PATTERN = re.compile(
+    r"\b(fr|en):\s*\{\s*title:\s*'((?:[^'\\]|\\.)*)'.*?content:\s*`([^`]*)`", re.S)
+
+
+def article_documents(path: Path) -> List[Document]:
+    """One document per <h2> section of the resource articles in the page source."""
+    docs = []
+    source = path.read_text(encoding="utf-8")
+    for match in ARTICLE_PATTERN.finditer(source):
+        lang, title, content = match.group(1), match.group(2).replace("\\'", "'"), match.group(3)
+        for section in re.split(r"(?=<h2>)", content):
+            heading = re.search(r"<h2>(.*?)</h2>", section)
+            text = _strip_html(section)
+            if text:
+                section_title = f"{title} – {heading.group(1)}" if heading else title
+                docs.append(Document(f"resources#{title}", lang, section_title, text))
+    return docs
+
+
+def default_sources() -> Dict[str, Path]:
+    return {
+        "fr": SITE_DIR / "src" / "messages" / "fr.json",
+        "en": SITE_DIR / "src" / "messages" / "en.json",
+        "articles": SITE_DIR / "src" / "app" / "resources" / "[slug]" / "page.tsx",
+    }
+
+
+def collect_documents(sources: Dict[str, Path]) -> List[Document]:
+    """Documents from every source file that exists (a missing one is skipped)."""
+    docs: List[Document] = []
+    for name, path in sources.items():
+        if not path.exists():
+            logger.warning(f"Retrieval source {name} not found: {path}")
+            continue
+        if name in ("fr", "en"):
+            docs.extend(messages_documents(path, name))
+        else:
+            docs.extend(article_documents(path))
+    return [d for d in docs if len(tokenize(d.text)) >= MIN_DOC_TOKENS]
+
+
+def sources_digest(sources: Dict[str, Path]) -> str:
+    """Content hash of the sources, stored in the index to detect a stale file."""
+    digest = hashlib.sha1()
+    for name, path in sorted(sources.items()):
+        digest.update(name.encode())
+        if path.exists():
+            digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+# Index file: MAGIC | header length (u64) | JSON header | doc ids (u32) | weights (f32) | texts
+
+
+def build_index(sources: Dict[str, Path], path: Path) -> Dict[str, Any]:
+    """Build the BM25 index file for `sources` at `path` (atomic replace)."""
+    started = time.perf_counter()
+    docs = collect_documents(sources)
+    doc_tokens = [tokenize(f"{d.title} {d.text}") for d in docs]
+    avgdl = sum(len(t) for t in doc_tokens) / max(1, len(doc_tokens))
+
+    postings: Dict[str, List[Tuple[int, int]]] = {}
+    for doc_id, tokens in enumerate(doc_tokens):
+        for term, tf in Counter(tokens).items():
+            postings.setdefault(term, []).append((doc_id, tf))
+
+    # Store the full BM25 term weight per posting; a query only sums them
+    doc_ids = array("I")
+    weights = array("f")
+    terms: Dict[str, List[int]] = {}
+    n = len(docs)
+    for term in sorted(postings):
+        entries = postings[term]
+        idf = math.log(1 + (n - len(entries) + 0.5) / (len(entries) + 0.5))
+        terms[term] = [len(doc_ids), len(entries)]
+        for doc_id, tf in entries:
+            dl = len(doc_tokens[doc_id])
+            doc_ids.append(doc_id)
+            weights.append(idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * dl / avgdl)))
+
+    texts = bytearray()
+    doc_entries = []
+    for doc in docs:
+        encoded = doc.text.encode("utf-8")
+        doc_entries.append({"source": doc.source, "lang": doc.lang, "title": doc.title,
+                            "start": len(texts), "length": len(encoded)})
+        texts.extend(encoded)
+
+    header = {
+        "version": 1,
+        "digest": sources_digest(sources),
+        "built_at": time.time(),
+        "docs": doc_entries,
+        "terms": terms,
+        "postings": len(doc_ids),
+    }
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    # Pad so the u32/f32 arrays start 4-byte aligned
+    header_bytes += b" " * (-(len(MAGIC) + 8 + len(header_bytes)) % 4)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f".tmp{os.getpid()}")
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(header_bytes)))
+        f.write(header_bytes)
+        f.write(doc_ids.tobytes())
+        f.write(weights.tobytes())
+        f.write(texts)
+    os.replace(tmp_path, path)
+    seconds = time.perf_counter() - started
+    logger.info(
+        f"Retrieval index built: {n} docs, {len(terms)} terms in {seconds * 1000:.0f}ms ({path})")
+    return {"docs": n, "terms": len(terms), "postings": len(doc_ids),
+            "bytes": path.stat().st_size, "build_ms": round(seconds * 1000, 1)}
+
+
+class Snippet:
+    __slots__ = ("title", "text", "source", "score")
+
+    def __init__(self, title: str, text: str, source: str, score: float):
+        self.title = title
+        self.text = text
+        self.source = source
+        self.score = score
+
+
+class RetrievalIndex:
+    """Read-only BM25 index backed by a memory-mapped file.
+
+    Postings are read in place from the mapping, so every worker process
+    shares the same page-cache copy; only the JSON header (vocabulary and
+    document table) is parsed per process.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a retrieval index")
+        (header_length,) = struct.unpack_from("<Q", self._map, len(MAGIC))
+        header_start = len(MAGIC) + 8
+        header = json.loads(bytes(self._map[header_start:header_start + header_length]))
+        self.digest: str = header["digest"]
+        self.built_at: float = header["built_at"]
+        self.docs: List[Dict[str, Any]] = header["docs"]
+        self.terms: Dict[str, List[int]] = header["terms"]
+        count = header["postings"]
+        ids_start = header_start + header_length
+        weights_start = ids_start + 4 * count
+        self._texts_start = weights_start + 4 * count
+        view = memoryview(self._map)
+        self._doc_ids = view[ids_start:weights_start].cast("I")
+        self._weights = view[weights_start:self._texts_start].cast("f")
+        self.queries = 0
+        self.query_seconds = 0.0
+
+    def text(self, doc_id: int) -> str:
+        doc = self.docs[doc_id]
+        start = self._texts_start + doc["start"]
+        return self._map[start:start + doc["length"]].decode("utf-8")
+
+    def search(self, query: str, language: Optional[str] = None, k: int = RETRIEVAL_TOP_K,
+               min_score: float = RETRIEVAL_MIN_SCORE) -> List[Snippet]:
+        """Top `k` documents for `query` in `language` (or language-neutral)."""
+        started = time.perf_counter()
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            entry = self.terms.get(term)
+            if entry is None:
+                continue
+            offset, count = entry
+            ids = self._doc_ids[offset:offset + count]
+            weights = self._weights[offset:offset + count]
+            for i in range(count):
+                doc_id = ids[i]
+                scores[doc_id] = scores.get(doc_id, 0.0) + weights[i]
+        candidates = ((score, doc_id) for doc_id, score in scores.items()
+                      if score >= min_score
+                      and (not language or self.docs[doc_id]["lang"] in ("", language)))
+        snippets = [Snippet(self.docs[doc_id]["title"], self.text(doc_id),
+                            self.docs[doc_id]["source"], score)
+                    for score, doc_id in heapq.nlargest(k, candidates)]
+        self.queries += 1
+        self.query_seconds += time.perf_counter() - started
+        return snippets
+
+    def close(self) -> None:
+        for name in ("_doc_ids", "_weights"):
+            view = getattr(self, name, None)
+            if view is not None:
+                view.release()
+        self._map.close()
+        self._file.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": str(self.path),
+            "docs": len(self.docs),
+            "terms": len(self.terms),
+            "bytes": self._map.size(),
+            "queries": self.queries,
+            "avg_query_ms": round(self.query_seconds / self.queries * 1000, 3) if self.queries else 0.0,
+        }
+
+
+def open_index(path: Path = RETRIEVAL_INDEX_PATH,
+               sources: Optional[Dict[str, Path]] = None) -> RetrievalIndex:
+    """Open the index at `path`, rebuilding it first when missing or stale."""
+    sources = sources or default_sources()
+    digest = sources_digest(sources)
+    if path.exists():
+        try:
+            index = RetrievalIndex(path)
+            if index.digest == digest:
+                return index
+            index.close()
+            logger.info("Retrieval sources changed, rebuilding the index")
+        except (ValueError, KeyError, struct.error, json.JSONDecodeError) as e:
+            logger.warning(f"Retrieval index {path} unreadable ({str(e)}), rebuilding")
+    build_index(sources, path)
+    return RetrievalIndex(path)
+
+
+def format_snippets(snippets: List[Snippet]) -> str:
+    """Prompt block listing the retrieved snippets, best first, within RETRIEVAL_MAX_CHARS."""
+    lines = ["From the Kokotajlo website:"]
+    budget = RETRIEVAL_MAX_CHARS
+    for snippet in snippets:
+        text = snippet.text
+        limit = min(RETRIEVAL_SNIPPET_CHARS, budget)
+        if len(text) > limit:
+            text = text[:limit].rsplit(" ", 1)[0] + "…"
+        if len(text) < 2:
+            break
+        lines.append(f"- {text}")
+        budget -= len(text)
+    return "\n".join(lines)
+
+
+# Benchmark
+
+BENCH_QUERIES = [
+    ("fr", "Combien coûte un projet pilote ?"),
+    ("fr", "Êtes-vous conformes à l'AI Act et au RGPD ?"),
+    ("fr", "Qui sont les fondateurs de Kokotajlo ?"),
+    ("fr", "Pouvez-vous héberger un LLM en local pour des données sensibles ?"),
+    ("fr", "Que faites-vous pour l'IoT industriel ?"),
+    ("en", "How much does the pilot cost?"),
+    ("en", "What is MCP and how do you use RAG?"),
+    ("en", "Do you support GDPR compliant local LLMs?"),
+    ("en", "Who is on the team?"),
+    ("en", "How do I contact you for a partnership?"),
+]
+
+
+def run_benchmark(path: Path, runs: int = 200) -> Dict[str, Any]:
+    """Index build time, load time, query latency and prompt-token savings."""
+    from conversation_store import estimate_tokens
+    from prompt_registry import PromptRegistry
+
+    build = build_index(default_sources(), path)
+    started = time.perf_counter()
+    index = RetrievalIndex(path)
+    load_ms = (time.perf_counter() - started) * 1000
+
+    latencies = []
+    for _ in range(runs):
+        for language, query in BENCH_QUERIES:
+            started = time.perf_counter()
+            index.search(query, language)
+            latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+
+    registry = PromptRegistry(BACKEND_DIR / "prompts" / "system.yaml",
+                              BACKEND_DIR / "prompts" / "fallback.yaml")
+    prompt_tokens = {}
+    for page in registry.tables.system_prompts:
+        if not registry.has_facts_slot(page):
+            continue
+        full = estimate_tokens(registry.system_prompt(page))
+        retrieved = []
+        for language, query in BENCH_QUERIES:
+            snippets = index.search(query, language)
+            prompt = (registry.system_prompt_with(page, format_snippets(snippets))
+                      if snippets else registry.system_prompt(page))
+            retrieved.append(estimate_tokens(prompt))
+        prompt_tokens[page] = {
+            "full_prompt_tokens": full,
+            "retrieval_prompt_tokens_mean": round(statistics.mean(retrieved), 1),
+            "saved_tokens_mean": round(full - statistics.mean(retrieved), 1),
+        }
+    examples = {query: [s.title for s in index.search(query, language)]
+                for language, query in BENCH_QUERIES}
+    index.close()
+    return {
+        "build": build,
+        "load_ms": round(load_ms, 3),
+        "query_ms": {
+            "p50": round(latencies[len(latencies) // 2], 3),
+            "p99": round(latencies[int(len(latencies) * 0.99) - 1], 3),
+            "max": round(latencies[-1], 3),
+        },
+        "prompt_tokens": prompt_tokens,
+        "top_titles": examples,
+    }
+
+
+def main_cli(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Build, query or benchmark the retrieval index")
+    parser.add_argument("command", choices=["build", "search", "bench"])
+    parser.add_argument("query", nargs="?", default="")
+    parser.add_argument("--language", default=None)
+    parser.add_argument("--index", default=str(RETRIEVAL_INDEX_PATH))
+    parser.add_argument("--runs", type=int, default=200, help="passes over the bench queries")
+    parser.add_argument("--output", help="write the bench JSON report to this file")
+    args = parser.parse_args(argv)
+    path = Path(args.index)
+
+    if args.command == "build":
+        print(json.dumps(build_index(default_sources(), path), indent=2))
+    elif args.command == "search":
+        index = open_index(path)
+        for snippet in index.search(args.query, args.language):
+            print(f"{snippet.score:6.2f}  {snippet.title}  [{snippet.source}]\n        {snippet.text[:160]}")
+        index.close()
+    else:
+        text = json.dumps(run_benchmark(path, args.runs), indent=2, ensure_ascii=False)
+        if args.output:
+            Path(args.output).write_text(text + "\n", encoding="utf-8")
+        print(text)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,219 @@
+"""
+Upstream Routing Policies
+Sequential, hedged and raced routing between chat upstreams (n8n, OpenAI)
+"""
+
+import asyncio
+import math
+from collections import deque
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from circuit_breaker import CircuitBreaker, percentile
+from logging_config import logger
+
+ROUTING_MODES = ("sequential", "hedged", "race")
+
+# An upstream call returns (text, ok) like call_n8n_chat_agent/call_openai_fallback
+UpstreamCall = Callable[[], Awaitable[Tuple[str, bool]]]
+
+
+class LatencyTracker:
+    """Rolling window of upstream latencies (seconds) with percentile lookups."""
+
+    def __init__(self, size: int = 200):
+        self._samples: Deque[float] = deque(maxlen=size)
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """Nearest-rank percentile of the window, or None when empty."""
+        return percentile(list(self._samples), pct)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+
+@dataclass
+class RouteResult:
+    """Outcome of routing one chat request across upstreams."""
+    text: str
+    ok: bool
+    source: str
+    mode: str
+    elapsed: float
+
+
+class ChatRouter:
+    """Routes a chat request across ordered upstreams under a latency budget.
+
+    Modes:
+        sequential: try each upstream in order, the next one only after a failure.
+        hedged: start the next upstream early if the current one has not answered
+            within the hedge delay (a percentile of its recent latencies).
+        race: start all upstreams at once and keep the first good answer.
+
+    Losing or late calls are always cancelled. Upstreams whose circuit
+    breaker is open are skipped without being called.
+    """
+
+    def __init__(
+        self,
+        mode: str = "sequential",
+        budget: float = 35.0,
+        hedge_delay: float = 2.0,
+        hedge_percentile: float = 95.0,
+        hedge_min_samples: int = 20,
+        breakers: Optional[Dict[str, CircuitBreaker]] = None,
+        observer: Optional[Callable[[str, str, float], None]] = None,
+    ):
+        if mode not in ROUTING_MODES:
+            logger.warning(
+                f"Unknown routing mode '{mode}', using 'sequential'")
+            mode = "sequential"
+        self.mode = mode
+        self.budget = budget
+        self.hedge_delay = hedge_delay
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.latencies: Dict[str, LatencyTracker] = {}
+        self.breakers: Dict[str, CircuitBreaker] = breakers or {}
+        # Called with (upstream, outcome, seconds) for every call or skip
+        self.observer = observer
+
+    def tracker(self, name: str) -> LatencyTracker:
+        if name not in self.latencies:
+            self.latencies[name] = LatencyTracker()
+        return self.latencies[name]
+
+    def hedge_delay_for(self, name: str) -> float:
+        """Delay before hedging past `name`: its latency percentile once warmed up."""
+        tracker = self.tracker(name)
+        if len(tracker) >= self.hedge_min_samples:
+            observed = tracker.percentile(self.hedge_percentile)
+            if observed is not None:
+                return min(max(observed, 0.05), self.budget)
+        return self.hedge_delay
+
+    async def _timed(self, name: str, call: UpstreamCall) -> Tuple[str, bool]:
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        breaker = self.breakers.get(name)
+        try:
+            text, ok = await call()
+        except asyncio.CancelledError:
+            if breaker is not None:
+                breaker.release()
+            raise
+        except Exception:
+            if breaker is not None:
+                breaker.record(False, loop.time() - started)
+            self._observe(name, "error", loop.time() - started)
+            raise
+        took = loop.time() - started
+        if ok:
+            self.tracker(name).record(took)
+        if breaker is not None:
+            breaker.record(ok, took)
+        self._observe(name, "ok" if ok else "error", took)
+        return text, ok
+
+    def _observe(self, name: str, outcome: str, seconds: float) -> None:
+        if self.observer is not None:
+            self.observer(name, outcome, seconds)
+
+    async def route(
+        self,
+        calls: List[Tuple[str, UpstreamCall]],
+        mode: Optional[str] = None,
+        budget: Optional[float] = None,
+    ) -> RouteResult:
+        """Run `calls` (primary first) under the given mode and latency budget."""
+        mode = mode if mode in ROUTING_MODES else self.mode
+        budget = budget if budget is not None else self.budget
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline = started + budget
+
+        queue = list(calls)
+        pending: Dict["asyncio.Task[Tuple[str, bool]]", str] = {}
+        last_name = ""
+        hedge_at = math.inf
+        budget_exhausted = False
+
+        def launch(reason: str) -> bool:
+            """Start the next upstream whose breaker allows a call."""
+            nonlocal last_name, hedge_at
+            while queue:
+                name, call = queue.pop(0)
+                breaker = self.breakers.get(name)
+                if breaker is not None and not breaker.allow_request():
+                    logger.info(
+                        f"Routing ({mode}): circuit for {name} is {breaker.state}, skipping")
+                    self._observe(name, "skipped", 0.0)
+                    continue
+                if reason:
+                    logger.warning(
+                        f"Routing ({mode}): {reason}, starting {name}")
+                pending[asyncio.ensure_future(self._timed(name, call))] = name
+                last_name = name
+                if mode == "hedged" and queue:
+                    hedge_at = loop.time() + self.hedge_delay_for(name)
+                return True
+            return False
+
+        try:
+            if not launch(""):
+                return RouteResult("", False, "none", mode, 0.0)
+            while mode == "race" and queue:
+                launch("")
+
+            while pending:
+                now = loop.time()
+                if now >= deadline:
+                    logger.warning(
+                        f"Routing ({mode}): latency budget of {budget:.1f}s exhausted")
+                    budget_exhausted = True
+                    break
+                timeout = deadline - now
+                if mode == "hedged" and queue:
+                    timeout = max(min(timeout, hedge_at - now), 0)
+
+                done, _ = await asyncio.wait(
+                    pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    if mode == "hedged" and queue and loop.time() >= hedge_at:
+                        launch(f"{last_name} slower than hedge delay")
+                    continue
+
+                failed = []
+                for task in done:
+                    name = pending.pop(task)
+                    try:
+                        text, ok = task.result()
+                    except Exception as e:
+                        logger.error(f"Routing ({mode}): {name} raised {str(e)}")
+                        ok, text = False, ""
+                    if ok:
+                        elapsed = loop.time() - started
+                        logger.info(
+                            f"Routing ({mode}): served by {name} in {elapsed * 1000:.0f}ms")
+                        return RouteResult(text, True, name, mode, elapsed)
+                    failed.append(name)
+
+                if queue and mode != "race":
+                    launch(f"{', '.join(failed)} failed")
+
+            return RouteResult("", False, "none", mode, loop.time() - started)
+        finally:
+            for task, name in pending.items():
+                # Calls still running when the budget ran out count as failures
+                breaker = self.breakers.get(name)
+                if budget_exhausted and breaker is not None:
+                    breaker.record(False, loop.time() - started)
+                if not task.done():
+                    self._observe(name, "timeout" if budget_exhausted else "cancelled",
+                                  loop.time() - started)
+                task.cancel()
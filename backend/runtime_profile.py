@@ -0,0 +1,87 @@
+"""
+Runtime Profile
+uvicorn settings per profile ("default" or "performance") and fast JSON response bodies
+"""
+
+import importlib.util
+import json
+import os
+from typing import Any, Dict, Mapping, Optional
+
+from pydantic import BaseModel
+from starlette.responses import JSONResponse, Response
+
+try:
+    import orjson  # type: ignore
+except ImportError:  # optional: the stdlib encoder is used instead
+    orjson = None
+
+# default: uvicorn's defaults; performance: uvloop + httptools pinned, long keep-alive, no access log
+RUNTIME_PROFILE = os.getenv("RUNTIME_PROFILE", "default").lower()
+PERFORMANCE = RUNTIME_PROFILE == "performance"
+# Seconds an idle connection is kept open; longer than the proxy's idle timeout so the
+# proxy never reuses a connection the server is closing
+KEEP_ALIVE_TIMEOUT = int(os.getenv("KEEP_ALIVE_TIMEOUT", "75" if PERFORMANCE else "5"))
+# Connections queued by the kernel before new ones are refused (capped by net.core.somaxconn)
+LISTEN_BACKLOG = int(os.getenv("LISTEN_BACKLOG", "4096" if PERFORMANCE else "2048"))
+# Seconds GET /api/v1/status reuses its last body (0 = computed per request)
+STATUS_CACHE_SECONDS = float(os.getenv("STATUS_CACHE_SECONDS", "1" if PERFORMANCE else "0"))
+
+
+def installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def uvicorn_options() -> Dict[str, Any]:
+    """uvicorn.Config keyword arguments of the selected profile."""
+    options: Dict[str, Any] = {"timeout_keep_alive": KEEP_ALIVE_TIMEOUT, "backlog": LISTEN_BACKLOG}
+    if PERFORMANCE:
+        options.update(
+            loop="uvloop" if installed("uvloop") else "asyncio",
+            http="httptools" if installed("httptools") else "h11",
+            # Requests are still counted and timed by the metrics middleware
+            access_log=False,
+            server_header=False,
+        )
+    return options
+
+
+def profile_status() -> Dict[str, Any]:
+    """The profile and what it resolved to, for logs and /api/v1/status."""
+    options = uvicorn_options()
+    return {
+        "profile": RUNTIME_PROFILE,
+        "loop": options.get("loop", "auto"),
+        "http": options.get("http", "auto"),
+        "json": "orjson" if orjson is not None else "json",
+        "keep_alive_seconds": KEEP_ALIVE_TIMEOUT,
+        "backlog": LISTEN_BACKLOG,
+        "status_cache_seconds": STATUS_CACHE_SECONDS,
+    }
+
+
+def dump_json(content: Any) -> bytes:
+    """Compact UTF-8 JSON, as FastAPI's JSONResponse writes it."""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson when it is installed."""
+
+    def render(self, content: Any) -> bytes:
+        return dump_json(content)
+
+
+def json_bytes_response(body: bytes, status_code: int = 200,
+                        headers: Optional[Mapping[str, str]] = None) -> Response:
+    """Response for an already serialized JSON body."""
+    return Response(body, status_code=status_code, headers=headers, media_type="application/json")
+
+
+def model_response(model: BaseModel, status_code: int = 200,
+                   headers: Optional[Mapping[str, str]] = None) -> Response:
+    """A pydantic model serialized by pydantic-core in one pass, without
+    FastAPI's jsonable_encoder round trip through Python dicts."""
+    return json_bytes_response(model.model_dump_json().encode("utf-8"), status_code, headers)
@@ -0,0 +1,250 @@
+"""
+Production Server
+Multi-process launcher with a preloaded app, worker recycling and graceful drain
+"""
+
+import multiprocessing
+import os
+import random
+import signal
+import socket
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import uvicorn
+from uvicorn.importer import import_from_string
+
+from logging_config import logger, console_handler, configure_uvicorn_logging
+from metrics import clear_snapshots, fold_worker_snapshot
+from runtime_profile import RUNTIME_PROFILE, uvicorn_options
+
+# Worker processes; "auto" uses the CPUs the container may use (cgroup quota,
+# CPU affinity), up to WEB_CONCURRENCY_MAX: each worker has its own caches,
+# budgets and SQLite connections (0 = no cap)
+WEB_CONCURRENCY = os.getenv("WEB_CONCURRENCY", "auto")
+WEB_CONCURRENCY_MAX = int(os.getenv("WEB_CONCURRENCY_MAX", "4"))
+# Recycle a worker after this many requests (plus up to the jitter, so they do not all restart together)
+WORKER_MAX_REQUESTS = int(os.getenv("WORKER_MAX_REQUESTS", "10000"))
+WORKER_MAX_REQUESTS_JITTER = int(os.getenv("WORKER_MAX_REQUESTS_JITTER", "1000"))
+# Recycle a worker whose resident memory grows past this (0 disables)
+WORKER_MAX_MEMORY_MB = int(os.getenv("WORKER_MAX_MEMORY_MB", "512"))
+# Seconds in-flight requests get to finish after SIGTERM
+GRACEFUL_TIMEOUT = float(os.getenv("GRACEFUL_TIMEOUT", "40"))
+# Fork workers from the parent after the app is imported (shares loaded modules and prompts)
+PRELOAD_APP = os.getenv("PRELOAD_APP", "true").lower() == "true"
+
+CHECK_INTERVAL = 1.0
+
+CGROUP_V2_CPU_MAX = "/sys/fs/cgroup/cpu.max"
+CGROUP_V1_CPU_DIR = "/sys/fs/cgroup/cpu"
+
+
+def cgroup_cpu_quota(cpu_max: str = CGROUP_V2_CPU_MAX, v1_dir: str = CGROUP_V1_CPU_DIR) -> Optional[float]:
+    """CPU quota of this container in CPUs (cgroup v2, then v1), None when unlimited or unknown."""
+    try:
+        with open(cpu_max, "r") as f:
+            quota, period = f.read().split()[:2]
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open(os.path.join(v1_dir, "cpu.cfs_quota_us"), "r") as f:
+            quota_us = int(f.read())
+        with open(os.path.join(v1_dir, "cpu.cfs_period_us"), "r") as f:
+            period_us = int(f.read())
+    except (OSError, ValueError):
+        return None
+    return quota_us / period_us if quota_us > 0 and period_us > 0 else None
+
+
+def available_cpus() -> int:
+    """CPUs this process may use: the affinity mask, bounded by the cgroup quota."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    quota = cgroup_cpu_quota()
+    if quota is not None:
+        cpus = min(cpus, max(1, int(quota)))
+    return cpus
+
+
+def worker_count() -> int:
+    if WEB_CONCURRENCY.isdigit() and int(WEB_CONCURRENCY) > 0:
+        return int(WEB_CONCURRENCY)
+    cpus = available_cpus()
+    return min(cpus, WEB_CONCURRENCY_MAX) if WEB_CONCURRENCY_MAX > 0 else cpus
+
+
+def rss_mb(pid: int) -> Optional[float]:
+    """Resident memory of a process in MB (Linux /proc), None when unavailable."""
+    try:
+        with open(f"/proc/{pid}/statm", "r") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+class DrainingServer(uvicorn.Server):
+    """uvicorn server that reports the start of a drain before shutting down."""
+
+    def __init__(self, config: uvicorn.Config, on_drain: Optional[Callable[[], None]] = None):
+        super().__init__(config)
+        self.on_drain = on_drain
+
+    def handle_exit(self, sig: int, frame: Any) -> None:
+        if self.on_drain is not None:
+            self.on_drain()
+        super().handle_exit(sig, frame)
+
+
+def run_worker(app_path: str, drain_path: Optional[str], config_kwargs: Dict[str, Any],
+               sockets: List[socket.socket]) -> None:
+    """Worker process entry point: serve the app on the inherited sockets.
+
+    In a forked worker the import strings resolve to the parent's already
+    loaded module; a spawned worker imports it here.
+    """
+    app = import_from_string(app_path)
+    on_drain = import_from_string(drain_path) if drain_path else None
+    max_requests = None
+    if WORKER_MAX_REQUESTS > 0:
+        max_requests = WORKER_MAX_REQUESTS + random.randint(0, max(0, WORKER_MAX_REQUESTS_JITTER))
+    config = uvicorn.Config(
+        app,
+        limit_max_requests=max_requests,
+        timeout_graceful_shutdown=int(GRACEFUL_TIMEOUT),
+        **config_kwargs,
+    )
+    configure_uvicorn_logging(console_handler)
+    DrainingServer(config, on_drain).run(sockets=sockets)
+
+
+class Supervisor:
+    """Keeps `workers` uvicorn processes serving one listening socket.
+
+    Workers that exit (request limit reached, crash) are replaced; workers
+    over the memory limit are asked to drain while a replacement starts. On
+    SIGTERM/SIGINT every worker drains: it stops accepting, finishes
+    in-flight requests within GRACEFUL_TIMEOUT and runs the app shutdown.
+    """
+
+    def __init__(self, app_path: str, config_kwargs: Dict[str, Any], workers: int,
+                 drain_path: Optional[str] = None):
+        self.app_path = app_path
+        self.drain_path = drain_path
+        self.config_kwargs = config_kwargs
+        self.worker_count = workers
+        self.workers: List[multiprocessing.process.BaseProcess] = []
+        self.retiring: List[multiprocessing.process.BaseProcess] = []
+        self.should_exit = threading.Event()
+        self.metrics_dir: Optional[Path] = None
+        if PRELOAD_APP and "fork" in multiprocessing.get_all_start_methods():
+            self.context = multiprocessing.get_context("fork")
+            self.preloaded = True
+        else:
+            self.context = multiprocessing.get_context("spawn")
+            self.preloaded = False
+
+    def _spawn(self, sockets: List[socket.socket]) -> None:
+        process = self.context.Process(
+            target=run_worker,
+            args=(self.app_path, self.drain_path, self.config_kwargs, sockets),
+        )
+        process.start()
+        self.workers.append(process)
+        logger.info(f"Started worker {process.pid}")
+
+    def _handle_signal(self, sig: int, frame: Any) -> None:
+        self.should_exit.set()
+
+    def _reap(self, process: multiprocessing.process.BaseProcess) -> None:
+        """Fold an exited worker's metrics snapshot into the roll-up so its
+        counts survive it and the directory does not grow with every recycle."""
+        if self.metrics_dir is None or process.pid is None:
+            return
+        try:
+            fold_worker_snapshot(self.metrics_dir, process.pid)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not fold metrics of worker {process.pid}: {e}")
+
+    def _check_workers(self, sockets: List[socket.socket]) -> None:
+        for process in list(self.workers):
+            if not process.is_alive():
+                process.join()
+                self._reap(process)
+                self.workers.remove(process)
+                logger.info(f"Worker {process.pid} exited with code {process.exitcode}, replacing it")
+                self._spawn(sockets)
+            elif WORKER_MAX_MEMORY_MB > 0:
+                used = rss_mb(process.pid or 0)
+                if used is not None and used > WORKER_MAX_MEMORY_MB:
+                    logger.warning(
+                        f"Worker {process.pid} uses {used:.0f}MB (limit {WORKER_MAX_MEMORY_MB}MB), recycling")
+                    self.workers.remove(process)
+                    self.retiring.append(process)
+                    os.kill(process.pid or 0, signal.SIGTERM)
+                    self._spawn(sockets)
+        for process in list(self.retiring):
+            if not process.is_alive():
+                process.join()
+                self._reap(process)
+                self.retiring.remove(process)
+
+    def run(self) -> None:
+        # Read at run time: the entry point may create the directory just before serving
+        if os.getenv("METRICS_DIR"):
+            self.metrics_dir = Path(os.environ["METRICS_DIR"])
+            removed = clear_snapshots(self.metrics_dir)
+            if removed:
+                logger.info(f"Removed {removed} metrics snapshots of a previous run from {self.metrics_dir}")
+        if self.preloaded:
+            # Import once here so forked workers share the loaded app
+            import_from_string(self.app_path)
+        config = uvicorn.Config(self.app_path, **self.config_kwargs)
+        sock = config.bind_socket()
+        sockets = [sock]
+        signal.signal(signal.SIGTERM, self._handle_signal)
+        signal.signal(signal.SIGINT, self._handle_signal)
+        logger.info(
+            f"Supervisor {os.getpid()} starting {self.worker_count} workers "
+            f"({'preloaded fork' if self.preloaded else 'spawn'}) on {config.host}:{config.port}")
+        for _ in range(self.worker_count):
+            self._spawn(sockets)
+
+        while not self.should_exit.wait(CHECK_INTERVAL):
+            self._check_workers(sockets)
+
+        logger.info(f"Supervisor draining {len(self.workers)} workers (deadline {GRACEFUL_TIMEOUT:.0f}s)")
+        processes = self.workers + self.retiring
+        for process in processes:
+            if process.is_alive():
+                os.kill(process.pid or 0, signal.SIGTERM)
+        # Workers get the drain deadline plus time for the app shutdown hooks
+        deadline = time.monotonic() + GRACEFUL_TIMEOUT + 10
+        for process in processes:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning(f"Worker {process.pid} did not drain in time, killing it")
+                process.kill()
+                process.join()
+            self._reap(process)
+        sock.close()
+        logger.info("Supervisor stopped")
+
+
+def serve(app_path: str, host: str, port: int, log_level: str,
+          drain_path: Optional[str] = None) -> None:
+    """Run the production server (see Supervisor) for the app at `app_path`."""
+    config_kwargs = {
+        "host": host,
+        "port": port,
+        "log_level": log_level,
+        "access_log": True,
+        **uvicorn_options(),
+    }
+    logger.info(f"Runtime profile: {RUNTIME_PROFILE} ({uvicorn_options()})")
+    Supervisor(app_path, config_kwargs, worker_count(), drain_path).run()
@@ -0,0 +1,73 @@
+"""
+Single-Flight Request Coalescing
+Concurrent callers with the same key share one in-flight upstream call
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Tuple, TypeVar
+
+from logging_config import logger
+
+T = TypeVar("T")
+
+
+class SingleFlightOverflow(Exception):
+    """Raised when too many callers are already waiting on the same key."""
+
+
+class SingleFlight:
+    """Coalesces concurrent calls keyed by the same string.
+
+    The first caller for a key starts the call as a task; later callers
+    await that same task and receive its result, or its exception. The
+    task is shielded, so a leader whose client disconnects does not cancel
+    the call for everyone else. At most `max_waiters` callers may join an
+    in-flight call; further callers get SingleFlightOverflow.
+    """
+
+    def __init__(self, max_waiters: int = 100):
+        self.max_waiters = max_waiters
+        # key -> (task, number of joined waiters)
+        self._flights: Dict[str, Tuple["asyncio.Task[Any]", int]] = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.overflows = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """Run `fn` once per in-flight key; return (result, shared)."""
+        flight = self._flights.get(key)
+        if flight is not None:
+            task, waiters = flight
+            if waiters >= self.max_waiters:
+                self.overflows += 1
+                raise SingleFlightOverflow(
+                    f"{waiters} callers already waiting on the same request")
+            self._flights[key] = (task, waiters + 1)
+            self.coalesced += 1
+            return await asyncio.shield(task), True
+
+        task = asyncio.ensure_future(fn())
+        self._flights[key] = (task, 0)
+        self.leaders += 1
+        task.add_done_callback(lambda _: self._finish(key, task))
+        return await asyncio.shield(task), False
+
+    def _finish(self, key: str, task: "asyncio.Task[Any]") -> None:
+        flight = self._flights.get(key)
+        if flight is not None and flight[0] is task:
+            del self._flights[key]
+            if flight[1]:
+                logger.info(f"Single-flight: shared one upstream call with {flight[1]} waiters")
+        # Retrieve the exception so an unawaited failure is not reported as lost
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for /api/v1/status."""
+        return {
+            "in_flight": len(self._flights),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "overflows": self.overflows,
+            "max_waiters": self.max_waiters,
+        }
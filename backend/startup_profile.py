@@ -0,0 +1,117 @@
+"""
+Startup Profile
+Import-time report and time-to-first-healthy-response measurement
+
+Usage:
+    python main.py --profile-startup
+    python startup_profile.py --runs 5 --top 20 --output startup.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+BACKEND_DIR = Path(__file__).parent
+
+
+def import_profile(module: str = "main", top: int = 20) -> Dict[str, Any]:
+    """Import `module` in a fresh interpreter with -X importtime and rank the costs."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, capture_output=True, text=True, env={**os.environ, "LOG_LEVEL": "WARNING"})
+    entries: List[Dict[str, Any]] = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        entries.append({
+            "module": name.strip(),
+            "depth": depth,
+            "self_ms": int(self_us) / 1000,
+            "cumulative_ms": int(cumulative_us) / 1000,
+        })
+    total = next((e["cumulative_ms"] for e in entries if e["module"] == module), None)
+    # Direct imports of the profiled module, by the time they add to it
+    direct = [e for e in entries if e["depth"] == 1]
+    return {
+        "module": module,
+        "total_ms": total,
+        "top_direct_imports": sorted(direct, key=lambda e: -e["cumulative_ms"])[:top],
+        "top_self_time": sorted(entries, key=lambda e: -e["self_ms"])[:top],
+    }
+
+
+def time_to_healthy(port: int, timeout: float = 30.0) -> Dict[str, Optional[float]]:
+    """Start the app in a new process; seconds until /health and /ready first answer 200."""
+    code = ("import uvicorn; uvicorn.run('main:app', host='127.0.0.1', "
+            f"port={port}, log_level='warning')")
+    env = {**os.environ, "LOG_LEVEL": "WARNING"}
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-c", code], cwd=BACKEND_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    healthy: Optional[float] = None
+    ready: Optional[float] = None
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=1.0) as client:
+            while time.perf_counter() - started < timeout and ready is None:
+                try:
+                    if healthy is None and client.get("/health").status_code == 200:
+                        healthy = time.perf_counter() - started
+                    if healthy is not None and client.get("/ready").status_code == 200:
+                        ready = time.perf_counter() - started
+                except httpx.HTTPError:
+                    pass
+                time.sleep(0.01)
+    finally:
+        process.terminate()
+        try:
+            process.wait(15)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    return {"healthy_s": healthy, "ready_s": ready}
+
+
+def summarize(values: List[Optional[float]]) -> Dict[str, Optional[float]]:
+    measured = [v for v in values if v is not None]
+    if not measured:
+        return {"median_ms": None, "min_ms": None, "max_ms": None, "failed": len(values)}
+    return {
+        "median_ms": round(statistics.median(measured) * 1000, 1),
+        "min_ms": round(min(measured) * 1000, 1),
+        "max_ms": round(max(measured) * 1000, 1),
+        "failed": len(values) - len(measured),
+    }
+
+
+def main_cli(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Profile backend startup")
+    parser.add_argument("--runs", type=int, default=3, help="cold starts to time")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--port", type=int, default=4111)
+    parser.add_argument("--output", help="write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    runs = [time_to_healthy(args.port) for _ in range(args.runs)]
+    report = {
+        "python": sys.version.split()[0],
+        "imports": import_profile("main", args.top),
+        "time_to_first_healthy": summarize([r["healthy_s"] for r in runs]),
+        "time_to_ready": summarize([r["ready_s"] for r in runs]),
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    print(text)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,72 @@
+"""
+Server-Sent Events Streaming
+SSE framing and upstream chunk parsing for /chat/stream
+"""
+
+import json
+from typing import Any, AsyncIterator, Optional
+
+import httpx
+
+
+class StreamFailed(Exception):
+    """Raised when an upstream cannot produce a stream (or breaks mid-stream)."""
+
+
+def sse_event(data: Any, event: Optional[str] = None) -> str:
+    """Format one server-sent event with a JSON payload."""
+    payload = json.dumps(data, ensure_ascii=False)
+    if event:
+        return f"event: {event}\ndata: {payload}\n\n"
+    return f"data: {payload}\n\n"
+
+
+def extract_n8n_text(data: Any) -> Optional[str]:
+    """Pull the assistant reply out of an n8n webhook JSON payload."""
+    if isinstance(data, dict):
+        for key in ("output", "response", "text", "message"):
+            value = data.get(key)
+            if isinstance(value, str) and value.strip():
+                return value.strip()
+    if isinstance(data, str) and data.strip():
+        return data.strip()
+    return None
+
+
+async def iter_n8n_chunks(response: httpx.Response) -> AsyncIterator[str]:
+    """Yield text chunks from an n8n webhook response.
+
+    Workflows using the streaming response mode send newline-delimited JSON
+    events ({"type": "item", "content": ...}); those are passed through as
+    they arrive. Any other body is read whole and parsed like a regular
+    webhook reply.
+    """
+    buffered = []
+    streamed = False
+    async for line in response.aiter_lines():
+        if not line.strip():
+            continue
+        try:
+            event = json.loads(line)
+        except ValueError:
+            buffered.append(line)
+            continue
+        if isinstance(event, dict) and event.get("type") in ("begin", "item", "end", "error"):
+            streamed = True
+            if event["type"] == "item" and event.get("content"):
+                yield str(event["content"])
+            elif event["type"] == "error":
+                raise StreamFailed(f"n8n stream error: {event.get('content')}")
+            continue
+        buffered.append(line)
+
+    if streamed:
+        return
+    body = "\n".join(buffered)
+    try:
+        text = extract_n8n_text(json.loads(body))
+    except ValueError:
+        text = extract_n8n_text(body)
+    if not text:
+        raise StreamFailed("n8n webhook returned unexpected payload structure")
+    yield text
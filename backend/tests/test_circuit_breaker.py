@@ -0,0 +1,84 @@
+import circuit_breaker
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def breaker(monkeypatch, **options):
+    clock = Clock()
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", clock)
+    settings = dict(window=60.0, min_calls=4, error_rate=0.5,
+                    open_seconds=30.0, trial_interval=5.0)
+    settings.update(options)
+    return CircuitBreaker("n8n", **settings), clock
+
+
+def test_trips_on_error_rate_and_skips_calls(monkeypatch):
+    cb, _ = breaker(monkeypatch)
+    for ok in (True, False, True):
+        cb.record(ok, 0.1)
+    assert cb.state == CLOSED
+    cb.record(False, 0.1)
+    assert cb.state == OPEN
+    assert cb.allow_request() is False
+    assert cb.snapshot()["trips"] == 1
+    assert cb.snapshot()["skipped"] == 1
+
+
+def test_trips_on_slow_calls(monkeypatch):
+    cb, _ = breaker(monkeypatch, slow_call_seconds=2.0, slow_call_rate=0.75)
+    for _ in range(4):
+        cb.record(True, 3.0)
+    assert cb.state == OPEN
+
+
+def test_half_open_lets_one_trial_through_and_recovers(monkeypatch):
+    cb, clock = breaker(monkeypatch)
+    for _ in range(4):
+        cb.record(False, 0.1)
+    clock.now += 30.0
+    assert cb.allow_request() is True
+    assert cb.state == HALF_OPEN
+    assert cb.allow_request() is False
+    cb.record(True, 0.1)
+    assert cb.state == CLOSED
+    assert cb.allow_request() is True
+
+
+def test_failed_trial_reopens(monkeypatch):
+    cb, clock = breaker(monkeypatch)
+    for _ in range(4):
+        cb.record(False, 0.1)
+    clock.now += 30.0
+    assert cb.allow_request() is True
+    cb.record(False, 0.1)
+    assert cb.state == OPEN
+    assert cb.allow_request() is False
+    assert cb.snapshot()["trips"] == 2
+
+
+def test_cancelled_trial_frees_the_slot_after_the_interval(monkeypatch):
+    cb, clock = breaker(monkeypatch)
+    for _ in range(4):
+        cb.record(False, 0.1)
+    clock.now += 30.0
+    assert cb.allow_request() is True
+    cb.release()
+    assert cb.allow_request() is False
+    clock.now += 5.0
+    assert cb.allow_request() is True
+
+
+def test_old_failures_leave_the_window(monkeypatch):
+    cb, clock = breaker(monkeypatch)
+    for _ in range(3):
+        cb.record(False, 0.1)
+    clock.now += 61.0
+    cb.record(False, 0.1)
+    assert cb.state == CLOSED
@@ -0,0 +1,153 @@
+import asyncio
+import subprocess
+import sys
+import time
+
+from contact_jobs import DONE, PENDING, RUNNING, ContactJobQueue
+
+
+def make_queue(db_path, sent=None, delay=0.0, **kwargs):
+    async def send(payload):
+        await asyncio.sleep(delay)
+        if sent is not None:
+            sent.append(payload["n"])
+
+    return ContactJobQueue(db_path, handlers={"email": send}, poll_interval=0.05, **kwargs)
+
+
+def job_row(queue, job_id):
+    return queue._execute("SELECT status, owner FROM jobs WHERE id = ?", (job_id,))[0]
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def test_starting_queue_leaves_live_siblings_jobs_alone(tmp_path):
+    db = tmp_path / "jobs.db"
+    first, second = make_queue(db), make_queue(db)
+    first._enqueue_sync("c1", {"n": 1})
+    assert first._claim_sync()[0] == "c1:email"
+
+    # A replacement worker starting next to the live one
+    assert second._recover_sync() == 0
+    assert second._claim_sync() is None
+    assert job_row(second, "c1:email") == (RUNNING, first.owner)
+
+
+def test_jobs_of_a_dead_owner_are_recovered(tmp_path):
+    db = tmp_path / "jobs.db"
+    first, second = make_queue(db), make_queue(db)
+    first._enqueue_sync("c1", {"n": 1})
+    first._claim_sync()
+    first._execute("UPDATE jobs SET owner = ?", (f"{dead_pid()}:gone",))
+
+    assert second._recover_sync() == 1
+    assert job_row(second, "c1:email") == (PENDING, None)
+    assert second._claim_sync()[0] == "c1:email"
+
+
+def test_expired_lease_can_be_claimed_by_a_sibling(tmp_path):
+    db = tmp_path / "jobs.db"
+    first, second = make_queue(db, lease_seconds=60), make_queue(db, lease_seconds=60)
+    first._enqueue_sync("c1", {"n": 1})
+    first._claim_sync()
+    assert second._claim_sync() is None
+
+    first._execute("UPDATE jobs SET claimed_at = ?", (time.time() - 61,))
+    assert second._claim_sync()[0] == "c1:email"
+    assert job_row(second, "c1:email") == (RUNNING, second.owner)
+
+
+def test_each_job_runs_once_across_workers_started_mid_run(tmp_path):
+    db = tmp_path / "jobs.db"
+    sent = []
+
+    async def run():
+        first = make_queue(db, sent, delay=0.05)
+        await first.start()
+        for n in range(20):
+            await first.enqueue(f"c{n}", {"n": n})
+        await asyncio.sleep(0.1)
+        # A recycled worker's replacement starts while jobs are in flight
+        second = make_queue(db, sent, delay=0.05)
+        await second.start()
+        for _ in range(100):
+            if first._execute("SELECT COUNT(*) FROM jobs WHERE status != ?", (DONE,))[0][0] == 0:
+                break
+            await asyncio.sleep(0.05)
+        await first.stop()
+        await second.stop()
+
+    asyncio.run(run())
+    assert sorted(sent) == list(range(20))
+
+
+def test_stop_hands_back_unfinished_jobs(tmp_path):
+    db = tmp_path / "jobs.db"
+
+    async def run():
+        queue = make_queue(db, delay=10.0)
+        await queue.start()
+        await queue.enqueue("c1", {"n": 1})
+        await asyncio.sleep(0.1)
+        await queue.stop(timeout=0.1)
+
+    asyncio.run(run())
+    assert job_row(make_queue(db), "c1:email") == (PENDING, None)
+
+
+def test_hung_handler_times_out_and_is_retried_by_its_owner(tmp_path):
+    calls = []
+
+    async def hang(payload):
+        calls.append(payload["n"])
+        if len(calls) == 1:
+            await asyncio.sleep(10)
+
+    queue = ContactJobQueue(tmp_path / "jobs.db", handlers={"email": hang}, poll_interval=0.05,
+                            base_delay=0.01, lease_seconds=60, job_timeout=0.1)
+
+    async def run():
+        await queue.start()
+        await queue.enqueue("c1", {"n": 1})
+        for _ in range(50):
+            if job_row(queue, "c1:email")[0] == DONE:
+                break
+            await asyncio.sleep(0.05)
+        await queue.stop()
+
+    asyncio.run(run())
+    assert calls == [1, 1]
+    status, attempts, error = ContactJobQueue(tmp_path / "jobs.db", handlers={})._execute(
+        "SELECT status, attempts, last_error FROM jobs")[0]
+    assert (status, attempts, error) == (DONE, 2, None)
+
+
+def test_timeout_stays_below_the_lease(tmp_path):
+    queue = make_queue(tmp_path / "jobs.db", lease_seconds=30, job_timeout=120)
+    assert queue.job_timeout == 15
+
+
+def test_legacy_persist_jobs_run_once_and_are_not_queued_again(tmp_path):
+    db = tmp_path / "jobs.db"
+    persisted = []
+
+    async def persist(payload):
+        persisted.append(payload["n"])
+
+    queue = make_queue(db, legacy_handlers={"persist": persist})
+    # A journal from before leads were stored inline
+    queue._execute(
+        "INSERT INTO jobs (id, contact_id, kind, payload, status, next_run_at, created_at, updated_at) "
+        "VALUES ('old:persist', 'old', 'persist', '{\"n\": 7}', ?, 0, 0, 0)", (PENDING,))
+    assert queue._enqueue_sync("c1", {"n": 1}) == 1
+
+    # A queue without the legacy handler leaves such jobs alone
+    assert make_queue(db)._claim_sync()[0] == "c1:email"
+    claimed = queue._claim_sync()
+    asyncio.run(queue._run_job(*claimed))
+    assert claimed[0] == "old:persist" and persisted == [7]
+    assert job_row(queue, "old:persist")[0] == DONE
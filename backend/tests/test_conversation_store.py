@@ -0,0 +1,33 @@
+import asyncio
+
+from conversation_store import ConversationStore
+
+
+def test_long_turns_inside_the_kept_window_stay_under_budget():
+    store = ConversationStore(max_tokens=1200, keep_turns=6)
+
+    async def run():
+        for _ in range(3):
+            await store.append("s", "u" * 4000, "a" * 4000)
+
+    asyncio.run(run())
+    session = store._sessions["s"]
+    assert len(session.turns) == 6
+    assert session.tokens <= 1200
+    # The newest message is the last one shortened
+    assert session.turns[-1]["content"] == "a" * 4000
+
+
+def test_workers_sharing_sqlite_see_each_others_turns(tmp_path):
+    db = tmp_path / "conversations.db"
+    first, second = ConversationStore(db_path=db), ConversationStore(db_path=db)
+
+    async def run():
+        await first.append("s", "q1", "r1")
+        await second.append("s", "q2", "r2")
+        # first's memory copy is stale; it must not write over q2/r2
+        await first.append("s", "q3", "r3")
+        return await second.get_history("s")
+
+    history = asyncio.run(run())
+    assert [m["content"] for m in history] == ["q1", "r1", "q2", "r2", "q3", "r3"]
@@ -0,0 +1,58 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+import yaml
+
+import main
+from intent_matcher import IntentMatcher
+
+FALLBACK = Path(__file__).resolve().parent.parent / "prompts" / "fallback.yaml"
+
+
+@pytest.fixture(scope="module")
+def matcher():
+    with open(FALLBACK, "r", encoding="utf-8") as f:
+        return IntentMatcher(yaml.safe_load(f)["intents"])
+
+
+@pytest.mark.parametrize("language, question, intent", [
+    ("fr", "Combien coûte un pilote ?", "pricing"),
+    ("fr", "Bonjour, quels sont vos tarifs ?", "pricing"),
+    ("en", "How much does the pilot cost?", "pricing"),
+    ("fr", "Combien de temps dure un pilote ?", "pilot"),
+    ("fr", "Êtes-vous conformes au RGPD ?", "gdpr"),
+    ("en", "How can I contact you?", "contact"),
+])
+def test_common_questions_match_their_intent(matcher, language, question, intent):
+    match = matcher.match(question, language)
+    assert match is not None and match.intent == intent
+    assert match.confidence >= main.FAQ_MATCH_THRESHOLD
+
+
+@pytest.mark.parametrize("language, question", [
+    ("fr", "Quel est le prix du pétrole ?"),
+    ("en", "What is the price of oil?"),
+    ("fr", "Combien coûte un pilote d'avion ?"),
+    ("en", "How much does a pilot license cost?"),
+    ("fr", "Comment contacter la police ?"),
+    ("en", "What is your data retention policy for CVs?"),
+    ("fr", "Bonjour"),
+])
+def test_questions_sharing_words_with_an_intent_do_not_match(matcher, language, question):
+    assert matcher.match(question, language) is None
+
+
+def test_fast_path_skips_sessions_with_turns():
+    chat_request = main.ChatRequest(message="Quel est le prix ?", language="fr")
+
+    async def run():
+        await main.prompt_registry.ready()
+        first = await main.match_fast_path(chat_request, chat_request.message, "fast-path-test")
+        await main.conversation_store.append("fast-path-test", "Bonjour", "Bonjour !")
+        follow_up = await main.match_fast_path(chat_request, chat_request.message, "fast-path-test")
+        return first, follow_up
+
+    first, follow_up = asyncio.run(run())
+    assert first is not None and first.intent == "pricing"
+    assert follow_up is None
@@ -0,0 +1,34 @@
+import asyncio
+
+from idempotency import IdempotencyStore
+
+
+def run_twice(store, key, by_content):
+    calls = []
+
+    async def answer():
+        calls.append(1)
+        return f"reply {len(calls)}"
+
+    async def run():
+        first = await store.run("chat", "10.0.0.1", key, "same-question", answer, by_content=by_content)
+        second = await store.run("chat", "10.0.0.1", key, "same-question", answer, by_content=by_content)
+        return first, second
+
+    return asyncio.run(run())
+
+
+def test_repeated_chat_without_a_key_is_answered_again():
+    first, second = run_twice(IdempotencyStore(enabled=True), None, by_content=False)
+    assert first == ("reply 1", False)
+    assert second == ("reply 2", False)
+
+
+def test_repeated_request_with_a_key_is_replayed():
+    _, second = run_twice(IdempotencyStore(enabled=True), "key-1", by_content=False)
+    assert second == ("reply 1", True)
+
+
+def test_repeated_contact_form_without_a_key_is_replayed():
+    _, second = run_twice(IdempotencyStore(enabled=True), None, by_content=True)
+    assert second == ("reply 1", True)
@@ -0,0 +1,88 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+from fastapi import HTTPException
+
+import main
+from contact_jobs import ContactJobQueue
+from lead_store import LeadStore, parse_iso_timestamp
+
+
+def test_leads_table_without_request_key_is_migrated(tmp_path):
+    db = tmp_path / "leads.db"
+    conn = sqlite3.connect(str(db))
+    conn.execute(
+        "CREATE TABLE leads (id TEXT PRIMARY KEY, created_at REAL NOT NULL, email TEXT NOT NULL, "
+        "name TEXT NOT NULL, company TEXT NOT NULL, sector TEXT NOT NULL, source TEXT, "
+        "data TEXT NOT NULL) WITHOUT ROWID")
+    conn.close()
+    store = LeadStore(db)
+
+    async def run():
+        lead_id = await store.add({"email": "a@example.com"}, request_key="k1")
+        found = await store.find_request("k1", time.time() - 30)
+        await store.close()
+        return lead_id, found
+
+    lead_id, found = asyncio.run(run())
+    assert found == lead_id
+
+
+def test_retry_after_failed_enqueue_reuses_the_stored_lead(tmp_path, monkeypatch):
+    queue = ContactJobQueue(tmp_path / "jobs.db", handlers={"email": None})
+    enqueue = queue.enqueue
+    attempts = []
+
+    async def flaky_enqueue(contact_id, payload):
+        attempts.append(contact_id)
+        if len(attempts) == 1:
+            raise sqlite3.OperationalError("database is locked")
+        return await enqueue(contact_id, payload)
+
+    monkeypatch.setattr(queue, "enqueue", flaky_enqueue)
+    monkeypatch.setattr(main, "contact_queue", queue)
+    monkeypatch.setattr(main, "lead_store", LeadStore(tmp_path / "leads.db"))
+    form = main.ContactRequest(name="Ada", email="ada@example.com", company="Acme",
+                               sector="industry", message="Pilote ?", gdpr=True)
+    request_fingerprint = main.fingerprint(form.model_dump(exclude={"source", "timestamp"}))
+
+    async def run():
+        with pytest.raises(HTTPException):
+            await main.submit_contact(form, None, request_fingerprint)
+        reply = await main.submit_contact(form, None, request_fingerprint)
+        leads, _ = await main.lead_store.query()
+        await main.lead_store.close()
+        return reply, leads
+
+    reply, leads = asyncio.run(run())
+    assert [lead["id"] for lead in leads] == [reply.contact_id]
+    assert attempts == [reply.contact_id, reply.contact_id]
+    assert queue._execute("SELECT contact_id FROM jobs") == [(reply.contact_id,)]
+
+
+def test_iso_timestamps_are_utc_with_z_or_without_offset():
+    expected = 1767225600.0  # 2026-01-01T00:00:00Z
+    assert parse_iso_timestamp("2026-01-01T00:00:00Z") == expected
+    assert parse_iso_timestamp("2026-01-01T00:00:00") == expected
+    assert parse_iso_timestamp("2026-01-01") == expected
+    assert parse_iso_timestamp("2026-01-01T01:00:00+01:00") == expected
+    with pytest.raises(ValueError):
+        parse_iso_timestamp("yesterday")
+
+
+def test_legacy_persist_job_stores_its_contact_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "lead_store", LeadStore(tmp_path / "leads.db"))
+    contact = {"contact_id": "contact_1700000000_ab12", "email": "ada@example.com", "name": "Ada",
+               "company": "Acme", "sector": "industry"}
+
+    async def run():
+        await main.store_legacy_contact(contact)
+        await main.store_legacy_contact(contact)
+        leads, _ = await main.lead_store.query()
+        await main.lead_store.close()
+        return leads
+
+    leads = asyncio.run(run())
+    assert [lead["email"] for lead in leads] == ["ada@example.com"]
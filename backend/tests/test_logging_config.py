@@ -0,0 +1,48 @@
+import logging
+
+from logging_config import AsyncBatchingHandler
+
+
+class BrokenStream:
+    def write(self, data):
+        raise OSError("collector gone")
+
+    def flush(self):
+        pass
+
+
+class ListStream:
+    def __init__(self):
+        self.lines = []
+
+    def write(self, data):
+        self.lines.extend(data.splitlines())
+
+    def flush(self):
+        pass
+
+
+def record(message):
+    return logging.LogRecord("test", logging.INFO, __file__, 1, message, None, None)
+
+
+def test_failed_writes_count_as_errors():
+    handler = AsyncBatchingHandler(stream=BrokenStream())
+    handler.emit(record("first"))
+    handler.emit(record("second"))
+    handler.close()
+    stats = handler.stats()
+    assert stats["written"] == 0
+    assert stats["errors"] == 2
+    assert stats["batches"] == 0
+
+
+def test_successful_writes_are_counted():
+    stream = ListStream()
+    handler = AsyncBatchingHandler(stream=stream)
+    handler.emit(record("first"))
+    handler.emit(record("second"))
+    handler.close()
+    assert stream.lines == ["first", "second"]
+    assert handler.stats()["written"] == 2
+    assert handler.stats()["errors"] == 0
@@ -0,0 +1,46 @@
+import json
+import os
+
+from metrics import (ROLLUP_FILE, MetricsExporter, clear_snapshots, fold_worker_snapshot,
+                     registry, snapshot_path, write_atomic)
+
+
+def counter_snapshot(value):
+    return {
+        "kokotajlo_http_requests_total": {"series": [[["/chat", "POST", "200"], value]]},
+        "kokotajlo_http_requests_in_flight": {"series": [[["/chat"], 3]]},
+    }
+
+
+def test_exited_workers_fold_into_one_rollup(tmp_path):
+    for pid, value in ((101, 2), (102, 5)):
+        write_atomic(snapshot_path(tmp_path, pid), json.dumps(counter_snapshot(value)))
+
+    assert fold_worker_snapshot(tmp_path, 101)
+    assert fold_worker_snapshot(tmp_path, 102)
+    assert not fold_worker_snapshot(tmp_path, 103)
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == [ROLLUP_FILE]
+    rollup = json.loads((tmp_path / ROLLUP_FILE).read_text())
+    assert rollup["kokotajlo_http_requests_total"]["series"] == [[["/chat", "POST", "200"], 7]]
+    # Gauges of exited workers are dropped
+    assert rollup.get("kokotajlo_http_requests_in_flight", {"series": []})["series"] == []
+
+
+def test_scrape_adds_the_rollup_to_live_workers(tmp_path):
+    write_atomic(tmp_path / ROLLUP_FILE, json.dumps(counter_snapshot(7)))
+    write_atomic(snapshot_path(tmp_path, 101), json.dumps(counter_snapshot(1)))
+    exporter = MetricsExporter(metrics_dir=str(tmp_path), flush_interval=0)
+
+    values = registry.merge(exporter._read_all_sync())
+    assert values["kokotajlo_http_requests_total"][("/chat", "POST", "200")] == 8
+
+
+def test_clear_snapshots_removes_a_previous_run(tmp_path):
+    write_atomic(tmp_path / ROLLUP_FILE, "{}")
+    write_atomic(snapshot_path(tmp_path, os.getpid()), "{}")
+    (tmp_path / "metrics_101.tmp").write_text("")
+    (tmp_path / "other.json").write_text("")
+
+    assert clear_snapshots(tmp_path) == 3
+    assert [p.name for p in tmp_path.iterdir()] == ["other.json"]
@@ -0,0 +1,35 @@
+from pathlib import Path
+
+import pytest
+
+from prompt_registry import PromptRegistry
+
+PROMPTS_DIR = Path(__file__).resolve().parent.parent / "prompts"
+SNIPPETS = "From the Kokotajlo website:\n- snippet"
+
+
+@pytest.fixture(scope="module")
+def registry():
+    return PromptRegistry(PROMPTS_DIR / "system.yaml", PROMPTS_DIR / "fallback.yaml")
+
+
+def test_snippets_replace_the_fact_sheet_but_keep_the_core(registry):
+    full = registry.system_prompt("general")
+    prompt = registry.system_prompt_with("general", SNIPPETS)
+
+    assert "€200k pilot projects" in prompt and "AI Act and GDPR" in prompt
+    assert "- snippet" in prompt
+    assert "Mengran Zhao" in full and "Mengran Zhao" not in prompt
+    assert len(prompt) < len(full)
+    assert "{facts}" not in prompt
+
+
+@pytest.mark.parametrize("page", ["general", "about", "services", "resources", "contact"])
+def test_every_page_has_a_facts_slot(registry, page):
+    assert registry.has_facts_slot(page)
+    assert "€200k pilot projects" in registry.system_prompt(page)
+
+
+def test_snippets_longer_than_the_sheet_are_not_used(registry):
+    prompt = registry.system_prompt_with("general", "x" * 2000)
+    assert prompt == registry.system_prompt("general")
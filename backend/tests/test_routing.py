@@ -0,0 +1,94 @@
+import asyncio
+
+from routing import ChatRouter
+
+
+def upstream(text, delay, ok=True, log=None):
+    async def call():
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            if log is not None:
+                log.append(text)
+            raise
+        return text, ok
+    return call
+
+
+def test_race_keeps_the_first_success_and_cancels_the_loser():
+    cancelled = []
+    router = ChatRouter(mode="race", budget=5.0)
+
+    async def scenario():
+        result = await router.route([
+            ("n8n", upstream("slow", 1.0, log=cancelled)),
+            ("openai", upstream("fast", 0.01, log=cancelled)),
+        ])
+        await asyncio.sleep(0)
+        return result
+
+    result = asyncio.run(scenario())
+    assert (result.ok, result.text, result.source) == (True, "fast", "openai")
+    assert cancelled == ["slow"]
+
+
+def test_race_ignores_a_fast_failure():
+    router = ChatRouter(mode="race", budget=5.0)
+    result = asyncio.run(router.route([
+        ("n8n", upstream("broken", 0.0, ok=False)),
+        ("openai", upstream("answer", 0.02)),
+    ]))
+    assert (result.ok, result.source) == (True, "openai")
+
+
+def test_hedge_starts_the_backup_after_the_delay():
+    cancelled = []
+    outcomes = []
+    router = ChatRouter(mode="hedged", budget=5.0, hedge_delay=0.02,
+                        observer=lambda name, outcome, _: outcomes.append((name, outcome)))
+
+    async def scenario():
+        result = await router.route([
+            ("n8n", upstream("slow", 1.0, log=cancelled)),
+            ("openai", upstream("hedge", 0.01, log=cancelled)),
+        ])
+        await asyncio.sleep(0)
+        return result
+
+    result = asyncio.run(scenario())
+    assert (result.ok, result.text, result.source) == (True, "hedge", "openai")
+    assert cancelled == ["slow"]
+    assert ("n8n", "cancelled") in outcomes
+
+
+def test_hedge_does_not_start_the_backup_when_the_primary_is_fast():
+    started = []
+
+    def counted(name, text, delay):
+        async def call():
+            started.append(name)
+            await asyncio.sleep(delay)
+            return text, True
+        return call
+
+    router = ChatRouter(mode="hedged", budget=5.0, hedge_delay=0.5)
+    result = asyncio.run(router.route([
+        ("n8n", counted("n8n", "primary", 0.01)),
+        ("openai", counted("openai", "backup", 0.01)),
+    ]))
+    assert result.source == "n8n"
+    assert started == ["n8n"]
+
+
+def test_budget_cancels_calls_that_never_answer():
+    cancelled = []
+    router = ChatRouter(mode="sequential", budget=0.05)
+
+    async def scenario():
+        result = await router.route([("n8n", upstream("hung", 5.0, log=cancelled))])
+        await asyncio.sleep(0)
+        return result
+
+    result = asyncio.run(scenario())
+    assert (result.ok, result.source) == (False, "none")
+    assert cancelled == ["hung"]
@@ -0,0 +1,31 @@
+import server
+
+
+def test_cgroup_v2_quota(tmp_path):
+    cpu_max = tmp_path / "cpu.max"
+    cpu_max.write_text("150000 100000\n")
+    assert server.cgroup_cpu_quota(str(cpu_max), str(tmp_path / "v1")) == 1.5
+    cpu_max.write_text("max 100000\n")
+    assert server.cgroup_cpu_quota(str(cpu_max), str(tmp_path / "v1")) is None
+
+
+def test_cgroup_v1_quota(tmp_path):
+    (tmp_path / "cpu.cfs_quota_us").write_text("200000\n")
+    (tmp_path / "cpu.cfs_period_us").write_text("100000\n")
+    assert server.cgroup_cpu_quota(str(tmp_path / "missing"), str(tmp_path)) == 2.0
+    (tmp_path / "cpu.cfs_quota_us").write_text("-1\n")
+    assert server.cgroup_cpu_quota(str(tmp_path / "missing"), str(tmp_path)) is None
+
+
+def test_auto_workers_follow_the_quota_and_the_cap(monkeypatch):
+    monkeypatch.setattr(server, "WEB_CONCURRENCY", "auto")
+    monkeypatch.setattr(server.os, "sched_getaffinity", lambda pid: set(range(32)), raising=False)
+    monkeypatch.setattr(server, "cgroup_cpu_quota", lambda: 2.5)
+    assert server.worker_count() == 2
+    monkeypatch.setattr(server, "cgroup_cpu_quota", lambda: 0.5)
+    assert server.worker_count() == 1
+    monkeypatch.setattr(server, "cgroup_cpu_quota", lambda: None)
+    monkeypatch.setattr(server, "WEB_CONCURRENCY_MAX", 4)
+    assert server.worker_count() == 4
+    monkeypatch.setattr(server, "WEB_CONCURRENCY", "6")
+    assert server.worker_count() == 6
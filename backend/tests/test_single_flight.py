@@ -0,0 +1,92 @@
+import asyncio
+
+from single_flight import SingleFlight, SingleFlightOverflow
+
+
+def test_waiters_share_one_call():
+    flights = SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    async def scenario():
+        return await asyncio.gather(*(flights.do("key", fetch) for _ in range(5)))
+
+    results = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert [result for result, _ in results] == ["answer"] * 5
+    assert sorted(shared for _, shared in results) == [False, True, True, True, True]
+    assert flights.stats()["in_flight"] == 0
+    assert flights.stats()["coalesced"] == 4
+
+
+def test_waiters_get_the_leaders_exception():
+    flights = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    async def scenario():
+        return await asyncio.gather(
+            *(flights.do("key", fail) for _ in range(3)), return_exceptions=True)
+
+    errors = asyncio.run(scenario())
+    assert all(isinstance(e, RuntimeError) and str(e) == "upstream down" for e in errors)
+    assert errors[0] is errors[1] is errors[2]
+    assert flights.stats()["in_flight"] == 0
+
+
+def test_cancelled_leader_does_not_cancel_the_waiters():
+    flights = SingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.02)
+        return "answer"
+
+    async def scenario():
+        leader = asyncio.ensure_future(flights.do("key", fetch))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(flights.do("key", fetch))
+        await asyncio.sleep(0)
+        leader.cancel()
+        return await waiter
+
+    assert asyncio.run(scenario()) == ("answer", True)
+
+
+def test_too_many_waiters_overflow():
+    flights = SingleFlight(max_waiters=1)
+
+    async def fetch():
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    async def scenario():
+        return await asyncio.gather(
+            *(flights.do("key", fetch) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert results[:2] == [("answer", False), ("answer", True)]
+    assert isinstance(results[2], SingleFlightOverflow)
+    assert flights.stats()["overflows"] == 1
+
+
+def test_different_keys_run_separately():
+    flights = SingleFlight()
+    calls = []
+
+    def fetch(name):
+        async def call():
+            calls.append(name)
+            return name
+        return call
+
+    async def scenario():
+        return await asyncio.gather(flights.do("a", fetch("a")), flights.do("b", fetch("b")))
+
+    assert asyncio.run(scenario()) == [("a", False), ("b", False)]
+    assert sorted(calls) == ["a", "b"]
@@ -0,0 +1,30 @@
+import main
+from usage import UsageTracker
+
+
+def test_ip_budget_off_without_trusted_proxy_hops():
+    # With TRUSTED_PROXY_HOPS=0 (the default) every request has the proxy's address
+    if main.TRUSTED_PROXY_HOPS == 0:
+        assert main.usage_tracker.ip_hourly_budget == 0
+    tracker = UsageTracker(ip_hourly_budget=0, session_budget=0, global_hourly_budget=0)
+    for _ in range(100):
+        tracker.record(None, "10.0.0.2", "general", 900, 100)
+    assert tracker.exceeded(None, "10.0.0.2") is None
+    assert tracker.stats()["tracked_ips"] == 0
+
+
+def test_ip_budget_applies_per_address():
+    tracker = UsageTracker(ip_hourly_budget=1000, session_budget=0, global_hourly_budget=0)
+    tracker.record(None, "203.0.113.7", "general", 900, 100)
+    assert tracker.exceeded(None, "203.0.113.7") == "ip"
+    assert tracker.exceeded(None, "203.0.113.8") is None
+
+
+def test_usage_is_bucketed_by_prompt_key(monkeypatch):
+    tracker = UsageTracker()
+    monkeypatch.setattr(main, "usage_tracker", tracker)
+    for page in ("services", "x" * 500, "unknown-page"):
+        chat_request = main.ChatRequest(message="hi", context={"page": page})
+        main.record_openai_usage(chat_request, "203.0.113.7", [{"role": "user", "content": "hi"}], None, "ok")
+    assert sorted(tracker.pages) == ["general", "services"]
+    assert tracker.pages["general"].calls == 2
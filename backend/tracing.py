@@ -0,0 +1,201 @@
+"""
+Request Tracing
+Request IDs from the proxy, per-stage timings, Server-Timing headers and tail-sampled trace logs
+"""
+
+import os
+import random
+import re
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+
+from logging_config import logger, request_id_var
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+REQUEST_ID_HEADER = os.getenv("REQUEST_ID_HEADER", "X-Request-ID")
+# Return the stage timings to the caller (the Next.js proxy logs them)
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "true").lower() == "true"
+# Tail sampling: the decision is made once the request has finished. Requests
+# slower than TRACE_SLOW_MS or answering 5xx are always logged, the rest at
+# TRACE_SAMPLE_RATE (0 = only slow and failed requests)
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "2000"))
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.01"))
+
+# Requests traced and trace logs written, by sampling reason
+counters = {"traced": 0, "slow": 0, "error": 0, "sampled": 0}
+
+# IDs we accept from the caller; anything else (too long, spaces, quotes) is replaced
+REQUEST_ID_PATTERN = re.compile(r"[A-Za-z0-9._:-]{1,128}")
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex
+
+
+def accept_request_id(value: Optional[str]) -> str:
+    """The caller's request ID when it is safe to log and echo, else a new one."""
+    if value and REQUEST_ID_PATTERN.fullmatch(value):
+        return value
+    return new_request_id()
+
+
+class Trace:
+    """Stage timings of one request (stage name, milliseconds, optional description)."""
+
+    __slots__ = ("request_id", "started", "stages")
+
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.started = time.perf_counter()
+        self.stages: List[Tuple[str, float, str]] = []
+
+    def add(self, name: str, seconds: float, desc: str = "") -> None:
+        self.stages.append((name, seconds * 1000, desc))
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def server_timing(self) -> str:
+        """Server-Timing header value, with the elapsed time so far as "total"."""
+        parts = []
+        for name, ms, desc in self.stages:
+            desc_part = f';desc="{desc}"' if desc else ""
+            parts.append(f"{name}{desc_part};dur={ms:.1f}")
+        parts.append(f"total;dur={self.elapsed_ms():.1f}")
+        return ", ".join(parts)
+
+    def as_log(self, duration_ms: float) -> Dict[str, Any]:
+        return {
+            "duration_ms": round(duration_ms, 2),
+            "stages": [
+                {"stage": name, "ms": round(ms, 2), **({"desc": desc} if desc else {})}
+                for name, ms, desc in self.stages
+            ],
+        }
+
+
+# Trace of the request being handled (copied into tasks it spawns, so upstream
+# attempts run by the router land on the same trace)
+trace_var: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+
+
+class _Stage:
+    """Context manager adding the time spent inside it to the current trace
+    (described by the exception type when the block raises)."""
+
+    __slots__ = ("trace", "name", "started")
+
+    def __init__(self, trace: Optional[Trace], name: str):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self) -> "_Stage":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        if self.trace is not None:
+            self.trace.stages.append(
+                (self.name, (time.perf_counter() - self.started) * 1000,
+                 exc_info[0].__name__ if exc_info[0] else ""))
+
+
+def stage(name: str) -> _Stage:
+    """Time a block as a stage of the current request (no-op outside a traced request)."""
+    return _Stage(trace_var.get(), name)
+
+
+def add_stage(name: str, seconds: float, desc: str = "") -> None:
+    """Record an already measured stage (e.g. an upstream attempt) on the current request."""
+    trace = trace_var.get()
+    if trace is not None:
+        trace.add(name, seconds, desc)
+
+
+def request_id_headers() -> Dict[str, str]:
+    """Headers carrying the current request ID to an upstream call."""
+    request_id = request_id_var.get()
+    return {REQUEST_ID_HEADER: request_id} if request_id else {}
+
+
+class TracingMiddleware:
+    """ASGI middleware giving every HTTP request an ID and a Trace.
+
+    The ID comes from the REQUEST_ID_HEADER set by the proxy (or is generated)
+    and is echoed in the response. Log records emitted while the request runs
+    carry it. The response start gets a Server-Timing header with the stages
+    recorded so far; for a streamed reply the later stages only reach the
+    trace log. Once the response is sent, the request is logged with its
+    stages if it was slow, failed or drawn by TRACE_SAMPLE_RATE.
+    """
+
+    def __init__(self, app: Any, slow_ms: float = TRACE_SLOW_MS, sample_rate: float = TRACE_SAMPLE_RATE,
+                 server_timing: bool = SERVER_TIMING_ENABLED):
+        self.app = app
+        self.slow_ms = slow_ms
+        self.sample_rate = sample_rate
+        self.server_timing = server_timing
+        self._header = REQUEST_ID_HEADER.lower().encode("latin-1")
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        incoming = None
+        for name, value in scope.get("headers", ()):
+            if name == self._header:
+                incoming = value.decode("latin-1")
+                break
+        trace = Trace(accept_request_id(incoming))
+        id_token = request_id_var.set(trace.request_id)
+        trace_token = trace_var.set(trace)
+        status = 500
+
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", ()))
+                headers.append((self._header, trace.request_id.encode("latin-1")))
+                if self.server_timing:
+                    headers.append((b"server-timing", trace.server_timing().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        counters["traced"] += 1
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self._finish(trace, scope, status)
+            trace_var.reset(trace_token)
+            request_id_var.reset(id_token)
+
+    def _finish(self, trace: Trace, scope: Dict[str, Any], status: int) -> None:
+        duration_ms = trace.elapsed_ms()
+        if status >= 500:
+            reason = "error"
+        elif duration_ms >= self.slow_ms:
+            reason = "slow"
+        elif self.sample_rate > 0 and random.random() < self.sample_rate:
+            reason = "sampled"
+        else:
+            return
+        counters[reason] += 1
+        logger.info(
+            f"Trace {scope.get('method', '')} {scope.get('path', '')} {status} in {duration_ms:.1f} ms ({reason})",
+            extra={"trace": {**trace.as_log(duration_ms), "status": status, "sampled": reason}})
+
+
+def tracing_status() -> Dict[str, Any]:
+    """Tracing configuration and counters for /api/v1/status."""
+    return {
+        "enabled": TRACING_ENABLED,
+        "request_id_header": REQUEST_ID_HEADER,
+        "server_timing": SERVER_TIMING_ENABLED,
+        "slow_ms": TRACE_SLOW_MS,
+        "sample_rate": TRACE_SAMPLE_RATE,
+        "traced": counters["traced"],
+        "logged": {reason: counters[reason] for reason in ("slow", "error", "sampled")},
+    }
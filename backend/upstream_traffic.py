@@ -0,0 +1,407 @@
+"""
+Upstream Traffic
+Record upstream HTTP exchanges to an append-only file and replay them with their timings
+
+Usage:
+    UPSTREAM_TRAFFIC_MODE=record uvicorn main:app      # capture n8n and OpenAI calls
+    UPSTREAM_TRAFFIC_MODE=replay uvicorn main:app      # serve them back, no network
+    python upstream_traffic.py stats data/upstream_traffic.jsonl
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import importlib
+import json
+import math
+import os
+import time
+from collections import Counter, deque
+from functools import lru_cache
+from pathlib import Path
+from types import ModuleType
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+
+from logging_config import logger
+
+# off, record (pass through and log every exchange) or replay (serve from the log)
+UPSTREAM_TRAFFIC_MODE = os.getenv("UPSTREAM_TRAFFIC_MODE", "off").lower()
+UPSTREAM_TRAFFIC_FILE = Path(os.getenv(
+    "UPSTREAM_TRAFFIC_FILE", str(Path(__file__).parent / "data" / "upstream_traffic.jsonl")))
+# Multiplier on recorded delays when replaying (1 = original timing, 0 = no delay)
+UPSTREAM_REPLAY_TIME_SCALE = float(os.getenv("UPSTREAM_REPLAY_TIME_SCALE", "1.0"))
+# body: same request body first, else the next recording of the endpoint; strict: body only
+UPSTREAM_REPLAY_MATCH = os.getenv("UPSTREAM_REPLAY_MATCH", "body").lower()
+
+# Response headers worth keeping; the rest (dates, ids, cookies) only add noise
+KEPT_HEADERS = ("content-type", "content-encoding")
+
+Chunk = List[Any]  # [offset seconds, text] or [offset seconds, base64, 1]
+
+
+def body_key(method: str, path: str, body: bytes) -> str:
+    """Match key of a request: method, path and a digest of the canonical JSON body."""
+    try:
+        canonical = json.dumps(json.loads(body), sort_keys=True, ensure_ascii=False).encode()
+    except ValueError:
+        canonical = body
+    return f"{method} {path} {hashlib.sha1(canonical).hexdigest()[:16]}"
+
+
+def encode_chunk(offset: float, data: bytes) -> Chunk:
+    try:
+        return [round(offset, 4), data.decode("utf-8")]
+    except UnicodeDecodeError:
+        return [round(offset, 4), base64.b64encode(data).decode("ascii"), 1]
+
+
+def decode_chunk(chunk: Chunk) -> Tuple[float, bytes]:
+    if len(chunk) > 2:
+        return chunk[0], base64.b64decode(chunk[1])
+    return chunk[0], chunk[1].encode("utf-8")
+
+
+def request_body(data: bytes) -> Any:
+    try:
+        return json.loads(data)
+    except ValueError:
+        return data.decode("utf-8", errors="replace")
+
+
+class TrafficLog:
+    """Append-only JSON lines file of upstream exchanges.
+
+    Each record is written with a single O_APPEND write, so several worker
+    processes can share one file without interleaving lines.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.records = 0
+        self.bytes = 0
+        self._fd: Optional[int] = None
+
+    def append(self, record: Dict[str, Any]) -> None:
+        line = (json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode()
+        try:
+            if self._fd is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._fd = os.open(str(self.path), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+            os.write(self._fd, line)
+        except OSError as e:
+            logger.error(f"Upstream traffic: cannot record to {self.path}: {str(e)}")
+            return
+        self.records += 1
+        self.bytes += len(line)
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+def read_records(path: Path) -> Iterator[Dict[str, Any]]:
+    """Records of a traffic file; a line cut short by a crash is skipped."""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def http_module(client_class: type) -> ModuleType:
+    """The httpx package a client class is built on (SDKs may ship their own fork)."""
+    for base in client_class.__mro__:
+        if base.__name__ == "AsyncClient":
+            return importlib.import_module(base.__module__.split(".")[0])
+    return httpx
+
+
+class RecordingStream:
+    """Passes the upstream body through and logs the exchange once it is closed."""
+
+    def __init__(self, inner: Any, record: Dict[str, Any], started: float, log: TrafficLog):
+        self.inner = inner
+        self.record = record
+        self.started = started
+        self.log = log
+        self.chunks: List[Chunk] = []
+        self.logged = False
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        try:
+            async for data in self.inner:
+                self.chunks.append(encode_chunk(time.perf_counter() - self.started, data))
+                yield data
+        except Exception as e:
+            self.record["err"] = type(e).__name__
+            self.record["d"] = round(time.perf_counter() - self.started, 4)
+            raise
+
+    async def aclose(self) -> None:
+        try:
+            await self.inner.aclose()
+        finally:
+            if not self.logged:
+                self.logged = True
+                self.record.setdefault("d", round(time.perf_counter() - self.started, 4))
+                self.record["c"] = self.chunks
+                self.log.append(self.record)
+
+
+class ReplayStream:
+    """Recorded body chunks, each released at its recorded offset times `scale`."""
+
+    def __init__(self, http: ModuleType, request: Any, chunks: List[Chunk],
+                 started: float, scale: float):
+        self.http = http
+        self.request = request
+        self.chunks = chunks
+        self.started = started
+        self.scale = scale
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        for chunk in self.chunks:
+            offset, data = decode_chunk(chunk)
+            await replay_delay(self.http, self.request,
+                               offset * self.scale - (time.perf_counter() - self.started))
+            yield data
+
+    async def aclose(self) -> None:
+        pass
+
+
+@lru_cache(maxsize=None)
+def byte_stream_class(http: ModuleType, stream_class: type) -> type:
+    """`stream_class` as a subclass of the given httpx's AsyncByteStream."""
+    return type(stream_class.__name__, (stream_class, http.AsyncByteStream), {})
+
+
+class RecordingTransport:
+    """Real transport whose exchanges are appended to the traffic log.
+
+    Only the request body is kept, never its headers (API keys stay out of
+    the file). Timings are offsets from the start of the request: `ttfb` for
+    the response headers, then one per body chunk.
+    """
+
+    def __init__(self, http: ModuleType, limits: Any, log: TrafficLog):
+        self.http = http
+        self.inner = http.AsyncHTTPTransport(limits=limits)
+        self.log = log
+
+    async def handle_async_request(self, request: Any) -> Any:
+        body = await request.aread()
+        record: Dict[str, Any] = {
+            "t": round(time.time(), 3),
+            "m": request.method,
+            "u": str(request.url.copy_with(query=None)),
+            "k": body_key(request.method, request.url.path, body),
+            "req": request_body(body),
+        }
+        started = time.perf_counter()
+        try:
+            response = await self.inner.handle_async_request(request)
+        except Exception as e:
+            record["err"] = type(e).__name__
+            record["d"] = round(time.perf_counter() - started, 4)
+            self.log.append(record)
+            raise
+        record["s"] = response.status_code
+        record["h"] = {k: v for k, v in response.headers.items() if k.lower() in KEPT_HEADERS}
+        record["ttfb"] = round(time.perf_counter() - started, 4)
+        stream = byte_stream_class(self.http, RecordingStream)(
+            response.stream, record, started, self.log)
+        return self.http.Response(response.status_code, headers=response.headers,
+                                  stream=stream, extensions=response.extensions)
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
+
+
+async def replay_delay(http: ModuleType, request: Any, seconds: float) -> None:
+    """Sleep a recorded delay, raising ReadTimeout where the real client would have."""
+    timeout = (request.extensions.get("timeout") or {}).get("read")
+    if timeout is not None and seconds > timeout:
+        await asyncio.sleep(timeout)
+        raise http.ReadTimeout("replayed upstream exceeded the read timeout", request=request)
+    if seconds > 0:
+        await asyncio.sleep(seconds)
+
+
+class Recordings:
+    """Recorded exchanges indexed for replay, shared by every replaying client.
+
+    A request is answered by a recording with the same body (in turn when
+    there are several); with `match="body"` an unknown body gets the next
+    recording of the same endpoint instead, so new traffic still sees the
+    recorded latency distribution. Matching ignores the host, so the file
+    can be replayed against any N8N_URL / OPENAI_BASE_URL with the same paths.
+    """
+
+    def __init__(self, records: List[Dict[str, Any]], match: str = "body"):
+        self.match = match
+        self.by_key: Dict[str, Deque[Dict[str, Any]]] = {}
+        self.by_endpoint: Dict[str, Deque[Dict[str, Any]]] = {}
+        for record in records:
+            self.by_key.setdefault(record["k"], deque()).append(record)
+            method, path, _ = record["k"].split(" ", 2)
+            self.by_endpoint.setdefault(f"{method} {path}", deque()).append(record)
+        self.served: Counter = Counter()
+
+    def pick(self, method: str, path: str, body: bytes) -> Optional[Dict[str, Any]]:
+        candidates = self.by_key.get(body_key(method, path, body))
+        outcome = "body"
+        if not candidates and self.match == "body":
+            candidates = self.by_endpoint.get(f"{method} {path}")
+            outcome = "endpoint"
+        if not candidates:
+            self.served["miss"] += 1
+            return None
+        candidates.rotate(-1)
+        self.served[outcome] += 1
+        return candidates[-1]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"recordings": sum(len(v) for v in self.by_key.values()),
+                "endpoints": len(self.by_endpoint), "served": dict(self.served)}
+
+
+class ReplayTransport:
+    """Serves recorded responses with their recorded timings times `scale`;
+    recorded transport errors are raised again."""
+
+    def __init__(self, http: ModuleType, recordings: Recordings, scale: float = 1.0):
+        self.http = http
+        self.recordings = recordings
+        self.scale = scale
+
+    async def handle_async_request(self, request: Any) -> Any:
+        started = time.perf_counter()
+        body = await request.aread()
+        record = self.recordings.pick(request.method, request.url.path, body)
+        if record is None:
+            raise self.http.ConnectError(
+                f"no recorded response for {request.method} {request.url.path}", request=request)
+        if "s" not in record:
+            await replay_delay(self.http, request, record.get("d", 0.0) * self.scale)
+            error = getattr(self.http, record.get("err", ""), None)
+            if not (isinstance(error, type) and issubclass(error, self.http.TransportError)):
+                error = self.http.TransportError
+            raise error(f"replayed upstream error ({record.get('err')})", request=request)
+        await replay_delay(self.http, request, record.get("ttfb", 0.0) * self.scale)
+        stream = byte_stream_class(self.http, ReplayStream)(
+            self.http, request, record.get("c") or [], started, self.scale)
+        return self.http.Response(record["s"], headers=record.get("h") or {}, stream=stream)
+
+    async def aclose(self) -> None:
+        pass
+
+
+class UpstreamTraffic:
+    """Record/replay switch for the httpx clients of the upstreams.
+
+    `transport(limits, client_class)` gives each client the transport for
+    the current mode: None when off (httpx default), a recording wrapper
+    around a real pool, or a replay transport over the shared recordings.
+    `client_class` tells which httpx the client is built on.
+    """
+
+    def __init__(self, mode: str = UPSTREAM_TRAFFIC_MODE, path: Path = UPSTREAM_TRAFFIC_FILE,
+                 scale: float = UPSTREAM_REPLAY_TIME_SCALE, match: str = UPSTREAM_REPLAY_MATCH):
+        if mode not in ("off", "record", "replay"):
+            logger.warning(f"Unknown UPSTREAM_TRAFFIC_MODE '{mode}', recording disabled")
+            mode = "off"
+        self.mode = mode
+        self.path = path
+        self.scale = max(0.0, scale)
+        self.match = match
+        self.log: Optional[TrafficLog] = TrafficLog(path) if mode == "record" else None
+        self.recordings: Optional[Recordings] = None
+
+    def transport(self, limits: Any, client_class: type = httpx.AsyncClient) -> Any:
+        if self.mode == "record":
+            assert self.log is not None
+            return RecordingTransport(http_module(client_class), limits, self.log)
+        if self.mode == "replay":
+            if self.recordings is None:
+                records = list(read_records(self.path)) if self.path.exists() else []
+                if not records:
+                    logger.warning(f"Upstream replay: no recordings in {self.path}")
+                self.recordings = Recordings(records, self.match)
+                logger.info(
+                    f"Upstream replay: {len(records)} recordings from {self.path} (time scale {self.scale})")
+            return ReplayTransport(http_module(client_class), self.recordings, self.scale)
+        return None
+
+    def close(self) -> None:
+        if self.log is not None:
+            self.log.close()
+
+    def stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = {"mode": self.mode}
+        if self.log is not None:
+            stats.update(file=str(self.path), recorded=self.log.records, bytes=self.log.bytes)
+        if self.recordings is not None:
+            stats.update(file=str(self.path), time_scale=self.scale, **self.recordings.stats())
+        return stats
+
+
+def recorded_chat_requests(path: Path) -> List[Dict[str, Any]]:
+    """/chat bodies rebuilt from the recorded n8n payloads, in recording order."""
+    requests = []
+    for record in read_records(path):
+        body = record.get("req")
+        if isinstance(body, dict) and "chatInput" in body:
+            requests.append({"message": body["chatInput"], "language": body.get("language") or "fr",
+                             "context": body.get("context") or {}})
+    return requests
+
+
+# Tools
+
+def percentile_ms(ordered: List[float], p: float) -> Optional[float]:
+    if not ordered:
+        return None
+    return round(ordered[max(1, math.ceil(p / 100 * len(ordered))) - 1] * 1000, 1)
+
+
+def summarize(path: Path) -> Dict[str, Any]:
+    """Per-endpoint counts, statuses and latency percentiles of a traffic file."""
+    endpoints: Dict[str, Dict[str, Any]] = {}
+    for record in read_records(path):
+        method, path_part, _ = record["k"].split(" ", 2)
+        entry = endpoints.setdefault(
+            f"{method} {path_part}", {"count": 0, "status": Counter(), "ttfb": [], "total": []})
+        entry["count"] += 1
+        entry["status"][str(record.get("s", record.get("err")))] += 1
+        if "ttfb" in record:
+            entry["ttfb"].append(record["ttfb"])
+        entry["total"].append(record.get("d", 0.0))
+    report = {}
+    for endpoint, entry in endpoints.items():
+        report[endpoint] = {"count": entry["count"], "status": dict(entry["status"])}
+        for name in ("ttfb", "total"):
+            ordered = sorted(entry[name])
+            report[endpoint][f"{name}_ms"] = {
+                f"p{p}": percentile_ms(ordered, p) for p in (50, 95, 99)}
+    return report
+
+
+def main_cli(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Inspect recorded upstream traffic")
+    sub = parser.add_subparsers(dest="command", required=True)
+    stats = sub.add_parser("stats", help="counts and latency percentiles per endpoint")
+    stats.add_argument("file", nargs="?", default=str(UPSTREAM_TRAFFIC_FILE))
+    args = parser.parse_args(argv)
+
+    if args.command == "stats":
+        print(json.dumps(summarize(Path(args.file)), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main_cli()
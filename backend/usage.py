@@ -0,0 +1,181 @@
+"""
+Usage Accounting
+OpenAI token and cost counters with per-session, per-IP and global budgets
+"""
+
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from conversation_store import estimate_tokens
+
+# Token budgets (0 disables a budget)
+USAGE_SESSION_TOKEN_BUDGET = int(os.getenv("USAGE_SESSION_TOKEN_BUDGET", "20000"))
+# Only enforced with TRUSTED_PROXY_HOPS > 0: otherwise every request comes from
+# the Next.js proxy's address and the budget would cap the whole site
+USAGE_IP_TOKENS_PER_HOUR = int(os.getenv("USAGE_IP_TOKENS_PER_HOUR", "50000"))
+USAGE_GLOBAL_TOKENS_PER_HOUR = int(os.getenv("USAGE_GLOBAL_TOKENS_PER_HOUR", "1000000"))
+USAGE_MAX_SESSIONS = int(os.getenv("USAGE_MAX_SESSIONS", "10000"))
+# USD per million tokens, used for the cost estimate (gpt-4o-mini list prices)
+OPENAI_PRICE_INPUT_PER_1M = float(os.getenv("OPENAI_PRICE_INPUT_PER_1M", "0.15"))
+OPENAI_PRICE_OUTPUT_PER_1M = float(os.getenv("OPENAI_PRICE_OUTPUT_PER_1M", "0.60"))
+
+DAYS_KEPT = 7
+
+
+def cost_usd(prompt_tokens: int, completion_tokens: int) -> float:
+    return (prompt_tokens * OPENAI_PRICE_INPUT_PER_1M
+            + completion_tokens * OPENAI_PRICE_OUTPUT_PER_1M) / 1_000_000
+
+
+class Totals:
+    """Prompt/completion token and call counters."""
+
+    __slots__ = ("calls", "prompt_tokens", "completion_tokens")
+
+    def __init__(self):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def add(self, prompt_tokens: int, completion_tokens: int) -> None:
+        self.calls += 1
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+
+    @property
+    def tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cost_usd": round(cost_usd(self.prompt_tokens, self.completion_tokens), 6),
+        }
+
+
+class UsageTracker:
+    """Token usage per session, page, day, client IP and hour, with budgets.
+
+    Hourly budgets use fixed clock-hour windows. Session totals are kept
+    in a bounded LRU, so a session evicted under load starts over.
+    """
+
+    def __init__(
+        self,
+        session_budget: int = USAGE_SESSION_TOKEN_BUDGET,
+        ip_hourly_budget: int = USAGE_IP_TOKENS_PER_HOUR,
+        global_hourly_budget: int = USAGE_GLOBAL_TOKENS_PER_HOUR,
+        max_sessions: int = USAGE_MAX_SESSIONS,
+    ):
+        self.session_budget = session_budget
+        self.ip_hourly_budget = ip_hourly_budget
+        self.global_hourly_budget = global_hourly_budget
+        self.max_sessions = max_sessions
+        self.total = Totals()
+        self.sessions: "OrderedDict[str, int]" = OrderedDict()
+        self.pages: Dict[str, Totals] = {}
+        self.days: "OrderedDict[str, Totals]" = OrderedDict()
+        self.ip_hours: Dict[str, Tuple[int, int]] = {}
+        self.global_hour: Tuple[int, int] = (0, 0)
+        self.rejections: Dict[str, int] = {"session": 0, "ip": 0, "global": 0}
+        self.estimated_calls = 0
+
+    def _hour(self) -> int:
+        return int(time.time() // 3600)
+
+    def exceeded(self, session_id: Optional[str], ip: str) -> Optional[str]:
+        """Name of the first exhausted budget ('session', 'ip', 'global'), or None."""
+        hour = self._hour()
+        reason = None
+        if self.global_hourly_budget and self.global_hour[0] == hour \
+                and self.global_hour[1] >= self.global_hourly_budget:
+            reason = "global"
+        elif self.ip_hourly_budget and ip:
+            ip_hour, ip_tokens = self.ip_hours.get(ip, (0, 0))
+            if ip_hour == hour and ip_tokens >= self.ip_hourly_budget:
+                reason = "ip"
+        if reason is None and self.session_budget and session_id \
+                and self.sessions.get(session_id, 0) >= self.session_budget:
+            reason = "session"
+        if reason is not None:
+            self.rejections[reason] += 1
+        return reason
+
+    def record(self, session_id: Optional[str], ip: str, page: str,
+               prompt_tokens: int, completion_tokens: int) -> None:
+        """Account one OpenAI call."""
+        tokens = prompt_tokens + completion_tokens
+        self.total.add(prompt_tokens, completion_tokens)
+        self.pages.setdefault(page, Totals()).add(prompt_tokens, completion_tokens)
+
+        day = time.strftime("%Y-%m-%d", time.gmtime())
+        if day not in self.days:
+            self.days[day] = Totals()
+            while len(self.days) > DAYS_KEPT:
+                self.days.popitem(last=False)
+        self.days[day].add(prompt_tokens, completion_tokens)
+
+        if session_id:
+            self.sessions[session_id] = self.sessions.get(session_id, 0) + tokens
+            self.sessions.move_to_end(session_id)
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+
+        hour = self._hour()
+        if self.global_hour[0] != hour:
+            self.global_hour = (hour, 0)
+            # Windows from earlier hours no longer count towards any budget
+            self.ip_hours = {k: v for k, v in self.ip_hours.items() if v[0] == hour}
+        self.global_hour = (hour, self.global_hour[1] + tokens)
+        if ip and self.ip_hourly_budget:
+            ip_hour, ip_tokens = self.ip_hours.get(ip, (hour, 0))
+            self.ip_hours[ip] = (hour, (ip_tokens if ip_hour == hour else 0) + tokens)
+
+    def record_response(self, session_id: Optional[str], ip: str, page: str,
+                        usage: Any, prompt_text: str, completion_text: str) -> Tuple[int, int]:
+        """Account a call from `response.usage`, estimating when it is missing."""
+        prompt_tokens = getattr(usage, "prompt_tokens", None) if usage else None
+        completion_tokens = getattr(usage, "completion_tokens", None) if usage else None
+        if prompt_tokens is None or completion_tokens is None:
+            self.estimated_calls += 1
+            prompt_tokens = estimate_tokens(prompt_text)
+            completion_tokens = estimate_tokens(completion_text)
+        self.record(session_id, ip, page, prompt_tokens, completion_tokens)
+        return prompt_tokens, completion_tokens
+
+    def stats(self) -> Dict[str, Any]:
+        """Usage counters and budget state for /api/v1/status."""
+        hour = self._hour()
+        return {
+            "total": self.total.to_dict(),
+            "estimated_calls": self.estimated_calls,
+            "by_page": {page: t.to_dict() for page, t in self.pages.items()},
+            "by_day": {day: t.to_dict() for day, t in self.days.items()},
+            "current_hour_tokens": self.global_hour[1] if self.global_hour[0] == hour else 0,
+            "tracked_sessions": len(self.sessions),
+            "tracked_ips": len(self.ip_hours),
+            "budgets": {
+                "session_tokens": self.session_budget,
+                "ip_tokens_per_hour": self.ip_hourly_budget,
+                "global_tokens_per_hour": self.global_hourly_budget,
+            },
+            "budget_rejections": dict(self.rejections),
+        }
+
+
+def prompt_size_report(system_prompts: Dict[str, str], calls: Dict[str, int]) -> Dict[str, Any]:
+    """Estimated size and input cost of each system prompt, largest first."""
+    report = {}
+    for page, prompt in sorted(system_prompts.items(), key=lambda item: -len(item[1])):
+        tokens = estimate_tokens(prompt)
+        report[page] = {
+            "chars": len(prompt),
+            "est_tokens": tokens,
+            "est_cost_per_1k_calls_usd": round(cost_usd(tokens * 1000, 0), 4),
+            "openai_calls": calls.get(page, 0),
+        }
+    return report
@@ -2,7 +2,8 @@ import { NextRequest, NextResponse } from 'next/server';
 
 export async function POST(request: NextRequest) {
   const timestamp = new Date().toISOString();
-  const requestId = Math.random().toString(36).substring(7);
+  // Sent to the backend as X-Request-ID so its logs and traces carry the same ID
+  const requestId = request.headers.get('x-request-id') || crypto.randomUUID();
 
   console.log(`[${timestamp}] [${requestId}] Chat API request started`);
 
@@ -32,12 +33,20 @@ export async function POST(request: NextRequest) {
     console.log(`[${timestamp}] [${requestId}] Incoming body:`, JSON.stringify(body));
     console.log(`[${timestamp}] [${requestId}] Proxying to backend: ${backendUrl}/chat`);
 
+    // Forward the client address chain so the backend rate limits per visitor
+    const forwardedFor = request.headers.get('x-forwarded-for');
+    // Retries carrying the same key get the first answer instead of a new upstream call
+    const idempotencyKey = request.headers.get('idempotency-key');
+
     // Make backend request
     const startTime = Date.now();
     const response = await fetch(`${backendUrl}/chat`, {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json',
+        'X-Request-ID': requestId,
+        ...(forwardedFor ? { 'X-Forwarded-For': forwardedFor } : {}),
+        ...(idempotencyKey ? { 'Idempotency-Key': idempotencyKey } : {}),
       },
       body: JSON.stringify({
         message,
@@ -51,6 +60,8 @@ export async function POST(request: NextRequest) {
     console.log(`[${timestamp}] [${requestId}] Backend status:`, response.status);
     console.log(`[${timestamp}] [${requestId}] Backend headers:`, response.headers.get('content-type'));
     console.log(`[${timestamp}] [${requestId}] Backend response time: ${responseTime}ms`);
+    // Backend stage timings (limiter, upstream attempts, ...); the rest of responseTime is network and proxy
+    console.log(`[${timestamp}] [${requestId}] Backend timings:`, response.headers.get('server-timing'));
 
     // Handle non-OK responses
     if (!response.ok) {
@@ -1,6 +1,9 @@
 import { NextRequest, NextResponse } from 'next/server';
 
 export async function POST(request: NextRequest) {
+  // Sent to the backend as X-Request-ID so its logs carry the same ID
+  const requestId = request.headers.get('x-request-id') || crypto.randomUUID();
+
   try {
     const body = await request.json();
     const { name, email, company, sector, message, gdpr } = body;
@@ -29,12 +32,18 @@ export async function POST(request: NextRequest) {
       );
     }
 
-    // Proxy to backend
+    // Proxy to backend, forwarding the client address chain for rate limiting
     const backendUrl = process.env.NEXT_PUBLIC_BACKEND_URL || 'http://localhost:4001';
+    const forwardedFor = request.headers.get('x-forwarded-for');
+    // A resubmitted form with the same key is stored and emailed once
+    const idempotencyKey = request.headers.get('idempotency-key');
     const response = await fetch(`${backendUrl}/contact`, {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json',
+        'X-Request-ID': requestId,
+        ...(forwardedFor ? { 'X-Forwarded-For': forwardedFor } : {}),
+        ...(idempotencyKey ? { 'Idempotency-Key': idempotencyKey } : {}),
       },
       body: JSON.stringify({
         name,
@@ -56,7 +65,7 @@ export async function POST(request: NextRequest) {
     return NextResponse.json(data);
 
   } catch (error) {
-    console.error('Contact API error:', error);
+    console.error(`[${requestId}] Contact API error:`, error);
 
     // Return a generic success message if backend is unavailable
     // This ensures the user experience is not interrupted